@@ -0,0 +1 @@
+# Makes the snfg package importable from the tests without installing it
@@ -2,11 +2,12 @@
 # encoding: utf-8
 
 
-from __future__ import print_function, division
+from __future__ import absolute_import, print_function, division
 import chimera
 from Midas.midas_text import addCommand, doExtensionFunc
-import prefs as _prefs
-from core import SNFG
+import snfg.prefs as _prefs
+import snfg.session as _session
+from snfg.core import SNFG
 
 
 class SNFGExtension(chimera.extension.EMO):
@@ -34,6 +35,9 @@ def cmd_snfg(cmdName, args):
             chimera.statusline.show_message('Method {} not supported. Try with: {}'.format(
                                             method, ', '.join(methods)), color='red')
         if models or models is None:
+            # A new call replaces the glyphs drawn before
+            for instance in list(SNFG._instances):
+                instance.disable()
             snfg = getattr(SNFG, 'as_'+method)(molecules=models, size=size, **kwargs)
 
     doExtensionFunc(cmd, args, specInfo=[("spec", "models", 'molecules')])
@@ -41,11 +45,37 @@ def cmd_snfg(cmdName, args):
 
 def cmd_undo_snfg(cmdName, args):
     def cmd(*args):
-        for instance in SNFG._instances:
+        for instance in list(SNFG._instances):
             instance.disable()
             chimera.viewer.updateCB(chimera.viewer)
 
     doExtensionFunc(cmd, args)
 
+
+def cmd_snfg_frames(cmdName, args):
+    def cmd(first=None, last=None):
+        frames = None
+        if first is not None:
+            first = int(first)
+            last = first if last is None else int(last)
+            frames = range(first, last + 1)
+        count = sum(instance.precompute(frames) for instance in SNFG._instances)
+        if count:
+            chimera.statusline.show_message('Cached {} SNFG frames'.format(count))
+        else:
+            chimera.statusline.show_message('No frames to cache. Draw merged glyphs '
+                                            'with snfg first', color='red')
+
+    doExtensionFunc(cmd, args)
+
+
+def cmd_undo_snfg_frames(cmdName, args):
+    def cmd(*args):
+        for instance in SNFG._instances:
+            instance.drop_frames()
+
+    doExtensionFunc(cmd, args)
+
 chimera.extension.manager.registerExtension(SNFGExtension(__file__))
-addCommand("snfg", cmd_snfg, cmd_undo_snfg)
\ No newline at end of file
+addCommand("snfg", cmd_snfg, cmd_undo_snfg)
+addCommand("snfgframes", cmd_snfg_frames, cmd_undo_snfg_frames)
\ No newline at end of file
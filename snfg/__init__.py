@@ -1,8 +1,17 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-from core import SNFG
-import gui
+from .cache import GlycanCache
+from .engine import Engine
+from .structure import Structure
+try:
+    import chimera
+except ImportError:  # Headless, without Chimera
+    SNFG = gui = None
+else:
+    del chimera
+    from .core import SNFG
+    from . import gui
 from ._version import get_versions
 __version__ = get_versions()['version']
 del get_versions
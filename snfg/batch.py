@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Batch rendering of SNFG scenes for many structure files, without Chimera.
+
+    python -m snfg.batch structures/ -o meshes/ -j 8
+
+Each PDB or mmCIF file is scanned for glycans by a pool of worker
+processes, which write the SNFG glyphs and connectors of each structure
+as a mesh file, along with a JSON summary of its saccharydes, linkages
+and glycans. A manifest in the output directory remembers what was
+done, so inputs that did not change since the previous run with the
+same options are skipped.
+"""
+
+from __future__ import absolute_import, print_function, division
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+import numpy as np
+from .cache import replace_file
+from .export import WRITERS, save
+from .scanner import scan_file
+
+EXTENSIONS = ('.pdb', '.ent', '.cif', '.mmcif')
+FORMATS = tuple(sorted(WRITERS)) + ('npz',)
+MANIFEST = 'manifest.json'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m snfg.batch',
+                                     description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('inputs', nargs='+',
+                        help='Structure files, or directories to search for them')
+    parser.add_argument('-o', '--output', default='.',
+                        help='Directory for the meshes, summaries and manifest')
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='bild',
+                        help='Mesh file format')
+    parser.add_argument('--size', type=float, default=4.0)
+    parser.add_argument('--cylinder-radius', type=float, default=0.5)
+    parser.add_argument('--no-connect', dest='connect', action='store_false')
+    parser.add_argument('--thorough', action='store_true')
+    parser.add_argument('--bondcolors', action='store_true')
+    parser.add_argument('--force', action='store_true',
+                        help='Process every input, even if it did not change')
+    args = parser.parse_args(argv)
+
+    options = dict(size=args.size, cylinder_radius=args.cylinder_radius,
+                   connect=args.connect, thorough=args.thorough,
+                   bondcolors=args.bondcolors)
+    start = time.time()
+    try:
+        results = run(find_inputs(args.inputs), args.output, options, fmt=args.format,
+                      jobs=args.jobs, force=args.force, report=_report)
+    except ValueError as e:
+        parser.error(str(e))
+    failed = [r for r in results if r.get('error')]
+    done = [r for r in results if not r.get('skipped') and not r.get('error')]
+    print('{} processed, {} skipped, {} failed in {:.2f} s'.format(
+        len(done), len(results) - len(done) - len(failed), len(failed),
+        time.time() - start))
+    return 1 if failed else 0
+
+
+def find_inputs(inputs):
+    """
+    Structure files among `inputs`, searching directories recursively.
+
+    Returns
+    -------
+    list of (str, str)
+        Path of each file, and its name relative to the directory it was
+        found in (or its file name, for files given directly). Outputs
+        are named after it.
+    """
+    found = []
+    for path in inputs:
+        if not os.path.isdir(path):
+            found.append((path, os.path.basename(path)))
+            continue
+        for root, _, files in os.walk(path):
+            found.extend((os.path.join(root, f), os.path.relpath(os.path.join(root, f), path))
+                         for f in sorted(files) if _strip_gz(f).lower().endswith(EXTENSIONS))
+    return found
+
+
+def run(paths, output, options, fmt='bild', jobs=1, force=False, report=None):
+    """
+    Process `paths` with `jobs` worker processes, skipping the ones whose
+    outputs are up to date in `output`.
+
+    Parameters
+    ----------
+    paths : list of str or (str, str)
+        Paths, or (path, name) pairs as given by `find_inputs`. Outputs
+        are written to ``<output>/<name>.<fmt>`` and
+        ``<output>/<name>.json``, where `name` is the file name of the
+        path by default.
+    output : str
+        Directory for the meshes, summaries and manifest.
+    options : dict
+        Passed to `engine.Engine`.
+    fmt : str, optional
+        One of `FORMATS`.
+    jobs : int, optional
+    force : bool, optional
+        Process every input, even if it did not change.
+    report : callable, optional
+        Called with the result of each input as soon as it is ready.
+
+    Returns
+    -------
+    list of dict
+        Result of each input: its path, outputs, timing and number of
+        saccharydes, or the error that made it fail.
+    """
+    inputs = [tuple(p) if isinstance(p, (tuple, list)) else (p, os.path.basename(p))
+              for p in paths]
+    stems = {}
+    for path, name in inputs:
+        stem = os.path.normcase(os.path.normpath(name))
+        if stem in stems:
+            raise ValueError('{} and {} would both be written to {}'.format(
+                stems[stem], path, os.path.join(output, name)))
+        stems[stem] = path
+    if not os.path.isdir(output):
+        os.makedirs(output)
+    manifest_path = os.path.join(output, MANIFEST)
+    manifest = _load_manifest(manifest_path)
+    tasks, results = [], []
+    for path, name in inputs:
+        signature = _signature(path, options, fmt)
+        previous = manifest.get(path)
+        if (not force and previous is not None and previous.get('signature') == signature
+                and not previous.get('error')
+                and all(os.path.exists(p) for p in previous.get('outputs', ()))):
+            result = dict(previous, skipped=True, seconds=0)
+            results.append(result)
+            if report is not None:
+                report(result)
+            continue
+        tasks.append((path, os.path.join(output, name), options, fmt, signature))
+    if jobs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            processed = pool.imap_unordered(_process, tasks)
+            results.extend(_collect(processed, manifest, manifest_path, report))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results.extend(_collect((_process(t) for t in tasks), manifest, manifest_path, report))
+    _save_manifest(manifest, manifest_path)
+    return results
+
+
+def process(path, stem, options, fmt='bild'):
+    """
+    Scan `path`, and write its mesh to ``stem.<fmt>``, unless it has no
+    glycans, and its summary to ``stem.json``. Returns the list of files
+    written and the record.
+    """
+    directory = os.path.dirname(stem)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:  # Created by another worker in the meantime
+            if not os.path.isdir(directory):
+                raise
+    record = scan_file(path, **options)
+    mesh = record.engine.mesh()
+    outputs = []
+    # Structures without glycans only get their summary
+    if len(mesh):
+        mesh_path = '{}.{}'.format(stem, fmt)
+        if fmt == 'npz':
+            np.savez_compressed(mesh_path, vertices=mesh.vertices, normals=mesh.normals,
+                                colors=mesh.colors, triangles=mesh.triangles)
+        else:
+            save(mesh, mesh_path, fmt)
+        outputs.append(mesh_path)
+    summary_path = stem + '.json'
+    with open(summary_path, 'w') as f:
+        json.dump(record.as_dict(), f, indent=1)
+    outputs.append(summary_path)
+    return outputs, record
+
+
+def _process(task):
+    path, stem, options, fmt, signature = task
+    start = time.time()
+    result = dict(path=path, signature=signature)
+    try:
+        outputs, record = process(path, stem, options, fmt)
+    except Exception as e:
+        result.update(error='{}: {}'.format(type(e).__name__, e),
+                      traceback=traceback.format_exc())
+    else:
+        result.update(outputs=outputs, saccharydes=len(record),
+                      glycans=len(record.glycans))
+    result['seconds'] = time.time() - start
+    return result
+
+
+def _collect(results, manifest, manifest_path, report):
+    for result in results:
+        manifest[result['path']] = dict((k, v) for k, v in result.items()
+                                        if k not in ('traceback', 'skipped'))
+        # Keep the progress of interrupted runs
+        _save_manifest(manifest, manifest_path)
+        if report is not None:
+            report(result)
+        yield result
+
+
+def _report(result):
+    if result.get('skipped'):
+        print('skipped', result['path'])
+    elif result.get('error'):
+        print('FAILED ', result['path'], result['error'], file=sys.stderr)
+    else:
+        print('ok     ', result['path'], '{:.2f} s'.format(result['seconds']),
+              '{} saccharydes'.format(result['saccharydes']))
+
+
+def _signature(path, options, fmt):
+    """
+    Hash of the size and modification time of `path`, and the options.
+    """
+    stat = os.stat(path)
+    key = json.dumps([stat.st_size, stat.st_mtime, sorted(options.items()), fmt])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _strip_gz(name):
+    return name[:-3] if name.endswith('.gz') else name
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest, path):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    replace_file(tmp, path)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Persistent, content-addressed cache of SNFG results.
+
+Each entry holds what `engine.Engine` computed for one molecule: its
+saccharydes (residues and ordered ring atoms), the linkage graph and,
+once drawn, the meshes of its glyphs and connectors. Entries are keyed
+by a hash of the topology and coordinates of the molecule and of the
+parameters that change the results, so opening the same structure again
+with the same settings only needs to read arrays back, without perceiving
+rings, walking bonds or expanding meshes.
+
+Atoms and residues are stored by their position in the molecule, as
+compressed ``.npz`` files in a single directory. The least recently used
+entries are deleted when the directory grows beyond its size limit.
+"""
+
+from __future__ import absolute_import, print_function, division
+import hashlib
+import io
+import json
+import os
+import zipfile
+import numpy as np
+from .geometry import Mesh
+from .graph import Linkage
+from .table import RING_SIZE, atom_coordinates
+
+VERSION = 2
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+
+_TARGET_NONE, _TARGET_RESIDUE, _TARGET_ATOM = 0, 1, 2
+
+
+def default_directory():
+    """
+    ``$XDG_CACHE_HOME/snfg``, or ``~/.cache/snfg``.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'snfg')
+
+
+class MoleculeIndex(object):
+
+    """
+    Positions of the atoms and residues of a molecule, used to store
+    references to them as integers.
+
+    Parameters
+    ----------
+    molecule : chimera.Molecule or structure.Structure
+    residues : iterable of residues, optional
+        Only index these residues and the ones bonded to them (e.g. the
+        saccharyde candidates and their linkage partners), so that the
+        rest of the molecule is neither walked nor hashed. All of them
+        by default.
+    """
+
+    def __init__(self, molecule, residues=None):
+        self.molecule = molecule
+        if residues is None:
+            self.atoms = list(molecule.atoms)
+            self.residues = list(molecule.residues)
+        else:
+            scope = set(residues)
+            scope.update([n.residue for r in scope for a in r.atoms for n in a.neighbors])
+            self.residues = [r for r in molecule.residues if r in scope]
+            self.atoms = [a for r in self.residues for a in r.atoms]
+        self.atom_positions = dict((a, i) for i, a in enumerate(self.atoms))
+        self.residue_positions = dict((r, i) for i, r in enumerate(self.residues))
+
+    def fingerprint(self, coordinates=True):
+        """
+        Hex digest of the atom names, elements, residues, bonds and,
+        unless `coordinates` is False, coordinates of the indexed atoms.
+        """
+        atoms, positions = self.atoms, self.atom_positions
+        bonds = sorted((i, positions[n]) for i, a in enumerate(atoms)
+                       for n in a.neighbors if i < positions.get(n, -1))
+        digest = hashlib.sha1()
+        for text in ([a.name for a in atoms], [a.element.name for a in atoms],
+                     [r.type for r in self.residues], [str(r.id) for r in self.residues]):
+            digest.update('\0'.join(text).encode('utf-8'))
+        residue_index = [self.residue_positions[a.residue] for a in atoms]
+        digest.update(np.array(residue_index, dtype=np.int64).tobytes())
+        digest.update(np.array(bonds, dtype=np.int64).tobytes())
+        if coordinates:
+            digest.update(np.round(atom_coordinates(atoms), 3).astype(np.float64).tobytes())
+        return digest.hexdigest()
+
+
+class Lookup(object):
+
+    """
+    Result of looking up a molecule in a `GlycanCache`: its key, its
+    index, and the entry found, if any.
+
+    Attributes
+    ----------
+    molecule
+    index : MoleculeIndex
+    key : str
+    entry : dict of arrays or None
+    coordset : int
+        Id of the active coordinate set of the molecule when it was
+        looked up. The entry no longer applies once it changes.
+    """
+
+    def __init__(self, molecule, index, key, entry):
+        self.molecule = molecule
+        self.index = index
+        self.key = key
+        self.entry = entry
+        self.coordset = molecule.activeCoordSet.id
+
+    @property
+    def current(self):
+        return self.molecule.activeCoordSet.id == self.coordset
+
+    def mesh(self, prefix):
+        """
+        Mesh and owners stored under `prefix`, if any.
+        """
+        if self.entry is not None:
+            return unpack_mesh(self.entry, prefix)
+
+
+class GlycanCache(object):
+
+    """
+    Directory of cache entries, one ``<key>.npz`` file each, bounded in
+    size by evicting the least recently used ones.
+
+    Parameters
+    ----------
+    directory : str, optional
+        By default, `default_directory()`. It is created when the first
+        entry is written.
+    max_bytes : int, optional
+        Size limit of all the entries together.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = default_directory() if directory is None else directory
+        self.max_bytes = max_bytes
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npz')
+
+    def key(self, index, params):
+        """
+        Key of the molecule given by `index`, computed with `params`,
+        a JSON-serializable dict.
+        """
+        header = json.dumps([VERSION, sorted(params.items())]).encode('utf-8')
+        return hashlib.sha1(header + index.fingerprint().encode('utf-8')).hexdigest()
+
+    def lookup(self, molecule, params, residues=None):
+        """
+        Find the entry of `molecule` computed with `params`. If only
+        `residues` and their bonded residues can change the results, the
+        key is computed from them alone. See `MoleculeIndex`.
+
+        Returns
+        -------
+        Lookup
+        """
+        index = MoleculeIndex(molecule, residues)
+        key = self.key(index, params)
+        return Lookup(molecule, index, key, self.get(key))
+
+    def get(self, key):
+        """
+        Arrays stored under `key`, or None. Reading an entry marks it as
+        recently used.
+        """
+        path = self.path(key)
+        try:
+            data = np.load(path, allow_pickle=False)
+            try:
+                entry = dict((name, data[name]) for name in data.files)
+            finally:
+                data.close()
+        except (IOError, OSError, ValueError, zipfile.BadZipfile):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, arrays):
+        """
+        Store `arrays`, a dict of NumPy arrays, under `key`, and evict old
+        entries if the cache is too big.
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        path = self.path(key)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        replace_file(tmp, path)
+        self.evict()
+
+    def evict(self, max_bytes=None):
+        """
+        Delete the least recently used entries until they take no more
+        than `max_bytes` (`self.max_bytes` by default).
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = []
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        self.evict(0)
+
+
+def snapshot(engine, molecule, index=None):
+    """
+    Arrays describing the saccharydes of `molecule` detected by `engine`
+    and their linkages, by position of atoms and residues in `index`.
+    Returns None if any of them refers to something outside `molecule`.
+    """
+    if index is None:
+        index = MoleculeIndex(molecule)
+    atoms, residues = index.atom_positions, index.residue_positions
+    drawn = engine.molecules.get(molecule) or []
+    table, linkages = engine.saccharydes, engine.graph.linkages
+    n = len(drawn)
+    rings = -np.ones((n, RING_SIZE), dtype=int)
+    links = -np.ones((n, 5), dtype=int)
+    targets = np.zeros((n, 2), dtype=int)
+    kinds = []
+    try:
+        for i, residue in enumerate(drawn):
+            ring = [atoms[a] for a in table[residue].atoms]
+            rings[i, :len(ring)] = ring
+            linkage = linkages[residue]
+            kinds.append(linkage.kind)
+            links[i, 0] = atoms[linkage.donor_atom]
+            for j, atom in ((1, linkage.bridge), (2, linkage.acceptor_atom)):
+                if atom is not None:
+                    links[i, j] = atoms[atom]
+            if linkage.acceptor is not None:
+                links[i, 3] = residues[linkage.acceptor]
+            if linkage.position is not None:
+                links[i, 4] = linkage.position
+            target = linkage.target
+            if target in residues:
+                targets[i] = _TARGET_RESIDUE, residues[target]
+            elif target is not None:
+                targets[i] = _TARGET_ATOM, atoms[target]
+        problematic = [residues[r] for r in engine._problematic_residues
+                       if r.molecule is molecule]
+    except KeyError:
+        return None
+    return dict(residues=np.array([residues[r] for r in drawn], dtype=int),
+                rings=rings, kinds=np.array(kinds, dtype=str), links=links,
+                targets=targets, problematic=np.array(sorted(problematic), dtype=int))
+
+
+def restore(engine, molecule, arrays, index=None):
+    """
+    Add the saccharydes and linkages stored by `snapshot` to `engine`,
+    without detecting them again. Returns the restored residues.
+    """
+    if index is None:
+        index = MoleculeIndex(molecule)
+    atoms, residues = index.atoms, index.residues
+    found = [residues[i] for i in arrays['residues']]
+    engine.saccharydes.extend((r, [atoms[i] for i in ring if i >= 0])
+                              for r, ring in zip(found, arrays['rings']))
+    linkages = []
+    for residue, kind, link, (target_type, target) in zip(found, arrays['kinds'],
+                                                          arrays['links'], arrays['targets']):
+        donor_atom, bridge, acceptor_atom, acceptor, position = [int(i) for i in link]
+        if target_type == _TARGET_RESIDUE:
+            target = residues[target]
+        elif target_type == _TARGET_ATOM:
+            target = atoms[target]
+        else:
+            target = None
+        linkages.append(Linkage(residue, str(kind), atoms[donor_atom],
+                                atoms[bridge] if bridge >= 0 else None,
+                                atoms[acceptor_atom] if acceptor_atom >= 0 else None,
+                                residues[acceptor] if acceptor >= 0 else None,
+                                position if position >= 0 else None, target))
+    engine.graph.add(linkages)
+    engine._problematic_residues.update(residues[i] for i in arrays['problematic'])
+    return found
+
+
+def dumps(arrays):
+    """
+    Bytes of a compressed ``.npz`` file with `arrays`, like cache entries.
+    """
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
+
+
+def loads(data):
+    """
+    Arrays of the ``.npz`` file given as bytes, as written by `dumps`.
+    """
+    npz = np.load(io.BytesIO(data), allow_pickle=False)
+    try:
+        return dict((name, npz[name]) for name in npz.files)
+    finally:
+        npz.close()
+
+
+def replace_file(src, dst):
+    """
+    Rename `src` to `dst`, atomically overwriting it: with `os.replace`
+    where available, and otherwise with ``rename`` on POSIX or
+    ``MoveFileEx`` on Windows.
+    """
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    elif os.name == 'nt':
+        import ctypes
+        flags = 0x1 | 0x8  # MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH
+        if not ctypes.windll.kernel32.MoveFileExW(ctypes.c_wchar_p(src),
+                                                   ctypes.c_wchar_p(dst), flags):
+            raise ctypes.WinError()
+    else:
+        os.rename(src, dst)
+
+
+def pack_mesh(prefix, mesh, owners):
+    """
+    Arrays of `mesh` and its triangle `owners`, named after `prefix`.
+    """
+    return {prefix + '_vertices': mesh.vertices, prefix + '_normals': mesh.normals,
+            prefix + '_colors': mesh.colors, prefix + '_triangles': mesh.triangles,
+            prefix + '_owners': np.asarray(owners, dtype=np.int32)}
+
+
+def unpack_mesh(arrays, prefix):
+    """
+    Mesh and owners stored by `pack_mesh`, or None if there are none.
+    """
+    if prefix + '_vertices' not in arrays:
+        return None
+    mesh = Mesh(*[arrays[prefix + name] for name in ('_vertices', '_normals', '_colors',
+                                                     '_triangles')])
+    return mesh, arrays[prefix + '_owners'].astype(int)
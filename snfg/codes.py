@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Residue code classifier.
+
+PDB and CHARMM codes are looked up in a frozen table. GLYCAM codes are
+matched structurally: a linkage-position prefix character followed by
+the sugar letter (uppercase for D, lowercase for L) and the anomer suffix,
+so their hundreds of combinations never need to be enumerated.
+
+The classifier of the built-in codes is
+`snfg_definitions.REVERSE_RESIDUE_CODES`.
+"""
+
+from __future__ import absolute_import, print_function, division
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+
+class ResidueCodes(Mapping):
+
+    """
+    Read-only mapping of residue codes to SNFG residue names, with
+    support for codes registered at runtime.
+
+    Parameters
+    ----------
+    residue_codes : dict
+        Like `snfg_definitions.RESIDUE_CODES`: for each residue name, a
+        dict with `common` and `charmm` sets of codes, and a
+        `glycam_patterns` list of ``(prefixes, tails)``, each matching the
+        codes made of any of the `prefixes` characters followed by any of
+        the space-separated `tails`. If a code is claimed by several
+        residues, the one declared last wins.
+    """
+
+    def __init__(self, residue_codes):
+        exact, glycam = {}, {}
+        for name, data in residue_codes.items():
+            for prefixes, tails in data.get('glycam_patterns', ()):
+                for tail in tails.split():
+                    glycam[tail] = (frozenset(prefixes), name)
+                    for prefix in prefixes:
+                        exact.pop(prefix + tail, None)
+            for category in ('common', 'charmm'):
+                for code in data.get(category, ()):
+                    exact[code] = name
+        self._exact = exact
+        self._glycam = glycam
+        self._registered = {}
+        # Memo of every code looked up so far, including misses
+        self._resolved = {}
+
+    def register(self, code, name):
+        """
+        Classify residues with type `code` as the SNFG residue `name`,
+        overriding any built-in assignment.
+        """
+        self._registered[code] = name
+        self._resolved.pop(code, None)
+
+    def unregister(self, code):
+        """
+        Remove a code added with `register`.
+        """
+        del self._registered[code]
+        self._resolved.pop(code, None)
+
+    def get(self, code, default=None):
+        try:
+            name = self._resolved[code]
+        except KeyError:
+            name = self._resolved[code] = self._classify(code)
+        return default if name is None else name
+
+    def _classify(self, code):
+        name = self._registered.get(code)
+        if name is not None:
+            return name
+        name = self._exact.get(code)
+        if name is not None:
+            return name
+        match = self._glycam.get(code[1:])
+        if match is not None and code[:1] in match[0]:
+            return match[1]
+
+    def __getitem__(self, code):
+        name = self.get(code)
+        if name is None:
+            raise KeyError(code)
+        return name
+
+    def __contains__(self, code):
+        return self.get(code) is not None
+
+    def __iter__(self):
+        seen = set(self._registered)
+        for code in self._registered:
+            yield code
+        for code in self._exact:
+            if code not in seen:
+                seen.add(code)
+                yield code
+        for tail, (prefixes, _) in self._glycam.items():
+            for prefix in prefixes:
+                code = prefix + tail
+                if code not in seen:
+                    yield code
+
+    def __len__(self):
+        return sum(1 for _ in self)
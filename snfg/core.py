@@ -1,20 +1,24 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-from __future__ import print_function, division
-from textwrap import dedent
+from __future__ import absolute_import, print_function, division
+import os
+import shutil
+import tempfile
 import numpy as np
 from collections import defaultdict
-try:
-    from cStringIO import StringIO
-except ImportError:
-    from StringIO import StringIO
-from snfg_definitions import COLORS_CMYK, RESIDUES, SCALES, ATOM_NAMES, REVERSE_RESIDUE_CODES, SUGAR_BOND_COLORS
+from contextlib import contextmanager
+from .snfg_definitions import COLORS_CMYK
+from .geometry import TEMPLATES, Mesh, glyph_frames, connector_mesh
+from .export import save as save_mesh
+from .table import SaccharydeRow, atom_coordinates
+from .trajectory import FrameCache
+from .engine import Engine
+from .cache import GlycanCache, Lookup, MoleculeIndex, pack_mesh, restore, snapshot
 import chimera
-import Matrix as M
-from chimera import runCommand as run, cross, Point, Vector, preferences
-from Bld2VRML import openFileObject as openBildFileObject
-from VolumePath import Marker_Set as MarkerSet
+from chimera import runCommand as run, preferences
+from .labels import LabelLayer
+from .mesh import MeshLayer, rgba, set_piece_mesh, surface_model
 
 _defined_colors = False
 def _define_snfg_colors():
@@ -31,41 +35,73 @@ def _define_snfg_colors():
     _defined_colors = True
 
 
-class SNFG(object):
+class SNFG(Engine):
 
+    """
+    Chimera adapter of the SNFG `Engine`: tracks open molecules through
+    triggers and draws the glyphs, connectors and labels as models.
+
+    With `cache` set, the saccharydes, linkages and merged meshes of each
+    molecule are kept on disk, in `cache.default_directory()`, and reused
+    when the same molecule is opened again with the same parameters. It
+    can also be a `cache.GlycanCache` with its own directory and size
+    limit. Off by default; the ``as_*`` constructors follow the ``cache``
+    preference.
+    """
+
+    # Enabled instances, for ``~snfg`` and sessions
     _instances = []
+    rgba = staticmethod(rgba)
 
     def __init__(self, size=4.0, connect=True, cylinder_radius=0.5, cylinder_redfac=0,
-                 sphere_redfac=0, molecules=None, hide_residue=False, bondtypes=False):
-        self._instances.append(self)
+                 sphere_redfac=0, molecules=None, hide_residue=False, bondtypes=False,
+                 merge=True, thorough=False, bondcolors=False, cache=False):
+        self._setup(size=size, connect=connect, cylinder_radius=cylinder_radius,
+                    cylinder_redfac=cylinder_redfac, sphere_redfac=sphere_redfac,
+                    molecules=molecules, hide_residue=hide_residue, bondtypes=bondtypes,
+                    merge=merge, thorough=thorough, bondcolors=bondcolors, cache=cache)
+        self.enable()
+
+    def _setup(self, size=4.0, connect=True, cylinder_radius=0.5, cylinder_redfac=0,
+               sphere_redfac=0, molecules=None, hide_residue=False, bondtypes=False,
+               merge=True, thorough=False, bondcolors=False, cache=False):
+        """
+        Set the attributes of a new instance, without drawing anything.
+        """
+        # Without an explicit list, molecules opened later are tracked too
+        self._all_molecules = molecules is None
         if molecules is None:
-            molecules = chimera.openModels.list(modelTypes=[chimera.Molecule])
-        self.molecules = {m: None for m in molecules}
-        self.size = size
-        self.connect = connect
-        self.cylinder_radius = cylinder_radius
-        self.cylinder_redfac = cylinder_redfac
-        self.sphere_redfac = sphere_redfac
+            molecules = [m for m in chimera.openModels.list(modelTypes=[chimera.Molecule])
+                         if not m.name.startswith('SNFG')]
+        Engine.__init__(self, size=size, connect=connect, cylinder_radius=cylinder_radius,
+                        cylinder_redfac=cylinder_redfac, sphere_redfac=sphere_redfac,
+                        molecules=molecules, thorough=thorough, bondcolors=bondcolors,
+                        row_class=Saccharyde,
+                        cache=GlycanCache() if cache is True else cache or None)
         self.hide_residue = hide_residue
         self.bondtypes = bondtypes
-        self.saccharydes = {}
-        self._problematic_residues = []
-        self._handler_mol, self._handler_res = None, None
-        self.enable()
-
-    def __del__(self):
-        self._instances.remove(self)
+        self.merge = merge
+        self.layers = {}
+        self.labels = None
+        self._frame_caches = {}
+        self._frame_directory = None
+        self._handler_mol, self._handler_res, self._handler_coords = None, None, None
+        self._handler_bond, self._handler_frame = None, None
+        self._pending = _Pending()
+        self._batch_depth = 0
 
     @classmethod
-    def as_icon(cls, molecules=None, size=None):
+    def as_icon(cls, molecules=None, size=None, cache=None):
         if size is None:
             size = preferences.get('tangram_snfg', 'icon_size')
+        if cache is None:
+            cache = preferences.get('tangram_snfg', 'cache')
         return cls(size=size, connect=False, molecules=molecules,
-                   hide_residue=False)
+                   hide_residue=False, cache=cache)
 
     @classmethod
     def as_full(cls, molecules=None, size=None, cylinder_radius=None,
-                     connect=None, bondtypes=None):
+                     connect=None, bondtypes=None, bondcolors=None, cache=None):
         if size is None:
             size = preferences.get('tangram_snfg', 'full_size')
         if cylinder_radius is None:
@@ -74,13 +110,18 @@ class SNFG(object):
             connect = preferences.get('tangram_snfg', 'connect')
         if bondtypes is None:
             bondtypes = preferences.get('tangram_snfg', 'bondtypes')
+        if bondcolors is None:
+            bondcolors = preferences.get('tangram_snfg', 'bondcolors')
+        if cache is None:
+            cache = preferences.get('tangram_snfg', 'cache')
         return cls(size=size, cylinder_radius=cylinder_radius,
                    cylinder_redfac=0, sphere_redfac=0, molecules=molecules,
-                   hide_residue=True, connect=connect, bondtypes=bondtypes)
+                   hide_residue=True, connect=connect, bondtypes=bondtypes,
+                   bondcolors=bondcolors, cache=cache)
 
     @classmethod
     def as_fullred(cls, molecules=None, size=None, cylinder_radius=None,
-                     connect=None, bondtypes=None):
+                     connect=None, bondtypes=None, bondcolors=None, cache=None):
         if size is None:
             size = preferences.get('tangram_snfg', 'full_size')
         if cylinder_radius is None:
@@ -89,13 +130,18 @@ class SNFG(object):
             connect = preferences.get('tangram_snfg', 'connect')
         if bondtypes is None:
             bondtypes = preferences.get('tangram_snfg', 'bondtypes')
+        if bondcolors is None:
+            bondcolors = preferences.get('tangram_snfg', 'bondcolors')
+        if cache is None:
+            cache = preferences.get('tangram_snfg', 'cache')
         return cls(size=size, cylinder_radius=cylinder_radius, cylinder_redfac=0.4,
                    sphere_redfac=0.25, molecules=molecules, hide_residue=True,
-                   connect=connect, bondtypes=bondtypes)
+                   connect=connect, bondtypes=bondtypes, bondcolors=bondcolors,
+                   cache=cache)
 
     @classmethod
     def as_fullshown(cls, molecules=None, size=None, cylinder_radius=None,
-                     connect=None, bondtypes=None):
+                     connect=None, bondtypes=None, bondcolors=None, cache=None):
         if size is None:
             size = preferences.get('tangram_snfg', 'full_size')
         if cylinder_radius is None:
@@ -104,313 +150,726 @@ class SNFG(object):
             connect = preferences.get('tangram_snfg', 'connect')
         if bondtypes is None:
             bondtypes = preferences.get('tangram_snfg', 'bondtypes')
+        if bondcolors is None:
+            bondcolors = preferences.get('tangram_snfg', 'bondcolors')
+        if cache is None:
+            cache = preferences.get('tangram_snfg', 'cache')
         return cls(size=size, cylinder_radius=cylinder_radius, cylinder_redfac=0.4,
                    sphere_redfac=0.25, molecules=molecules, hide_residue=False,
-                   connect=connect, bondtypes=bondtypes)
+                   connect=connect, bondtypes=bondtypes, bondcolors=bondcolors,
+                   cache=cache)
+
+    @classmethod
+    def from_session(cls, params, entries, all_molecules=False):
+        """
+        New instance with the parameters and drawing saved by
+        `session_state`, for the molecules restored from a session.
+
+        Parameters
+        ----------
+        params : dict
+            Keyword arguments of the instance.
+        entries : dict
+            Arrays of each molecule, as given by `session_state`.
+        all_molecules : bool, optional
+            Whether molecules opened later should be tracked too.
+        """
+        instance = cls.__new__(cls)
+        instance._setup(molecules=list(entries), **params)
+        instance._all_molecules = all_molecules
+        instance.enable(entries)
+        return instance
 
-    def enable(self):
+    def enable(self, entries=None):
+        """
+        Detect and draw the saccharydes of the tracked molecules, and
+        follow their changes. With `entries`, as given by `session_state`,
+        the saccharydes, linkages and merged meshes of each molecule are
+        restored instead.
+        """
         self.disable()
         global _defined_colors
         if not _defined_colors:
             _define_snfg_colors()
-        self.detect()
-        self.draw()
+        if entries is None:
+            self.detect()
+            self.draw()
+        else:
+            self._restore_entries(entries)
         self._handler_mol = chimera.triggers.addHandler('Molecule', self._update_cb, None)
         self._handler_res= chimera.triggers.addHandler('Residue', self._update_res_cb, None)
+        self._handler_coords = chimera.triggers.addHandler('CoordSet', self._update_coords_cb, None)
+        self._handler_bond = chimera.triggers.addHandler('Bond', self._update_bond_cb, None)
+        self._handler_frame = chimera.triggers.addHandler('new frame', self._new_frame_cb, None)
+        self._instances.append(self)
+        self._report_problematic_residues()
+
+    def _report_problematic_residues(self):
         if self._problematic_residues:
             chimera.statusline.show_message('Detected carbohydrate residues with potentially'
                                             ' wrong atom names. Check reply log!',
                                             color='red', blankAfter=5)
-            for r in set(self._problematic_residues):
+            for r in self._problematic_residues:
                 print('! Residue {} might be a carbohydrate'
                       ' with wrong atom names.'.format(r))
 
     def disable(self):
-        self._problematic_residues = []
-        to_remove = []
-        for vrml in chimera.openModels.list():
-            if vrml.name.startswith('SNFG'):
-                to_remove.append(vrml)
-                if vrml in self.molecules:
-                    del self.molecules[vrml]
-        chimera.openModels.close(to_remove)
+        """
+        Close the models drawn by this instance and stop following the
+        changes of its molecules. Other instances are left untouched.
+        """
+        if self in self._instances:
+            self._instances.remove(self)
+        self._problematic_residues = set()
         for s in self.saccharydes.values():
             s.destroy()
-        self.saccharydes = {}
+        self.saccharydes.clear()
+        self.graph.clear()
+        for layers in self.layers.values():
+            for layer in layers:
+                layer.close()
+        self.layers = {}
+        self.instances = {}
+        if self.labels is not None:
+            self.labels.close()
+            self.labels = None
+        self._connectors.clear()
+        self.drop_frames()
         if self._handler_mol is not None:
             chimera.triggers.deleteHandler('Molecule', self._handler_mol)
             self._handler_mol = None
         if self._handler_res is not None:
             chimera.triggers.deleteHandler('Residue', self._handler_res)
             self._handler_res = None
-        Saccharyde._base_id[0] = 99
-
-    def detect(self):
+        if self._handler_coords is not None:
+            chimera.triggers.deleteHandler('CoordSet', self._handler_coords)
+            self._handler_coords = None
+        if self._handler_bond is not None:
+            chimera.triggers.deleteHandler('Bond', self._handler_bond)
+            self._handler_bond = None
+        if self._handler_frame is not None:
+            chimera.triggers.deleteHandler('new frame', self._handler_frame)
+            self._handler_frame = None
+        self._pending = _Pending()
+        if not self._instances:
+            Saccharyde._base_id[0] = 99
+
+    def session_state(self):
         """
-        Assign appropriate shape/color based on residue name
+        Everything needed to draw the current scene again with
+        `from_session`, without detecting or meshing anything.
+
+        Returns
+        -------
+        params : dict
+            Keyword arguments of this instance.
+        entries : dict
+            For each tracked molecule, arrays (as in `cache` entries) with
+            its saccharydes, linkages, hidden residues, a digest of its
+            topology and, for merged models, the meshes currently drawn.
         """
-        # Collect a list of residues that contain carbohydrate ring atoms
-        rings_per_molecule = self.find_saccharydic_residues(molecules=self.molecules.keys())
-        # TODO: set carbatoms
-        # TODO: Filter out rings that aren't actually carbohydrates
-        #       (can happen with linear carbohydrates with coordinating ions)
-        # TODO: Check for GLYCAM reducing-terminal ROH to assign appropriate resname color
-
-        for molecule, residues in rings_per_molecule.items():
-            self.molecules[molecule] = []
-            for residue, ring in residues.items():
-                # Assign shape/size/color properties based on recognized residue names
-                saccharyde = Saccharyde(residue, ring.orderedAtoms, base_size=self.size)
-                self.saccharydes[residue] = saccharyde
-                self.molecules[molecule].append(residue)
+        params = dict(size=self.size, connect=self.connect,
+                      cylinder_radius=self.cylinder_radius,
+                      cylinder_redfac=self.cylinder_redfac, sphere_redfac=self.sphere_redfac,
+                      hide_residue=self.hide_residue, bondtypes=self.bondtypes,
+                      merge=self.merge, thorough=self.thorough, bondcolors=self.bondcolors)
+        entries = {}
+        for molecule in self.molecules:
+            if molecule.__destroyed__:
+                continue
+            index = MoleculeIndex(molecule)
+            arrays = snapshot(self, molecule, index)
+            if arrays is None:
+                continue
+            drawn = self.molecules[molecule] or []
+            positions = dict((r, i) for i, r in enumerate(drawn))
+            hidden = [r for r in drawn if self._is_hidden(molecule, r)]
+            arrays['hidden'] = np.array([index.residue_positions[r] for r in hidden], dtype=int)
+            arrays['topology'] = np.array(index.fingerprint(coordinates=False))
+            for prefix, layer in zip(('glyphs', 'connectors'), self.layers.get(molecule, ())):
+                if layer.mesh is None or any(k not in positions for k in layer.keys):
+                    continue
+                # Owners are saved as positions among the drawn residues
+                keys = np.array([positions[k] for k in layer.keys], dtype=int)
+                arrays.update(pack_mesh(prefix, layer.mesh, keys[layer.owners]))
+            entries[molecule] = arrays
+        return params, entries
+
+    def _is_hidden(self, molecule, residue):
+        if molecule in self.layers:
+            return residue in self.layers[molecule][0].hidden
+        vrml = self.saccharydes[residue].vrml
+        return vrml is not None and vrml._vrml_shape is not None and not vrml._vrml_shape.display
+
+    def _restore_entries(self, entries):
+        """
+        Restore the saccharydes and linkages saved by `session_state`, and
+        draw them with the saved meshes. Molecules whose topology changed
+        are detected again.
+        """
+        stale, hidden = [], []
+        for molecule, arrays in entries.items():
+            index = MoleculeIndex(molecule)
+            if str(arrays['topology']) != index.fingerprint(coordinates=False):
+                stale.append(molecule)
+                continue
+            self.molecules[molecule] = restore(self, molecule, arrays, index)
+            self._lookups[molecule] = Lookup(molecule, index, None, arrays)
+            hidden.extend(index.residues[i] for i in arrays['hidden'])
+        if stale:
+            self.detect(residues=[r for m in stale for r in m.residues])
+        self.draw()
+        if hidden:
+            self.hide(hidden)
 
-    def find_saccharydic_residues(self, molecules=None):
+    def find_saccharydic_residues(self, molecules=None, residues=None):
+        """
+        Find carbohydrate rings in `molecules` (all the open ones by
+        default), or only among `residues` if given.
+        """
         if molecules is None:
             molecules = chimera.openModels.list(modelTypes=[chimera.Molecule])
+        return Engine.find_saccharydic_residues(self, molecules, residues)
+
+    def _find_saccharydic_residues_thorough(self, molecules, residues=None):
+        """
+        Perceive rings over whole molecules with Chimera and keep those in
+        ligands. Slower, but it does not depend on residue or atom names to
+        preselect the candidates.
+        """
         hetero = chimera.specifier.evalSpec('ligand', models=molecules).residues()
         rings_per_molecule = defaultdict(dict)
         for m in molecules:
             for ring in m.minimumRings():
                 a = next(iter(ring.atoms))
-                if len(ring.atoms) <= 6 and a.residue in hetero:
-                    if all(a.name in ATOM_NAMES for a in ring.atoms):
-                        rings_per_molecule[m][a.residue] = ring
-                    elif a.residue.type in REVERSE_RESIDUE_CODES:
-                        self._problematic_residues.append(a.residue)
+                if a.residue in hetero and (residues is None or a.residue in residues):
+                    self._classify_ring(rings_per_molecule[m], a.residue, ring.orderedAtoms)
         return rings_per_molecule
 
-    def draw(self):
+    def draw(self, residues=None):
         """
-        Draw each residue shape according to its SNFG assignment
+        Draw each residue shape according to its SNFG assignment.
+
+        Parameters
+        ----------
+        residues : iterable of chimera.Residue, optional
+            Only (re)draw the shapes and connectors of these residues.
+            By default, everything is drawn again.
         """
-        for residue, saccharyde in self.saccharydes.items():
-            saccharyde.build()
+        self.saccharydes.update_coordinates()
+        if residues is not None:
+            residues = set(r for r in residues if r in self.saccharydes)
+            if not residues:
+                return
+        if self.merge:
+            for molecule, drawn in self.molecules.items():
+                if drawn and (residues is None or residues.intersection(drawn)):
+                    self.draw_merged(molecule, drawn, only=residues)
+        else:
+            # Each residue only needs the transform that places its shape template
+            table = self.saccharydes
+            rows = np.arange(len(table)) if residues is None else table.index_of(residues)
+            transforms = glyph_frames(table.centers[rows], table.p1s[rows],
+                                      table.p6s[rows], table.sizes[rows])
+            saccharydes = [table.row(i) for i in rows]
+            for saccharyde, transform in zip(saccharydes, transforms):
+                saccharyde.build(transform=transform)
+            if self.connect:
+                for saccharyde in saccharydes:
+                    self.connect_attached_rings(saccharyde)
+        if residues is None:
+            # Molecules without merged meshes only keep their detection
+            for molecule in list(self._lookups):
+                lookup = self._take_lookup(molecule)
+                if lookup is not None:
+                    self._store_cached(lookup)
+        for residue in (self.saccharydes if residues is None else residues):
             for a in residue.atoms:
                 a.display = not self.hide_residue
+
+    def draw_merged(self, molecule, residues, only=None):
+        """
+        Draw all the shapes of `molecule` in a single surface model, and all
+        its connectors in another one. Triangles keep track of the residue
+        they belong to, so residues can be hidden with `hide`.
+
+        If `only` is given, only the shapes and connectors of those residues
+        are rebuilt, and the rest of the models are kept.
+        """
+        if molecule not in self.layers:
+            Saccharyde._base_id[0] += 1
+            name = 'SNFG {}'.format(molecule.name)
+            self.layers[molecule] = (MeshLayer(name + ' shapes', Saccharyde._base_id[0], 0),
+                                     MeshLayer(name + ' connectors', Saccharyde._base_id[0], 1))
+        shapes, connectors = self.layers[molecule]
+        self._drop_frame_cache(molecule)
+        saccharydes, instances = self._instance_glyphs(molecule, residues)
+        lookup = self._take_lookup(molecule) if only is None else None
+        if only is None:
+            glyphs = (lookup and lookup.mesh('glyphs')) or instances.mesh()
+            shapes.set(residues, *glyphs)
+            redrawn = range(len(residues))
+        else:
+            redrawn = [i for i, r in enumerate(residues) if r in only]
+            mesh, owners = instances.mesh(items=redrawn)
+            shapes.update([residues[i] for i in redrawn], mesh,
+                          np.searchsorted(redrawn, owners))
+
         if self.connect:
-            for residue, saccharyde in self.saccharydes.items():
-                self.connect_attached_rings(saccharyde)
+            batch = self._connectors[molecule]
+            keys = [residues[i] for i in redrawn]
+            if self.labels is not None:
+                self.labels.remove(list(batch.keys) if only is None else keys)
+            if only is None:
+                batch.clear()
+            attrs = [self.connector_attrs(saccharydes[i]) for i in redrawn]
+            batch.update(keys, attrs)
+            if self.bondtypes:
+                self._add_labels(keys, attrs)
+            # All the connectors of the molecule are meshed at once
+            cached = lookup and lookup.mesh('connectors')
+            meshed = cached or batch.mesh(self._connector_colors(batch.positions))
+            connectors.set(batch.keys, *meshed)
+        if lookup is not None:
+            self._store_cached(lookup, glyphs, meshed if self.connect else None)
+
+    def move(self):
+        """
+        Follow new coordinates (e.g. a new trajectory frame) by recomputing
+        the frame of each residue and the end points of each connector, and
+        replacing the vertices of the models already drawn. Nothing is
+        detected again, and no model is closed or reopened. Frames cached
+        by `precompute` skip the ring geometry, but the meshes are still
+        rebuilt from their transforms.
+        """
+        table = self.saccharydes
+        table.update_coordinates()
+        if self.merge:
+            for molecule, drawn in self.molecules.items():
+                if not drawn or molecule not in self.instances:
+                    continue
+                shapes, connectors = self.layers[molecule]
+                batch = self._connectors.get(molecule) if self.connect else None
+                cache = self._frame_caches.get(molecule)
+                if cache is not None and molecule.activeCoordSet.id in cache:
+                    transforms, starts, ends = cache.lookup(molecule.activeCoordSet.id)
+                else:
+                    rows = table.index_of(drawn)
+                    transforms = glyph_frames(table.centers[rows], table.p1s[rows],
+                                              table.p6s[rows], table.sizes[rows])
+                    if batch:
+                        starts, ends = self._connector_ends(batch.keys, batch.targets)
+                instances = self.instances[molecule]
+                instances.update(transforms)
+                shapes.set(drawn, *instances.mesh())
+                if batch:
+                    batch.move(starts, ends)
+                    connectors.set(batch.keys,
+                                   *batch.mesh(self._connector_colors(batch.positions)))
+                    if self.labels is not None:
+                        self.labels.move(batch.keys, starts, ends)
+        else:
+            transforms = glyph_frames(table.centers, table.p1s, table.p6s, table.sizes)
+            for saccharyde, transform in zip(table.values(), transforms):
+                if saccharyde.vrml is not None:
+                    saccharyde.vrml.move(transform)
+            connected = [s for s in table.values()
+                         if s.vrml is not None and s.vrml._vrml_connector is not None]
+            if connected:
+                attrs = [s.vrml._vrml_connector.attrs for s in connected]
+                starts, ends = self._connector_ends([s.residue for s in connected],
+                                                    [a['target'] for a in attrs])
+                for saccharyde, a, start, end in zip(connected, attrs, starts, ends):
+                    saccharyde.vrml.move_connector(start, end, a['cylinder_radius'],
+                                                   a['sphere_radius'])
+                if self.labels is not None:
+                    self.labels.move([s.residue for s in connected], starts, ends)
+
+    def precompute(self, frames=None, directory=None):
+        """
+        Compute the glyph transforms and connector end points of the
+        tracked molecules for each of their coordinate sets, and keep
+        them memory-mapped on disk, so that playing back a trajectory
+        does not compute ring geometry again. Only the frames are cached:
+        `move` still rebuilds the glyph and connector meshes from them.
+        Only used for merged models. The cache is dropped whenever
+        residues are redrawn or atoms are moved.
+
+        Parameters
+        ----------
+        frames : iterable of int, optional
+            Ids of the coordinate sets to precompute. All by default.
+        directory : str, optional
+            Where to write the cache files. By default, a new temporary
+            directory, removed with the last cache.
+
+        Returns
+        -------
+        int
+            Number of frames cached, over all molecules.
+        """
+        self.drop_frames()
+        if directory is None:
+            directory = self._frame_directory = tempfile.mkdtemp(prefix='snfg-')
+        try:
+            self._precompute(frames, directory)
+        finally:
+            if not self._frame_caches:
+                self._remove_frame_directory()
+        return sum(len(cache) for cache in self._frame_caches.values())
+
+    def drop_frames(self):
+        """
+        Forget the frames cached by `precompute` and remove their files.
+        """
+        for molecule in list(self._frame_caches):
+            self._drop_frame_cache(molecule)
+
+    def _precompute(self, frames, directory):
+        table = self.saccharydes
+        table.update_coordinates()
+        for i, (molecule, drawn) in enumerate(self.molecules.items()):
+            if not drawn or molecule not in self.instances:
+                continue
+            ids = sorted(molecule.coordSets) if frames is None else [
+                f for f in frames if f in molecule.coordSets]
+            rows = table.index_of(drawn)
+            own_atoms = [j for j, a in enumerate(table.atoms) if a.molecule is molecule]
+            batch = self._connectors.get(molecule) if self.connect else None
+            keys, targets = (batch.keys, batch.targets) if batch else ([], [])
+
+            def compute(frame, molecule=molecule, rows=rows, own_atoms=own_atoms,
+                        keys=keys, targets=targets):
+                coordset = molecule.coordSets[frame]
+                xyz = table.xyz.copy()
+                xyz[own_atoms] = atom_coordinates([table.atoms[j] for j in own_atoms],
+                                                  coordset)
+                centers, p1s, p6s = table.ring_geometry(xyz)
+                transforms = glyph_frames(centers[rows], p1s[rows], p6s[rows],
+                                          table.sizes[rows])
+                starts, ends = self._connector_ends(keys, targets, (centers, p1s), coordset)
+                return transforms, starts, ends
+
+            self._frame_caches[molecule] = FrameCache.build(
+                os.path.join(directory, 'molecule{}'.format(i)), ids,
+                len(drawn), len(keys), compute)
+
+    def _drop_frame_cache(self, molecule):
+        cache = self._frame_caches.pop(molecule, None)
+        if cache is not None:
+            cache.delete()
+        if not self._frame_caches:
+            self._remove_frame_directory()
+
+    def _remove_frame_directory(self):
+        if self._frame_directory is not None:
+            shutil.rmtree(self._frame_directory, ignore_errors=True)
+            self._frame_directory = None
+
+    def set_bondcolors(self, bondcolors):
+        """
+        Switch the connectors between plain gray and colored by the
+        position of their linkage. Only the vertex colors of the models
+        already drawn are replaced.
+        """
+        self.bondcolors = bondcolors
+        for molecule, batch in self._connectors.items():
+            if molecule in self.layers and len(batch):
+                colors = self._connector_colors(batch.positions)
+                self.layers[molecule][1].recolor(batch.vertex_colors(colors))
+        for saccharyde in self.saccharydes.values():
+            vrml = saccharyde.vrml
+            if vrml is None or vrml._vrml_connector is None:
+                continue
+            position = vrml._vrml_connector.attrs.get('position', 0)
+            vrml.recolor_connector(self._connector_colors([position])[0])
+
+    def _add_labels(self, residues, attrs):
+        """
+        Label the glycosidic connectors among those of `residues`. All the
+        labels of this instance share a single marker set, opened the
+        first time one is needed.
+        """
+        labeled = [(r, a) for r, a in zip(residues, attrs) if 'label' in a]
+        if self.labels is not None and len(labeled) < len(residues):
+            self.labels.remove([r for r, a in zip(residues, attrs) if 'label' not in a])
+        if not labeled:
+            return
+        if self.labels is None:
+            Saccharyde._base_id[0] += 1
+            self.labels = LabelLayer('SNFG labels', (Saccharyde._base_id[0], 0))
+        self.labels.add([r for r, _ in labeled], [a['start'] for _, a in labeled],
+                        [a['end'] for _, a in labeled], [a['label'] for _, a in labeled])
+
+    def update(self, residues):
+        """
+        Detect and draw the carbohydrates among `residues`, e.g. because
+        they were just created or bonded, and rebuild the connectors of the
+        saccharydes linked to them. The rest of the drawing is kept.
+        """
+        residues = set(r for r in residues if r.molecule in self.molecules)
+        if not residues:
+            return
+        self.detect(residues=[r for r in residues if r not in self.saccharydes])
+        # A new residue can change the linkage of the saccharydes bonded to it
+        affected = set(residues)
+        for residue in residues:
+            for atom in residue.atoms:
+                affected.update(n.residue for n in atom.neighbors)
+        self.graph.update(affected)
+        self.draw(residues=affected)
+        self._report_problematic_residues()
 
     def connect_attached_rings(self, ring):
         """
         Build a cylinder that connects `ring` with its adjacent one,
         given by `ring.a1`
         """
-        geom_center = ring.center
-        bild = ""
-        # Connections (cylinders) depend on linkage type
-        O_att, N_att, C_att = None, None, None
-        for neighbor in ring.a1.neighbors:
-            if (neighbor.element.name == 'O' and
-                neighbor.residue != ring.residue and
-                neighbor.name != 'O{}'.format(ring.shifted + 5)):
-                O_att = neighbor
-                break
-            elif neighbor.element.name == 'N':
-                N_att = neighbor
-                break
-        if O_att is not None:
-            # Check if the oxygen is then attached to a carbon
-            for neighbor in O_att.neighbors:
-                if neighbor.element.name == 'C' and neighbor.residue != ring.a1.residue:
-                    C_att = neighbor
-                    break
-            # If the oxygen is attached to a carbon
-            # Then the attached residue is a carbohydrate or this is an O-linked glycan
-            # Check for ring atoms of the attached carbohydrate residue
-            if C_att is not None:
-                attached_ring = self.saccharydes.get(C_att.residue)
-                # If the attached residue contains ring atoms
-                # Then the attached residue is a carbohydrate
-                # Set position of attachment as geometric center of ring atoms
-                # of attached carbohydrate residue
-                if attached_ring is not None and attached_ring is not ring:
-                    # TODO: Check name of C and color accordingly
-                    bild_attrs = dict(start=geom_center, end=attached_ring.center,
-                                      sphere_radius=self.cylinder_radius,
-                                      cylinder_radius=self.cylinder_radius,
-                                      kind='saccharyde ' + C_att.name,
-                                      label=C_att.name)
-                # Otherwise this is an O-linked glycan or GLYCAM OME or TBT
-                else:
-                    # Check for alpha carbon of attached protein residue
-                    att_CA = C_att.residue.atomsMap.get('CA')
-                    if att_CA is not None:
-                        # Then it is attached to a protein via CA and is an O-linked glycan
-                        bild_attrs = dict(start=geom_center, end=att_CA[0].coord(),
-                                          sphere_radius=self.cylinder_radius,
-                                          cylinder_radius=self.cylinder_radius,
-                                          kind='O-linked glycan')
-                    else:
-                        # Then GLYCAM OME or TBT
-                        bild_attrs = dict(start=geom_center, end=O_att.coord(),
-                                          sphere_radius=self.size *
-                                          SCALES['sphere'] * self.sphere_redfac,
-                                          cylinder_radius=self.cylinder_radius * self.cylinder_redfac,
-                                          kind='GLYCAM OME or TBT')
-            # If the oxygen is not attached to a carbon
-            else:
-                # Then it is a terminal oxygen and marks the reducing end
-                bild_attrs = dict(start=geom_center, end=O_att.coord(),
-                                  sphere_radius=self.size * SCALES['sphere'] * self.sphere_redfac,
-                                  cylinder_radius=self.cylinder_radius * self.cylinder_redfac,
-                                  kind='reducing end')
-                # If the residue has an attached nitrogen
-        elif N_att is not None:
-            # Then we assume this is an N-linked glycan
-                        # Set position of attachment as the linked CA
-            att_CA = N_att.residue.atomsMap['CA']
-            bild_attrs = dict(start=geom_center, end=att_CA[0].coord(),
-                              sphere_radius=self.cylinder_radius,
-                              cylinder_radius=self.cylinder_radius,
-                              kind='N-linked glycan')
-        # If there is no oxygen or nitrogen attached
-        else:
-            # Generate a point to denote terminal
-            vec = ring.p1 - chimera.Point(*geom_center)
-            vecadj = (1.43 / vec.length) * vec
-            geom_center_att = ring.p1 + vecadj
-            bild_attrs = dict(start=geom_center, end=geom_center_att,
-                              sphere_radius=self.cylinder_radius,
-                              cylinder_radius=self.cylinder_radius,
-                              kind='terminal')
-
-        geom_center_att = bild_attrs['end']
-        bild = """
-        .color gray
-        .sphere {end[0]} {end[1]} {end[2]} {sphere_radius}
-        .cylinder {start[0]} {start[1]} {start[2]} {end[0]} {end[1]} {end[2]} {cylinder_radius}
-        """.format(**bild_attrs)
-
-        ring.vrml._vrml_connector = ring.vrml._build_vrml(bild, name='SNFG connector {}'.format(bild_attrs['kind']))
-        ring.vrml._vrml_connector[0].attrs = bild_attrs
-
-        if self.bondtypes and 'label' in bild_attrs:
-            ms = MarkerSet('SNFG label {}'.format(bild_attrs['kind']))
-            ms.marker_model((ring.vrml._vrml_connector[0].id,
-                             ring.vrml._vrml_connector[0].subid + 1))
-            ring.vrml._vrml_connector[0].markerset = ms
-            ms.place_marker(bild_attrs['start'], None, 0.1)
-            ms.place_marker(bild_attrs['end'], None, 0.1)
-            link = ms.molecule.newBond(*ms.molecule.atoms[:2])
-            link.label = bild_attrs['label']
-            link.labelColor = chimera.colorTable.getColorByName('black')
+        attrs = self.connector_attrs(ring)
+        ring.vrml.connector_color = self._connector_colors([attrs.get('position', 0)])[0]
+        ring.vrml.connector_mesh = connector_mesh(tuple(attrs['start']), tuple(attrs['end']),
+                                                  attrs['cylinder_radius'],
+                                                  attrs['sphere_radius'],
+                                                  ring.vrml.connector_color)
+        ring.vrml._vrml_connector = ring.vrml._build_model(
+            ring.vrml.connector_mesh, name='SNFG connector {}'.format(attrs['kind']))
+        ring.vrml._vrml_connector.attrs = attrs
+
+        if self.bondtypes:
+            self._add_labels([ring.residue], [attrs])
         return ring.vrml._vrml_connector
 
-    def destroy_shapes(self):
-        for s in self.saccharydes.values():
-            s.destroy()
-        self.saccharydes = {}
+    def export(self, path, fmt=None):
+        """
+        Save all the shapes and connectors currently drawn to `path`, as
+        BILD, binary glTF, PLY or OBJ, depending on `fmt` or the extension.
+        See `export.save`.
+        """
+        meshes = [layer.mesh for layers in self.layers.values() for layer in layers
+                  if layer.mesh is not None]
+        for saccharyde in self.saccharydes.values():
+            if saccharyde.vrml is not None:
+                meshes.extend(m for m in (saccharyde.vrml.mesh, saccharyde.vrml.connector_mesh)
+                              if m is not None)
+        save_mesh(Mesh.concatenate(meshes), path, fmt)
+
+    def export_bild(self, path):
+        """
+        Save all the shapes and connectors currently drawn as a BILD file.
+        """
+        self.export(path, fmt='bild')
 
-    def _update_cb(self, name, data, changes):
+    def hide(self, residues):
         """
-        Update shapes position and orientation after coordinates change.
+        Hide the shapes and connectors of `residues`.
         """
-        if (set(self.molecules) & changes.modified
-            and 'activeCoordSet changed' in changes.reasons):
-            self.draw()
+        self._set_display(residues, False)
 
-    def _update_res_cb(self, name, data, changes):
-        if changes.deleted:
-            for r, saccharyde in self.saccharydes.items():
-                try:
-                    self._problematic_residues.remove(r)
-                except:
-                    pass
-                if r in changes.deleted:
-                    saccharyde.destroy()
-                    del self.saccharydes[r]
-
-
-class Saccharyde(object):
-
-    _base_id = [99]
-
-    def __init__(self, residue, ring_atoms, base_size=4.0):
-        self.residue = residue
-        self.name = REVERSE_RESIDUE_CODES.get(residue.type, 'UNK')
-        self.atoms = ring_atoms
-        self.base_size = base_size
-        self.info = RESIDUES[self.name]
-        self.fullname = self.info.get('name')
-        self.shape = self.info.get('shape')
-        self.size = SCALES.get(self.shape, 1.0) * base_size
-        colors = self.info.get('color').split()
-        self.color2 = self.color1 = 'snfg_' + colors[0]
-        if len(colors) == 2:
-            self.color2 = 'snfg_' + colors[1]
-        self.atom_map = {a.name: a for a in self.atoms}
-        self.shifted = min(self.atom_map.keys()) == 'C2'
-        self.vrml = None
-        self._base_id[0] += 1
-        self._id = self._base_id[0]
+    def show(self, residues):
+        """
+        Show the shapes and connectors of `residues` again.
+        """
+        self._set_display(residues, True)
+
+    def _set_display(self, residues, display):
+        for layers in self.layers.values():
+            for layer in layers:
+                (layer.show if display else layer.hide)(residues)
+        for residue in residues:
+            saccharyde = self.saccharydes.get(residue)
+            if saccharyde is not None and saccharyde.vrml is not None:
+                for model in (saccharyde.vrml._vrml_shape, saccharyde.vrml._vrml_connector):
+                    if model is not None:
+                        model.display = display
+
+    def residue_at(self, model, triangle):
+        """
+        Residue drawn by the `triangle`-th triangle of surface `model`,
+        e.g. as reported by picking.
+        """
+        for layers in self.layers.values():
+            for layer in layers:
+                if layer.model is model:
+                    return layer.key_at(triangle)
+        for residue, saccharyde in self.saccharydes.items():
+            if saccharyde.vrml is not None and model in (saccharyde.vrml._vrml_shape,
+                                                         saccharyde.vrml._vrml_connector):
+                return residue
 
-    def destroy(self):
-        if self.vrml is not None:
-            self.vrml.destroy()
+    def destroy_shapes(self):
+        for s in self.saccharydes.values():
+            s.destroy()
+        self.saccharydes.clear()
+        self.graph.clear()
+        if self.labels is not None:
+            self.labels.close()
+            self.labels = None
+
+    @contextmanager
+    def batch(self):
+        """
+        Suspend the updates triggered by changes to the molecules, and
+        apply them all at once when the block ends::
 
-    @property
-    def center(self):
-        masses = [a.element.mass for a in self.atoms]
-        return np.average(self.xyz, axis=0, weights=masses)
+            with snfg.batch():
+                for step in range(100):
+                    minimize_step()
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self.flush()
 
-    @property
-    def center_att(self):
+    def flush(self):
         """
-        Get the geometric center of the ring attached to this
-        ring, and draw cylinders connecting rings. In some cases,
-        there is no attached residue. The following line assigns
-        the coordinates of the C1 atom (or C2 for sialic acids)
-        to be the geometric center of the attached residue so that
-        the shapes can be aligned properly without crashing when no
-        residue is attached.
+        Apply the changes collected by the trigger callbacks since the
+        last flush: deletions, new residues, then new coordinates.
         """
-        return self.p1
-
-    @property
-    def a1(self):
+        pending, self._pending = self._pending, _Pending()
+        for m in pending.molecules:
+            if m not in self.molecules and not m.__destroyed__:
+                self.molecules[m] = None
+                pending.created.update(m.residues)
+        if pending.deleted:
+            pending.created.difference_update(pending.deleted)
+            self._remove_residues(pending.deleted)
+        if pending.created:
+            self.update(pending.created)
+        if pending.invalidated:
+            for molecule in pending.invalidated:
+                self._drop_frame_cache(molecule)
+            self.saccharydes.invalidate()
+        if pending.moved or pending.invalidated:
+            self.move()
+
+    def _new_frame_cb(self, name, data, changes):
         """
-        first member of the ring: usually the first carbon atom.
+        Run at most one update per redraw, unless in a `batch`.
         """
-        return self.atom_map['C{}'.format(self.shifted + 1)]
+        if not self._batch_depth and self._pending:
+            self.flush()
 
-    @property
-    def a6(self):
+    def _update_cb(self, name, data, changes):
+        """
+        Update shapes position and orientation after coordinates change,
+        and look for carbohydrates in newly opened molecules.
+        """
+        if (set(self.molecules) & changes.modified
+            and 'activeCoordSet changed' in changes.reasons):
+            self._pending.moved = True
+        if self._all_molecules and changes.created:
+            self._pending.molecules.update(
+                m for m in changes.created
+                if isinstance(m, chimera.Molecule) and m not in self.molecules
+                and not m.name.startswith('SNFG'))
+
+    def _update_coords_cb(self, name, data, changes):
         """
-        sixth member of the ring: usually the last oxygen atom.
+        Atoms were moved within a coordinate set, so cached ring
+        coordinates are no longer valid.
         """
-        return self.atom_map['O{}'.format(self.shifted + 5)]
+        for molecule in self.molecules:
+            if molecule.__destroyed__:
+                continue
+            if set(molecule.coordSets.values()) & changes.modified:
+                self._pending.invalidated.add(molecule)
 
-    @property
-    def p1(self):
+    def _update_res_cb(self, name, data, changes):
+        self._pending.deleted.update(changes.deleted)
+        self._pending.created.update(changes.created)
+
+    def _update_bond_cb(self, name, data, changes):
         """
-        Coordinates of the first member of the ring: usually the first carbon atom.
+        New bonds can close new rings or change linkages.
         """
-        return self.a1.coord()
+        self._pending.created.update(a.residue for bond in changes.created for a in bond.atoms)
 
-    @property
-    def p6(self):
+    def _remove_residues(self, deleted):
         """
-        Coordinates of the sixth member of the ring: usually the last oxygen atom.
+        Forget the `deleted` residues and close their shapes, connectors
+        and labels in bulk, leaving the rest of the scene untouched.
         """
-        return self.a6.coord()
+        deleted = set(deleted)
+        self._problematic_residues.difference_update(deleted)
+        removed = self.saccharydes.remove(deleted)
+        # Saccharydes that were attached to deleted residues get a new linkage
+        relinked = self.graph.remove(deleted)
+        models = [model for row in removed if row.vrml is not None
+                  for model in row.vrml.models()]
+        for molecule, drawn in self.molecules.items():
+            if not drawn or deleted.isdisjoint(drawn):
+                continue
+            gone = [r for r in drawn if r in deleted]
+            drawn = self.molecules[molecule] = [r for r in drawn if r not in deleted]
+            for layer in self.layers.get(molecule, ()):
+                layer.remove(gone)
+            if molecule in self._connectors:
+                self._connectors[molecule].remove(gone)
+            if molecule in self.instances:
+                self._instance_glyphs(molecule, drawn)
+            self._drop_frame_cache(molecule)
+        if self.labels is not None:
+            self.labels.remove(deleted)
+        chimera.openModels.close(models)
+        for row in removed:
+            if row.vrml is not None:
+                row.vrml.destroy()
+        # Stop tracking closed molecules altogether
+        for molecule in [m for m in self.molecules if m.__destroyed__]:
+            del self.molecules[molecule]
+            for layer in self.layers.pop(molecule, ()):
+                layer.close()
+            self._connectors.pop(molecule, None)
+            self.instances.pop(molecule, None)
+            self._lookups.pop(molecule, None)
+            self._drop_frame_cache(molecule)
+        if relinked:
+            self.draw(residues=relinked)
+
+
+class _Pending(object):
+
+    """
+    Changes reported by the triggers that are waiting for `SNFG.flush`.
+    """
+
+    def __init__(self):
+        self.moved = False
+        self.invalidated = set()
+        self.molecules = set()
+        self.created = set()
+        self.deleted = set()
 
-    @property
-    def xyz(self):
-        return [a.coord() for a in self.atoms]
+    def __bool__(self):
+        return bool(self.moved or self.invalidated or self.molecules
+                    or self.created or self.deleted)
+    __nonzero__ = __bool__
 
-    @property
-    def xform_xyz(self):
-        return [a.xformCoord() for a in self.atoms]
 
-    def build(self):
+class Saccharyde(SaccharydeRow):
+
+    """
+    Row view of a `SaccharydeTable` that also knows how to draw itself
+    as an individual model.
+    """
+
+    __slots__ = ()
+
+    def destroy(self):
+        if self.vrml is not None:
+            self.vrml.destroy()
+
+    def build(self, transform=None):
         if self.vrml is not None:
             self.vrml.destroy()
         name = 'SNFG {}'.format(self.fullname)
         self.vrml = OrientedShape(self.shape, self.p6, self.size, self.center,
                                   self.center_att, self.color1, self.color2, name,
                                   parent_id=self._id)
-        self.vrml.draw()
+        self.vrml.draw(transform=transform)
 
 
 class OrientedShape(object):
@@ -462,546 +921,70 @@ class OrientedShape(object):
         self.color2 = color2
         self._vrml_shape = None
         self._vrml_connector = None
+        self.transform = None
+        self.mesh = None
+        self.connector_mesh = None
+        self.connector_color = None
         self._id = parent_id
         self._subid = 0
 
-    def destroy(self):
-        if self._vrml_shape is not None:
-            chimera.openModels.close(self._vrml_shape)
-            self._vrml_shape = None
-        if self._vrml_connector is not None:
-            chimera.openModels.close(self._vrml_connector)
-            self._vrml_connector = None
-
-    def draw(self):
-        self._vrml_shape = getattr(self, '_draw_' + self.shape)()
-
-    def _draw_sphere(self):
-        x, y, z = self.center
-        bild = """
-        .color {}
-        .sphere {} {} {} {}
-        """.format(self.color1, x, y, z, self.size)
-        return self._build_vrml(bild)
-
-    def _draw_cube(self):
-        center = Point(*self.center)
-        center_att = Point(*self.center_att)
-        p6 = Point(*self.p6)
-        vec_AB = center_att - center
-
-        # Resize the shape. $size refers to the total size,
-        # $half_length refers to the distance required create
-        # points on either side of the geometric center.
-        half_length = self.size / 2.0
-
-        # Vec_AB is currently too large, we want it to be adjusted so that the distance is equal to the offset
-        # that will be used to place the ponits around the geometric center. The equation asks the question,
-        # what factor should be multiplied times the distance in order to prodce $half-length?
-        adjustment = half_length / center.distance(center_att)
-
-        # Adjust vector_AB by the amount determined in both the forward and reverse directions
-        adj_vec_AB_1 = vec_AB * adjustment
-        adj_vec_AB_2 = adj_vec_AB_1 * -1
-
-        # Add two points along the line connecting the residues in the forward and reverse direction
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        # perp_1 represents a point perpendicular to the previously created two
-        perp_1 = normalize(cross(x1 - x2, x2 - p6))
-        perp1 = perp_1 * half_length
-        perp2 = perp1 * -1
-
-        # Each 'o' represents a point on the box (o stands for original points, which are based on the two that
-        # lie along the line connecting the two residues)
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-
-        # This creates 8 points (the corners of the box) based upon the coordinates of o1-o4
-        perp_for = normalize(cross(o1 - o2, o3 - o1)) * half_length
-        perp_back = perp_for * -1
-        points = dict(s1=perp_for + o1,
-                      s2=perp_for + o2,
-                      s3=perp_for + o3,
-                      s4=perp_for + o4,
-                      s5=perp_back + o1,
-                      s6=perp_back + o2,
-                      s7=perp_back + o3,
-                      s8=perp_back + o4)
-
-        # Draw the Cube - some cubes require two colors, so the triangles are intentionally divided so that one
-        # side shows both colors
-        # Color 1 (blue, yellow, or green)
-        bild = """
-        .color {color1}
-        .polygon {s2} {s3} {s4}
-        .polygon {s1} {s2} {s6}
-        .polygon {s4} {s7} {s8}
-        .polygon {s5} {s6} {s8}
-        .polygon {s2} {s4} {s8}
-        .polygon {s1} {s5} {s7}
-        .color {color2}
-        .polygon {s1} {s3} {s2}
-        .polygon {s3} {s7} {s4}
-        .polygon {s1} {s6} {s5}
-        .polygon {s5} {s8} {s7}
-        .polygon {s2} {s8} {s6}
-        .polygon {s1} {s7} {s3}
-        """.format(color1=self.color1, color2=self.color2, **points)
-        return self._build_vrml(bild)
-
-    def _draw_diamond(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        shape_size = self.size * 0.5
-        adjustment = shape_size / center.distance(center_att)
-        adj_vec_AB_1 = adjustment * vec_AB
-        adj_vec_AB_2 = -adjustment * vec_AB
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        perp_1 = cross(x1 - x2, x2 - p6)
-        perp1 = perp_1 * shape_size
-        perp2 = perp_1 * -shape_size
-
-        # The number of sides to the diamond is up for debate. It was suggested to use six sides since the
-        # diamond could look like a cube that has been rotated; however, four seems to work since the cylinder
-        # goes directly through one corner. Maybe it could be an option for the user?
-        # Each 'o' represents a corner of a square that is centered on $geom_center
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-
-        # Determine coordinates for outer points of the diamond
-        # Top point of star is $shape_size above geometric center
-        # Vector distance between center and top point of star
-        d1 = x2 - center
-        outer = [_rotate(o1, center, o2, alpha, d1) + center
-                 for alpha in (90, 180, 270, 360)]
-
-        # The following function creates the top and bottom of the diamond by creating two points at the geometric
-        # center that are perpendicular to the plane of the square (and parallel with the plane of the ring).
-        perp_for = normalize(cross(o1 - o2, o3 - o1)) * shape_size
-        top = perp_for + center
-        bottom = perp_for * -1 + center
-
-        color_and_points = {'outer_{}'.format(i + 1): value
-                            for i, value in enumerate(outer)}
-        color_and_points.update(dict(top=top, bottom=bottom,
-                                     color1=self.color1, color2=self.color2))
-        bild = """
-        .color {color1}
-        .polygon {outer_1} {bottom} {outer_2}
-        .polygon {outer_1} {outer_4} {bottom}
-        .polygon {outer_3} {top} {outer_2}
-        .polygon {outer_3} {outer_4} {top}
-        .color {color2}
-        .polygon {outer_1} {outer_2} {top}
-        .polygon {outer_1} {top} {outer_4}
-        .polygon {outer_3} {outer_2} {bottom}
-        .polygon {outer_3} {bottom} {outer_4}
-        """.format(**color_and_points)
-        return self._build_vrml(bild)
-
-    def _draw_cone(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        half_length = self.size / 2.0
-
-        # Vec_AB is currently too large, we want it to be adjusted so that the distance is equal to the offset
-        # that will be used to place the points around the geometric center. The equation asks the question,
-        # what factor should be multiplied times the distance in order to prodce $half-length?
-        # Two adjustments are added to shift the geom_center of the shape.
-        _adjustment = half_length / center.distance(center_att)
-        adjustment1 = _adjustment * 0.66
-        adjustment2 = _adjustment * 1.33
-        # Adjust vector_AB by the amount determined in both the forward and reverse directions
-        adj_vec_AB_1 = adjustment1 * vec_AB
-        adj_vec_AB_2 = -adjustment2 * vec_AB
-
-        # Add two points along the line connecting the residues in the forward and reverse direction
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        # perp_1 represents a point perpendicular to the previously created two
-        perp1 = normalize(cross(x1 - x2, x2 - p6))
-        perp2 = -0.5 * perp1
-        o1 = perp1 + x1
-        o2 = perp2 + x1
-        perp3 = normalize(cross(o1 - x2, x2 - center_att)) * half_length
-        o3 = perp3 + x1
-
-        # Determine coordinates for outer points of the rectangle
-        # Top point of rectangle is $half_length above geometric center
-        # Vector distance between center and top point of rectangle
-        d1 = o3 - x1
-
-        # Rotate by 90 degrees to identify other points of the rectangle - note that t5 is the same as x1
-        outer = [_rotate(o1, o3, x1, alpha, d1) + x1
-                 for alpha in (45, 90, 135, 180, 225, 270, 315, 360)]
-
-        # Draw the cone
-        color_and_points = {'outer_{}'.format(i + 1): value
-                            for i, value in enumerate(outer)}
-        color_and_points.update(dict(x1=x1, x2=x2,
-                                     color1=self.color1, color2=self.color2))
-
-        bild = """
-        .color {color1}
-        .polygon {outer_1} {outer_2} {x1}
-        .polygon {outer_1} {x1} {outer_8}
-        .polygon {outer_3} {x1} {outer_2}
-        .polygon {outer_3} {outer_4} {x1}
-        .color {color2}
-        .polygon {outer_5} {x1} {outer_4}
-        .polygon {outer_5} {outer_6} {x1}
-        .polygon {outer_7} {x1} {outer_6}
-        .polygon {outer_7} {outer_8} {x1}
-        .color {color1}
-        .polygon {outer_1} {x2} {outer_2}
-        .polygon {outer_1} {outer_8} {x2}
-        .polygon {outer_5} {outer_4} {x2}
-        .polygon {outer_5} {x2} {outer_6}
-        .color {color2}
-        .polygon {outer_3} {outer_2} {x2}
-        .polygon {outer_3} {x2} {outer_4}
-        .polygon {outer_7} {outer_6} {x2}
-        .polygon {outer_7} {x2} {outer_8}
-        """.format(**color_and_points)
-
-        return self._build_vrml(bild)
-
-    def _draw_rectangle(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        half_length = self.size / 1.2
-        thickness = self.size / 1.8
-
-        adjustment = half_length / center.distance(center_att)
-        adj_vec_AB_1 = adjustment * vec_AB
-        adj_vec_AB_2 = -adjustment * vec_AB
-
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        perp1 = normalize(cross(x1 - x2, x2 - p6)) * half_length
-        perp2 = perp1 * -1
-
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-        d1 = x2 - center
-
-        outer = [_rotate(o1, center, o2, alpha, d1) + center
-                 for alpha in (45, 90, 225, 270)]
-
-        perp_for = thickness * normalize(cross(o1 - o2, o3 - o1))
-        perp_back = perp_for * -1
-        color_and_points = dict(
-            center_1=perp_for + center,
-            center_2=perp_back + center,
-            front_1=perp_for + outer[0],
-            front_2=perp_for + outer[1],
-            front_3=perp_for + outer[2],
-            front_4=perp_for + outer[3],
-            back_1=perp_back + outer[0],
-            back_2=perp_back + outer[1],
-            back_3=perp_back + outer[2],
-            back_4=perp_back + outer[3],
-            color1=self.color1, color2=self.color2)
-        # Draw the rectangle
-
-        bild = """
-        .color {color1}
-        .polygon {front_1} {front_2} {center_1}
-        .polygon {front_1} {center_1} {front_4}
-        .polygon {front_3} {center_1} {front_2}
-        .polygon {front_3} {front_4} {center_1}
-        .polygon {back_1} {center_2} {back_2}
-        .polygon {back_1} {back_4} {center_2}
-        .polygon {back_3} {back_2} {center_2}
-        .polygon {back_3} {center_2} {back_4}
-        .polygon {back_1} {back_2} {front_1}
-        .polygon {back_2} {front_2} {front_1}
-        .polygon {back_2} {back_3} {front_2}
-        .polygon {back_3} {front_3} {front_2}
-        .polygon {back_3} {back_4} {front_3}
-        .polygon {back_4} {front_4} {front_3}
-        .polygon {back_4} {back_1} {front_4}
-        .polygon {back_1} {front_1} {front_4}
-        """.format(**color_and_points)
-
-        return self._build_vrml(bild)
-
-    def _draw_star(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        shape_size = self.size * 1.5
-        half_length = shape_size / 2.0
-        thickness = shape_size / 4.0
-
-        adjustment = half_length / center.distance(center_att)
-        adj_vec_AB_1 = adjustment * vec_AB
-        adj_vec_AB_2 = -1 * adj_vec_AB_1
-
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        perp1 = normalize(cross(x1 - x2, x2 - p6)) * half_length
-        perp2 = -1 * perp1
-
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-        d1 = x2 - center
-        d2 = (x1 - center) * 0.5
-
-        # Rotate by 72 degrees to identify other points of the star
-        outer = [_rotate(o1, center, o2, alpha, d1) + center
-                 for alpha in (72, 144, 216, 288, 360)]
-        inner = [_rotate(o1, center, o2, alpha, d2) + center
-                 for alpha in (72, 144, 216, 288, 360)]
-
-        perp_for = thickness * normalize(cross(o1 - o2, o3 - o1))
-        perp_back = -1 * perp_for
-        center_1 = perp_for + center
-        center_2 = perp_back + center
-
-        color_and_points = {'outer_{}'.format(i + 1): value
-                            for i, value in enumerate(outer)}
-        color_and_points.update({'inner_{}'.format(i + 1): value
-                                 for i, value in enumerate(inner)})
-        color_and_points.update(dict(color1=self.color1, color2=self.color2,
-                                     center_1=center_1, center_2=center_2))
-
-        bild = """
-        .color {color1}
-        .polygon {outer_1} {center_1} {inner_3}
-        .polygon {outer_1} {inner_3} {center_2}
-        .polygon {outer_1} {inner_4} {center_1}
-        .polygon {outer_1} {center_2} {inner_4}
-        .polygon {outer_2} {center_1} {inner_4}
-        .polygon {outer_2} {inner_4} {center_2}
-        .polygon {outer_2} {inner_5} {center_1}
-        .polygon {outer_2} {center_2} {inner_5}
-        .polygon {outer_3} {center_1} {inner_5}
-        .polygon {outer_3} {inner_5} {center_2}
-        .polygon {outer_3} {inner_1} {center_1}
-        .polygon {outer_3} {center_2} {inner_1}
-        .polygon {outer_4} {center_1} {inner_1}
-        .polygon {outer_4} {inner_1} {center_2}
-        .polygon {outer_4} {inner_2} {center_1}
-        .polygon {outer_4} {center_2} {inner_2}
-        .polygon {outer_5} {center_1} {inner_2}
-        .polygon {outer_5} {inner_2} {center_2}
-        .polygon {outer_5} {inner_3} {center_1}
-        .polygon {outer_5} {center_2} {inner_3}
-        """.format(**color_and_points)
-
-        return self._build_vrml(bild)
-
-    def _draw_hexagon(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        shape_size = self.size
-        half_length = shape_size / 2.0
-        thickness = shape_size / 4.0
-
-        adjustment = half_length / center.distance(center_att)
-        adj_vec_AB_1 = adjustment * vec_AB
-        adj_vec_AB_2 = -1 * adj_vec_AB_1
-
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        perp1 = normalize(cross(x1 - x2, x2 - p6)) * half_length
-        perp2 = -1 * perp1
-
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-        d1 = x2 - center
-
-        # Rotate by 60 degrees to identify other points of the hexagon - note that t5 is the same as n1
-        outer = [_rotate(o1, center, o2, alpha, d1) + center
-                 for alpha in (0, 45, 135, 180, 225, 315)]
-
-        perp_for = thickness * normalize(cross(o1 - o2, o3 - o1))
-        perp_back = -1 * perp_for
-
-        color_and_points = dict(
-            front_1=perp_for + outer[0],
-            front_2=perp_for + outer[1],
-            front_3=perp_for + outer[2],
-            front_4=perp_for + outer[3],
-            front_5=perp_for + outer[4],
-            front_6=perp_for + outer[5],
-            back_1=perp_back + outer[0],
-            back_2=perp_back + outer[1],
-            back_3=perp_back + outer[2],
-            back_4=perp_back + outer[3],
-            back_5=perp_back + outer[4],
-            back_6=perp_back + outer[5],
-            center_1=perp_for + center,
-            center_2=perp_back + center,
-            color1=self.color1, color2=self.color2,
-        )
-
-        bild = """
-        .color {color1}
-        .polygon {front_1} {front_2} {center_1}
-        .polygon {front_1} {center_1} {front_6}
-        .polygon {front_3} {center_1} {front_2}
-        .polygon {front_3} {front_4} {center_1}
-        .polygon {front_5} {center_1} {front_4}
-        .polygon {front_5} {front_6} {center_1}
-        .polygon {back_1} {center_2} {back_2}
-        .polygon {back_1} {back_6} {center_2}
-        .polygon {back_3} {back_2} {center_2}
-        .polygon {back_3} {center_2} {back_4}
-        .polygon {back_5} {back_4} {center_2}
-        .polygon {back_5} {center_2} {back_6}
-        .polygon {back_1} {back_2} {front_1}
-        .polygon {back_2} {front_2} {front_1}
-        .polygon {back_2} {back_3} {front_2}
-        .polygon {back_3} {front_3} {front_2}
-        .polygon {back_3} {back_4} {front_3}
-        .polygon {back_4} {front_4} {front_3}
-        .polygon {back_4} {back_5} {front_4}
-        .polygon {back_5} {front_5} {front_4}
-        .polygon {back_5} {back_6} {front_5}
-        .polygon {back_6} {front_6} {front_5}
-        .polygon {back_6} {back_1} {front_6}
-        .polygon {back_1} {front_1} {front_6}
-        """.format(**color_and_points)
-        return self._build_vrml(bild)
-
-    def _draw_pentagon(self):
-        center_att = Point(*self.center_att)
-        center = Point(*self.center)
-        p6 = Point(*self.p6)
-
-        vec_AB = center_att - center
-        shape_size = self.size
-        half_length = shape_size / 2.0
-        thickness = shape_size / 4.0
-
-        adjustment = half_length / center.distance(center_att)
-        adj_vec_AB_1 = adjustment * vec_AB
-        adj_vec_AB_2 = -1 * adj_vec_AB_1
-
-        x1 = adj_vec_AB_1 + center
-        x2 = adj_vec_AB_2 + center
-
-        perp1 = normalize(cross(x1 - x2, x2 - p6)) * half_length
-        perp2 = -1 * perp1
-
-        o1 = perp1 + x1
-        o2 = perp1 + x2
-        o3 = perp2 + x1
-        o4 = perp2 + x2
-        d1 = x2 - center
-
-        # Rotate by 60 degrees to identify other points of the hexagon - note that t5 is the same as n1
-        outer = [_rotate(o1, center, o2, alpha, d1) + center
-                 for alpha in (72, 144, 216, 288, 360)]
-
-        perp_for = thickness * normalize(cross(o1 - o2, o3 - o1))
-        perp_back = -1 * perp_for
-
-        color_and_points = dict(
-            front_1=perp_for + outer[0],
-            front_2=perp_for + outer[1],
-            front_3=perp_for + outer[2],
-            front_4=perp_for + outer[3],
-            front_5=perp_for + outer[4],
-            back_1=perp_back + outer[0],
-            back_2=perp_back + outer[1],
-            back_3=perp_back + outer[2],
-            back_4=perp_back + outer[3],
-            back_5=perp_back + outer[4],
-            center_1=perp_for + center,
-            center_2=perp_back + center,
-            color1=self.color1, color2=self.color2,
-        )
-
-        bild = """
-        .color {color1}
-        .polygon {front_1} {front_2} {center_1}
-        .polygon {front_1} {center_1} {front_5}
-        .polygon {front_3} {center_1} {front_2}
-        .polygon {front_3} {front_4} {center_1}
-        .polygon {front_5} {center_1} {front_4}
-        .polygon {back_1} {center_2} {back_2}
-        .polygon {back_1} {back_5} {center_2}
-        .polygon {back_3} {back_2} {center_2}
-        .polygon {back_3} {center_2} {back_4}
-        .polygon {back_5} {back_4} {center_2}
-        .polygon {back_1} {back_2} {front_1}
-        .polygon {back_2} {front_2} {front_1}
-        .polygon {back_2} {back_3} {front_2}
-        .polygon {back_3} {front_3} {front_2}
-        .polygon {back_3} {back_4} {front_3}
-        .polygon {back_4} {front_4} {front_3}
-        .polygon {back_4} {back_5} {front_4}
-        .polygon {back_5} {front_5} {front_4}
-        .polygon {back_5} {back_1} {front_5}
-        .polygon {back_1} {front_1} {front_5}
-        """.format(**color_and_points)
-        return self._build_vrml(bild)
-
-    def _build_vrml(self, bild, name=None):
-        if name is None:
-            name = self.name
-        f = StringIO(dedent(bild))
-        try:
-            vrml = openBildFileObject(f, '<string>', name)
-        except chimera.NotABug:
-            print(bild)
-        else:
-            chimera.openModels.add(vrml, baseId=self._id, subid=self._subid)
-            self._subid += 1
-            return vrml
-
+    def models(self):
+        """
+        Models still open for this shape: the shape itself and its connector.
+        """
+        models = [self._vrml_shape, self._vrml_connector]
+        return [m for m in models if m is not None and not m.__destroyed__]
 
-def _vmd_trans_angle(a, b, c, delta):
-    """
-    Simulates VMD's `trans angle` command
-    """
-    ZERO = Point(0, 0, 0)
-    xf = chimera.Xform.translation(b - ZERO)
-    xf.rotate(cross(a - b, b - c), delta)
-    xf.translate(ZERO - b)
-    return xf
+    def destroy(self):
+        models = self.models()
+        if models:
+            chimera.openModels.close(models)
+        self._vrml_shape = self._vrml_connector = None
 
+    def draw(self, transform=None):
+        """
+        Build the surface model of the shape. `transform` can be provided
+        if it was already computed in batch with `glyph_frames`.
+        """
+        if transform is None:
+            transform = glyph_frames(tuple(self.center), tuple(self.center_att),
+                                     tuple(self.p6), self.size)[0]
+        self.transform = transform
+        self.mesh = TEMPLATES[self.shape].mesh(transform, [rgba(self.color1), rgba(self.color2)])
+        self._vrml_shape = self._build_model(self.mesh)
+
+    def move(self, transform):
+        """
+        Place the shape with a new `transform`, reusing its model.
+        """
+        self.transform = transform
+        self.mesh = TEMPLATES[self.shape].mesh(transform, [rgba(self.color1), rgba(self.color2)])
+        if self._vrml_shape is not None:
+            set_piece_mesh(self._vrml_shape.surfacePieces[0], self.mesh)
 
-def _rotate(a, b, c, delta, x):
-    rotation_xform = _vmd_trans_angle(a, b, c, delta)
-    rotation_array = np.array(rotation_xform.getOpenGLMatrix()).reshape(4, 4).T
-    return Vector(*np.dot(rotation_array, x.data() + (0,))[:3])
+    def move_connector(self, start, end, cylinder_radius, sphere_radius):
+        """
+        Move the connector model to go from `start` to `end`.
+        """
+        self.connector_mesh = connector_mesh(tuple(start), tuple(end), cylinder_radius,
+                                             sphere_radius, self.connector_color)
+        if self._vrml_connector is not None:
+            set_piece_mesh(self._vrml_connector.surfacePieces[0], self.connector_mesh)
 
+    def recolor_connector(self, color):
+        """
+        Paint the connector model with a single RGBA `color`.
+        """
+        self.connector_color = color
+        if self.connector_mesh is not None:
+            self.connector_mesh.colors[:] = color
+        if self._vrml_connector is not None:
+            self._vrml_connector.surfacePieces[0].vertexColors = self.connector_mesh.colors
 
-def normalize(v):
-    return Vector(*M.normalize_vector(v))
+    def _build_model(self, mesh, name=None):
+        if name is None:
+            name = self.name
+        model = surface_model(name, mesh)
+        chimera.openModels.add([model], baseId=self._id, subid=self._subid)
+        self._subid += 1
+        return model
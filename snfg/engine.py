@@ -0,0 +1,401 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Chimera-independent SNFG engine.
+
+Detection of carbohydrate rings, linkage classification and the geometry
+of glyphs and connectors only rely on residues and atoms exposing
+the Chimera attributes listed in `structure`. `Engine` runs on
+`structure.Structure` objects built from plain arrays, with NumPy alone,
+so it can be used in worker processes, scripts and benchmarks.
+`core.SNFG` is the Chimera adapter: it feeds live molecules to the same
+engine and turns its meshes into models.
+"""
+
+from __future__ import absolute_import, print_function, division
+from collections import defaultdict
+import numpy as np
+from .snfg_definitions import (ATOM_NAMES, COLORS_CMYK, REVERSE_RESIDUE_CODES, SCALES,
+                               SUGAR_BOND_COLORS)
+from .cache import pack_mesh, restore, snapshot
+from .geometry import ConnectorBatch, GlyphInstances, Mesh, glyph_frames, linkage_colors
+from .graph import GlycanGraph
+from .rings import smallest_rings
+from .table import COLOR_NAMES, SaccharydeTable, SaccharydeRow, atom_coordinates
+
+_RING_SIGNATURES = [('C1', 'C2', 'C3', 'C4', 'C5', 'O5'),
+                    ('C2', 'C3', 'C4', 'C5', 'C6', 'O6'),
+                    ('C1', 'C2', 'C3', 'C4', 'O4')]
+
+# Chimera's built-in colors used for connectors
+_NAMED_COLORS = dict(gray=(0.745, 0.745, 0.745), black=(0., 0., 0.), white=(1., 1., 1.),
+                     yellow=(1., 1., 0.), orange=(1., 0.647, 0.), red=(1., 0., 0.),
+                     purple=(0.627, 0.125, 0.941), cyan=(0., 1., 1.), green=(0., 1., 0.))
+
+
+def color_rgba(color):
+    """
+    RGBA tuple of a color name, without Chimera. `snfg_*` colors are
+    converted from `COLORS_CMYK` the same way they are defined in Chimera.
+    """
+    if color.startswith('snfg_'):
+        c, m, y, k = COLORS_CMYK[color[5:]]
+        return ((1. - c) * (1. - k), (1. - m) * (1. - k), (1. - y) * (1. - k), 1.)
+    return _NAMED_COLORS[color] + (1.,)
+
+
+def looks_saccharydic(residue_name, atom_names):
+    """
+    Whether a residue called `residue_name`, with a container of
+    `atom_names`, is worth looking for carbohydrate rings in: either its
+    name is a known residue code, or it has all the atom names of a
+    pyranose or furanose ring.
+    """
+    return (residue_name in REVERSE_RESIDUE_CODES or
+            any(all(n in atom_names for n in signature) for signature in _RING_SIGNATURES))
+
+
+def _neighbors_getter(residue):
+    def neighbors(atom):
+        return [n for n in atom.neighbors if n.residue is residue]
+    return neighbors
+
+
+class Engine(object):
+
+    """
+    Detect the saccharydes of some molecules, classify their linkages and
+    compute the geometry of their SNFG glyphs and connectors.
+
+    Parameters
+    ----------
+    size : float, optional
+    connect : bool, optional
+    cylinder_radius : float, optional
+    cylinder_redfac, sphere_redfac : float, optional
+        Reduction factors of the connectors to reducing ends and caps.
+    molecules : list of structure.Structure, optional
+        Molecules to track. Detection must be run with `detect`.
+    thorough : bool, optional
+        Perceive rings in every hetero residue instead of preselecting
+        candidates by residue and atom names.
+    bondcolors : bool, optional
+        Color connectors by the position of their linkage.
+    row_class : table.SaccharydeRow subclass, optional
+    cache : cache.GlycanCache, optional
+        Where to look up the results of molecules seen before, and to
+        store the new ones.
+    """
+
+    def __init__(self, size=4.0, connect=True, cylinder_radius=0.5, cylinder_redfac=0,
+                 sphere_redfac=0, molecules=(), thorough=False, bondcolors=False,
+                 row_class=SaccharydeRow, cache=None):
+        self.molecules = dict((m, None) for m in molecules)
+        self.size = size
+        self.connect = connect
+        self.cylinder_radius = cylinder_radius
+        self.cylinder_redfac = cylinder_redfac
+        self.sphere_redfac = sphere_redfac
+        self.thorough = thorough
+        self.bondcolors = bondcolors
+        self.cache = cache
+        self.saccharydes = SaccharydeTable(base_size=size, row_class=row_class)
+        self.graph = GlycanGraph(self.saccharydes)
+        self.instances = {}
+        self._prototypes = {}
+        self._connectors = defaultdict(ConnectorBatch)
+        self._problematic_residues = set()
+        self._lookups = {}
+
+    @staticmethod
+    def rgba(color):
+        return color_rgba(color)
+
+    def detect(self, residues=None):
+        """
+        Assign appropriate shape/color based on residue name.
+
+        Parameters
+        ----------
+        residues : iterable of residues, optional
+            Only look for new carbohydrates among these residues, keeping
+            the ones already detected. By default, all the residues of
+            the tracked molecules are scanned again, unless they are
+            found in `cache`.
+        """
+        molecules = list(self.molecules)
+        if residues is None and self.cache is not None:
+            molecules = [m for m in molecules if not self._restore_cached(m)]
+        # Collect a list of residues that contain carbohydrate ring atoms
+        rings_per_molecule = self.find_saccharydic_residues(molecules=molecules,
+                                                            residues=residues)
+        # TODO: set carbatoms
+        # TODO: Filter out rings that aren't actually carbohydrates
+        #       (can happen with linear carbohydrates with coordinating ions)
+        # TODO: Check for GLYCAM reducing-terminal ROH to assign appropriate resname color
+
+        for molecule, found in rings_per_molecule.items():
+            # Assign shape/size/color properties based on recognized residue names
+            for residue in self.saccharydes.extend(found.items()):
+                # Rings that cannot be oriented are reported, not drawn
+                del found[residue]
+                self._problematic_residues.add(residue)
+            self.graph.update(found)
+            if residues is None or not self.molecules.get(molecule):
+                self.molecules[molecule] = list(found)
+            else:
+                known = set(self.molecules[molecule])
+                self.molecules[molecule].extend(r for r in found if r not in known)
+        return rings_per_molecule
+
+    def cache_params(self):
+        """
+        Parameters that change the detection and the meshes, which are
+        part of the cache keys along with the molecule.
+        """
+        colors = sorted(set(['gray'] + ['snfg_' + c for c in COLOR_NAMES]
+                            + list(SUGAR_BOND_COLORS.values())))
+        return dict(size=self.size, connect=self.connect, cylinder_radius=self.cylinder_radius,
+                    cylinder_redfac=self.cylinder_redfac, sphere_redfac=self.sphere_redfac,
+                    thorough=self.thorough, bondcolors=self.bondcolors,
+                    colors=[[float(v) for v in self.rgba(c)] for c in colors])
+
+    def _restore_cached(self, molecule):
+        """
+        Look `molecule` up in the cache and restore its saccharydes and
+        linkages if found. The lookup is kept until its meshes are drawn.
+        """
+        # Only the candidates and their partners matter, unless every
+        # hetero residue is perceived
+        candidates = None if self.thorough else self._candidates(molecule.residues)
+        lookup = self._lookups[molecule] = self.cache.lookup(molecule, self.cache_params(),
+                                                             candidates)
+        if lookup.entry is None:
+            return False
+        self.molecules[molecule] = restore(self, molecule, lookup.entry, lookup.index)
+        return True
+
+    def _take_lookup(self, molecule):
+        """
+        Cache lookup made by the last `detect` for `molecule`, if its
+        coordinates did not change since. It can only be taken once.
+        """
+        lookup = self._lookups.pop(molecule, None)
+        if lookup is not None and lookup.current:
+            return lookup
+
+    def _store_cached(self, lookup, glyphs=None, connectors=None):
+        """
+        Store the saccharydes and linkages of the molecule of `lookup`,
+        along with the (mesh, owners) of its `glyphs` and `connectors`,
+        unless the cache already has them. Lookups without a key (e.g.
+        for restored sessions) are not stored.
+        """
+        if self.cache is None or lookup.key is None:
+            return
+        if lookup.entry is not None and (glyphs is None or 'glyphs_vertices' in lookup.entry):
+            return
+        arrays = snapshot(self, lookup.molecule, lookup.index)
+        if arrays is None:
+            return
+        if glyphs is not None:
+            arrays.update(pack_mesh('glyphs', *glyphs))
+        if connectors is not None:
+            arrays.update(pack_mesh('connectors', *connectors))
+        self.cache.put(lookup.key, arrays)
+
+    def find_saccharydic_residues(self, molecules=None, residues=None):
+        """
+        Find carbohydrate rings in `molecules`, or only among `residues`
+        if given.
+
+        Returns
+        -------
+        rings_per_molecule : dict of dict
+            For each molecule, maps each carbohydrate residue to the
+            ordered atoms of its ring.
+        """
+        if molecules is None:
+            molecules = list(self.molecules)
+        if residues is not None:
+            residues = set(residues)
+            molecules = [m for m in molecules if any(r.molecule is m for r in residues)]
+        if self.thorough:
+            return self._find_saccharydic_residues_thorough(molecules, residues)
+        rings_per_molecule = defaultdict(dict)
+        for m in molecules:
+            # Only perceive rings inside residues that look like carbohydrates
+            scope = m.residues if residues is None else [r for r in residues if r.molecule is m]
+            for residue in self._candidates(scope):
+                for ring in smallest_rings(residue.atoms, _neighbors_getter(residue)):
+                    self._classify_ring(rings_per_molecule[m], residue, ring)
+        return rings_per_molecule
+
+    @staticmethod
+    def _candidates(residues):
+        """
+        Residues worth perceiving rings in without `thorough`: the same
+        hetero residues as the thorough mode, preselected by name.
+        """
+        return [r for r in residues if r.isHet and looks_saccharydic(r.type, r.atomsMap)]
+
+    def _find_saccharydic_residues_thorough(self, molecules, residues=None):
+        """
+        Perceive rings in every hetero residue. Slower, but it does not
+        depend on residue or atom names to preselect the candidates.
+        """
+        rings_per_molecule = defaultdict(dict)
+        for m in molecules:
+            for residue in m.residues:
+                if not residue.isHet or (residues is not None and residue not in residues):
+                    continue
+                for ring in smallest_rings(residue.atoms, _neighbors_getter(residue)):
+                    self._classify_ring(rings_per_molecule[m], residue, ring)
+        return rings_per_molecule
+
+    def _classify_ring(self, rings, residue, ring_atoms):
+        if len(ring_atoms) <= 6:
+            if all(a.name in ATOM_NAMES for a in ring_atoms):
+                rings[residue] = ring_atoms
+            elif residue.type in REVERSE_RESIDUE_CODES:
+                self._problematic_residues.add(residue)
+
+    def connector_attrs(self, ring):
+        """
+        Find out where the cylinder that connects `ring` with its adjacent
+        one should end, and how it should look, depending on the linkage
+        type recorded in `self.graph`.
+        """
+        linkage = self.graph.linkage(ring.residue)
+        target = linkage.target
+        if linkage.reduced:
+            # GLYCAM OME or TBT, or terminal oxygen at the reducing end
+            sphere_radius = self.size * SCALES['sphere'] * self.sphere_redfac
+            cylinder_radius = self.cylinder_radius * self.cylinder_redfac
+        else:
+            sphere_radius = cylinder_radius = self.cylinder_radius
+        if target is None:
+            # Generate a point to denote terminal
+            vec = ring.p1 - ring.center
+            end = ring.p1 + (1.43 / np.linalg.norm(vec)) * vec
+        elif target in self.saccharydes:
+            end = self.saccharydes[target].center
+        else:
+            end = target.coord()
+        attrs = dict(start=ring.center, end=end, sphere_radius=sphere_radius,
+                     cylinder_radius=cylinder_radius, kind=linkage.kind, target=target)
+        if linkage.glycosidic:
+            attrs['label'] = linkage.acceptor_atom.name
+            attrs['position'] = linkage.position
+        return attrs
+
+    def _connector_ends(self, residues, targets, geometry=None, coordset=None):
+        """
+        Current start and end points of the connectors of `residues`.
+        Each target, as given by `connector_attrs`, is either another
+        saccharyde residue, an atom, or None for terminal residues.
+
+        The ring centers and first ring members of every table row can be
+        given in `geometry`, as computed by `SaccharydeTable.ring_geometry`
+        for the coordinate set `coordset`.
+        """
+        table = self.saccharydes
+        centers, p1s = (table.centers, table.p1s) if geometry is None else geometry
+        rows = table.index_of(residues)
+        starts = centers[rows]
+        ends = np.empty_like(starts)
+        rings = [i for i, t in enumerate(targets) if t is not None and t in table]
+        atoms = [i for i, t in enumerate(targets) if t is not None and t not in table]
+        terminals = [i for i, t in enumerate(targets) if t is None]
+        if rings:
+            ends[rings] = centers[table.index_of([targets[i] for i in rings])]
+        if atoms:
+            if coordset is None:
+                ends[atoms] = atom_coordinates([targets[i] for i in atoms])
+            else:
+                # The coordinate set only applies to the atoms of its own molecule
+                for i in atoms:
+                    own = targets[i].molecule.coordSets.get(coordset.id) is coordset
+                    ends[i] = atom_coordinates([targets[i]], coordset if own else None)[0]
+        if terminals:
+            # Same point as the one made up by `connector_attrs`
+            vec = p1s[rows[terminals]] - starts[terminals]
+            ends[terminals] = (p1s[rows[terminals]]
+                               + 1.43 * vec / np.linalg.norm(vec, axis=1)[:, None])
+        return starts, ends
+
+    def _connector_colors(self, positions):
+        """
+        (N, 4) colors of the connectors with the given acceptor
+        `positions`: by `SUGAR_BOND_COLORS` if `bondcolors` is set,
+        gray otherwise.
+        """
+        gray = self.rgba('gray')
+        if not self.bondcolors:
+            return np.tile(gray, (len(positions), 1))
+        palette = dict((p, self.rgba(c)) for p, c in SUGAR_BOND_COLORS.items())
+        return linkage_colors(positions, palette, gray)
+
+    def _instance_glyphs(self, molecule, residues):
+        """
+        Place the glyphs of `residues`, all from `molecule`, with one
+        colored mesh per distinct symbol instanced by transform.
+        """
+        table = self.saccharydes
+        rows = table.index_of(residues)
+        saccharydes = [table.row(i) for i in rows]
+        transforms = glyph_frames(table.centers[rows], table.p1s[rows],
+                                  table.p6s[rows], table.sizes[rows])
+        instances = self.instances[molecule] = GlyphInstances(self.rgba, self._prototypes)
+        instances.set([(s.shape, s.color1, s.color2) for s in saccharydes], transforms)
+        return saccharydes, instances
+
+    def glyphs(self, molecule):
+        """
+        Glyphs of the saccharydes detected in `molecule`.
+
+        Returns
+        -------
+        mesh : geometry.Mesh
+        owners : (T,) array of int
+            Position in ``self.molecules[molecule]`` of the residue each
+            triangle belongs to.
+        """
+        residues = self.molecules.get(molecule) or []
+        return self._instance_glyphs(molecule, residues)[1].mesh()
+
+    def connectors(self, molecule):
+        """
+        Connectors of the saccharydes detected in `molecule`, as a
+        `geometry.ConnectorBatch` keyed by residue.
+        """
+        residues = self.molecules.get(molecule) or []
+        batch = self._connectors[molecule]
+        batch.clear()
+        table = self.saccharydes
+        batch.update(residues, [self.connector_attrs(table[r]) for r in residues])
+        return batch
+
+    def mesh(self):
+        """
+        Single mesh with the glyphs of all the tracked molecules, and their
+        connectors if `connect` is set. Meshes found in `cache` by `detect`
+        are reused.
+        """
+        meshes = []
+        for molecule in self.molecules:
+            lookup = self._take_lookup(molecule)
+            glyphs = lookup and lookup.mesh('glyphs')
+            connectors = lookup and lookup.mesh('connectors')
+            if glyphs is None:
+                glyphs = self.glyphs(molecule)
+            if self.connect and connectors is None:
+                batch = self.connectors(molecule)
+                connectors = batch.mesh(self._connector_colors(batch.positions))
+            if lookup is not None:
+                self._store_cached(lookup, glyphs, connectors if self.connect else None)
+            meshes.append(glyphs[0])
+            if self.connect:
+                meshes.append(connectors[0])
+        return Mesh.concatenate(meshes)
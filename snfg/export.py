@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Export SNFG meshes to files, so they can be reused in other viewers.
+
+Besides BILD text for Chimera, meshes can be written as binary glTF
+(``.glb``), binary PLY or Wavefront OBJ. Binary formats are written
+straight from the vertex, normal, color and triangle arrays of the mesh,
+with no per-vertex Python code.
+"""
+
+from __future__ import absolute_import, print_function, division
+import json
+import os
+import struct
+import numpy as np
+
+
+def write_bild(mesh, f):
+    """
+    Write `mesh` to file object `f` as BILD polygons, changing the
+    color only when it differs from the previous triangle.
+    """
+    corners = mesh.vertices[mesh.triangles].reshape(-1, 9)
+    colors = mesh.colors[mesh.triangles[:, 0], :3]
+    current = None
+    for color, corner in zip(colors, corners):
+        if current is None or (color != current).any():
+            current = color
+            f.write('.color {} {} {}\n'.format(*color))
+        f.write('.polygon {} {} {} {} {} {} {} {} {}\n'.format(*corner))
+
+
+def write_ply(mesh, f):
+    """
+    Write `mesh` to binary file object `f` as little-endian binary PLY,
+    with per-vertex normals and RGBA colors.
+    """
+    vertices = np.empty(len(mesh.vertices), dtype=[('xyz', '<f4', 3), ('normal', '<f4', 3),
+                                                   ('rgba', 'u1', 4)])
+    vertices['xyz'] = mesh.vertices
+    vertices['normal'] = mesh.normals
+    vertices['rgba'] = np.round(np.clip(mesh.colors, 0, 1) * 255)
+    faces = np.empty(len(mesh.triangles), dtype=[('n', 'u1'), ('indices', '<i4', 3)])
+    faces['n'] = 3
+    faces['indices'] = mesh.triangles
+    header = '\n'.join([
+        'ply', 'format binary_little_endian 1.0', 'comment SNFG glyphs',
+        'element vertex {}'.format(len(vertices)),
+        'property float x', 'property float y', 'property float z',
+        'property float nx', 'property float ny', 'property float nz',
+        'property uchar red', 'property uchar green', 'property uchar blue',
+        'property uchar alpha',
+        'element face {}'.format(len(faces)),
+        'property list uchar int vertex_indices', 'end_header', ''])
+    f.write(header.encode('ascii'))
+    f.write(vertices.tobytes())
+    f.write(faces.tobytes())
+
+
+def write_obj(mesh, f):
+    """
+    Write `mesh` to text file object `f` as Wavefront OBJ, with the RGB
+    vertex colors appended to each vertex line, as most viewers expect.
+    """
+    f.write('# SNFG glyphs\n')
+    np.savetxt(f, np.hstack([mesh.vertices, mesh.colors[:, :3]]),
+               fmt='v %.4f %.4f %.4f %.4f %.4f %.4f')
+    np.savetxt(f, mesh.normals, fmt='vn %.4f %.4f %.4f')
+    indices = np.repeat(mesh.triangles + 1, 2, axis=1)
+    np.savetxt(f, indices, fmt='f %d//%d %d//%d %d//%d')
+
+
+def write_glb(mesh, f):
+    """
+    Write `mesh` to binary file object `f` as a single binary glTF 2.0
+    asset, with positions, normals, vertex colors and indices. glTF
+    does not allow empty buffers, so `mesh` must have triangles.
+    """
+    if not len(mesh.triangles):
+        raise ValueError('glTF files cannot hold an empty mesh')
+    arrays = [np.ascontiguousarray(mesh.vertices, dtype='<f4'),
+              np.ascontiguousarray(mesh.normals, dtype='<f4'),
+              np.ascontiguousarray(mesh.colors, dtype='<f4'),
+              np.ascontiguousarray(mesh.triangles, dtype='<u4').ravel()]
+    views, accessors, offset = [], [], 0
+    for i, (array, kind, component) in enumerate(zip(arrays, ('VEC3', 'VEC3', 'VEC4', 'SCALAR'),
+                                                   (5126, 5126, 5126, 5125))):
+        views.append(dict(buffer=0, byteOffset=offset, byteLength=array.nbytes,
+                          target=34963 if kind == 'SCALAR' else 34962))
+        accessors.append(dict(bufferView=i, componentType=component, type=kind,
+                              count=len(array)))
+        offset += array.nbytes
+    accessors[0].update(min=mesh.vertices.min(axis=0).tolist(),
+                        max=mesh.vertices.max(axis=0).tolist())
+    gltf = dict(
+        asset=dict(version='2.0', generator='tangram_snfg'),
+        scene=0, scenes=[dict(nodes=[0])], nodes=[dict(mesh=0)],
+        meshes=[dict(primitives=[dict(attributes=dict(POSITION=0, NORMAL=1, COLOR_0=2),
+                                      indices=3, material=0)])],
+        materials=[dict(pbrMetallicRoughness=dict(metallicFactor=0.0, roughnessFactor=0.8),
+                        doubleSided=True)],
+        buffers=[dict(byteLength=offset)], bufferViews=views, accessors=accessors)
+    content = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    # Chunks are padded to 4 bytes: JSON with spaces, binary data with zeros
+    content += b' ' * (-len(content) % 4)
+    padding = b'\0' * (-offset % 4)
+    f.write(struct.pack('<4sII', b'glTF', 2, 12 + 8 + len(content) + 8 + offset + len(padding)))
+    f.write(struct.pack('<I4s', len(content), b'JSON'))
+    f.write(content)
+    f.write(struct.pack('<I4s', offset + len(padding), b'BIN\0'))
+    for array in arrays:
+        f.write(array.tobytes())
+    f.write(padding)
+
+
+WRITERS = dict(bild=(write_bild, 'w'), ply=(write_ply, 'wb'), obj=(write_obj, 'w'),
+               glb=(write_glb, 'wb'))
+
+
+def save(mesh, path, fmt=None):
+    """
+    Save `mesh` to `path`, in the format given by `fmt` or else by the
+    extension of `path`: one of `WRITERS`.
+    """
+    if fmt is None:
+        fmt = path.rsplit('.', 1)[-1].lower()
+    try:
+        writer, mode = WRITERS[fmt]
+    except KeyError:
+        raise ValueError('Unknown mesh format {}. Try with: {}'.format(
+                         fmt, ', '.join(sorted(WRITERS))))
+    f = open(path, mode)
+    try:
+        with f:
+            writer(mesh, f)
+    except Exception:
+        # Do not leave a truncated file behind
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,711 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Vectorized geometry kernel for SNFG glyphs.
+
+All functions here work on plain NumPy arrays and compute the vertices
+of every residue sharing a shape in one batch: centers, attachment points
+and p6 anchors come in as (N, 3) arrays and vertices go out as (N, V, 3).
+No Chimera objects are involved, so the same code can be reused by any
+rendering backend.
+
+Each shape is built only once, at import time, as a unit-sized template
+in a canonical frame. Residues then get a single 4x4 affine transform
+(`glyph_frames`) that places, orients and scales that template.
+"""
+
+from __future__ import absolute_import, print_function, division
+from collections import defaultdict
+import numpy as np
+from .rotation import rotate_in_plane as _rotate
+
+
+def _as_points(points):
+    return np.asarray(points, dtype=float).reshape(-1, 3)
+
+
+def _as_sizes(sizes, n):
+    return np.asarray(sizes, dtype=float) * np.ones(n)
+
+
+def _normalize(v):
+    return v / np.sqrt((v * v).sum(axis=-1))[..., None]
+
+
+def _axis_points(centers, centers_att, lengths):
+    """
+    Place two points along the line that connects each center with its
+    attachment point, `lengths` away in forward and reverse directions.
+    """
+    vec_AB = centers_att - centers
+    adjustment = lengths / np.sqrt((vec_AB * vec_AB).sum(axis=-1))
+    adj_vec_AB = vec_AB * adjustment[:, None]
+    return adj_vec_AB + centers, centers - adj_vec_AB
+
+
+def _cube(centers, centers_att, p6s, sizes):
+    # $size refers to the total size, $half_length refers to the distance
+    # required to create points on either side of the geometric center.
+    half_length = sizes / 2.0
+    x1, x2 = _axis_points(centers, centers_att, half_length)
+    # perp1 represents a point perpendicular to the previously created two
+    perp1 = _normalize(np.cross(x1 - x2, x2 - p6s)) * half_length[:, None]
+    o1, o2 = perp1 + x1, perp1 + x2
+    o3, o4 = x1 - perp1, x2 - perp1
+    # The 8 corners of the box are based upon the coordinates of o1-o4
+    perp_for = _normalize(np.cross(o1 - o2, o3 - o1)) * half_length[:, None]
+    o = np.array([o1, o2, o3, o4]).transpose(1, 0, 2)
+    return np.concatenate([o + perp_for[:, None], o - perp_for[:, None]], axis=1)
+
+
+def _diamond(centers, centers_att, p6s, sizes):
+    shape_size = sizes * 0.5
+    x1, x2 = _axis_points(centers, centers_att, shape_size)
+    perp1 = np.cross(x1 - x2, x2 - p6s) * shape_size[:, None]
+    o1, o2, o3 = perp1 + x1, perp1 + x2, x1 - perp1
+    outer = _rotate(o1, centers, o2, (90, 180, 270, 360), x2 - centers) + centers[:, None]
+    # Top and bottom of the diamond are perpendicular to the plane of the
+    # square (and parallel with the plane of the ring).
+    perp_for = _normalize(np.cross(o1 - o2, o3 - o1)) * shape_size[:, None]
+    top, bottom = perp_for + centers, centers - perp_for
+    return np.concatenate([outer, top[:, None], bottom[:, None]], axis=1)
+
+
+def _cone(centers, centers_att, p6s, sizes):
+    half_length = sizes / 2.0
+    # Two adjustments are added to shift the geom_center of the shape.
+    x1, _ = _axis_points(centers, centers_att, half_length * 0.66)
+    _, x2 = _axis_points(centers, centers_att, half_length * 1.33)
+    perp1 = _normalize(np.cross(x1 - x2, x2 - p6s))
+    o1 = perp1 + x1
+    perp3 = _normalize(np.cross(o1 - x2, x2 - centers_att)) * half_length[:, None]
+    o3 = perp3 + x1
+    outer = _rotate(o1, o3, x1, (45, 90, 135, 180, 225, 270, 315, 360),
+                    o3 - x1) + x1[:, None]
+    return np.concatenate([outer, x1[:, None], x2[:, None]], axis=1)
+
+
+def _prism(centers, centers_att, p6s, half_length, thickness, angles):
+    """
+    Common construction of flat shapes: a polygon whose outer points are
+    obtained by rotating the axis vector by `angles`, extruded by
+    `thickness` in both directions. Returns front points, back points
+    and the two centers of the faces.
+    """
+    x1, x2 = _axis_points(centers, centers_att, half_length)
+    perp1 = _normalize(np.cross(x1 - x2, x2 - p6s)) * half_length[:, None]
+    o1, o2, o3 = perp1 + x1, perp1 + x2, x1 - perp1
+    outer = _rotate(o1, centers, o2, angles, x2 - centers) + centers[:, None]
+    perp_for = _normalize(np.cross(o1 - o2, o3 - o1)) * thickness[:, None]
+    return (outer + perp_for[:, None], outer - perp_for[:, None],
+            (centers + perp_for)[:, None], (centers - perp_for)[:, None])
+
+
+def _rectangle(centers, centers_att, p6s, sizes):
+    front, back, center_1, center_2 = _prism(centers, centers_att, p6s,
+                                             sizes / 1.2, sizes / 1.8,
+                                             (45, 90, 225, 270))
+    return np.concatenate([front, back, center_1, center_2], axis=1)
+
+
+def _hexagon(centers, centers_att, p6s, sizes):
+    front, back, center_1, center_2 = _prism(centers, centers_att, p6s,
+                                             sizes / 2.0, sizes / 4.0,
+                                             (0, 45, 135, 180, 225, 315))
+    return np.concatenate([front, back, center_1, center_2], axis=1)
+
+
+def _pentagon(centers, centers_att, p6s, sizes):
+    front, back, center_1, center_2 = _prism(centers, centers_att, p6s,
+                                             sizes / 2.0, sizes / 4.0,
+                                             (72, 144, 216, 288, 360))
+    return np.concatenate([front, back, center_1, center_2], axis=1)
+
+
+def _star(centers, centers_att, p6s, sizes):
+    shape_size = sizes * 1.5
+    half_length = shape_size / 2.0
+    x1, x2 = _axis_points(centers, centers_att, half_length)
+    perp1 = _normalize(np.cross(x1 - x2, x2 - p6s)) * half_length[:, None]
+    o1, o2, o3 = perp1 + x1, perp1 + x2, x1 - perp1
+    angles = (72, 144, 216, 288, 360)
+    outer = _rotate(o1, centers, o2, angles, x2 - centers) + centers[:, None]
+    inner = _rotate(o1, centers, o2, angles, (x1 - centers) * 0.5) + centers[:, None]
+    perp_for = _normalize(np.cross(o1 - o2, o3 - o1)) * (shape_size / 4.0)[:, None]
+    return np.concatenate([outer, inner, (centers + perp_for)[:, None],
+                           (centers - perp_for)[:, None]], axis=1)
+
+
+def _faces(spec):
+    """
+    Parse a compact face specification: one `color_slot: i j k, ...` group
+    per line. Returns triangle indices (T, 3) and color slots (T,).
+    """
+    triangles, slots = [], []
+    for line in spec.strip().splitlines():
+        slot, polygons = line.split(':')
+        for polygon in polygons.split(','):
+            triangles.append([int(i) for i in polygon.split()])
+            slots.append(int(slot))
+    return np.array(triangles, dtype=int).reshape(-1, 3), np.array(slots, dtype=int)
+
+
+# Vertex order for each shape follows the names used in the original BILD
+# templates. Cube: s1-s8. Diamond: outer_1-4, top, bottom. Cone: outer_1-8,
+# x1, x2. Rectangle/hexagon/pentagon: front_*, back_*, center_1, center_2.
+# Star: outer_1-5, inner_1-5, center_1, center_2. Spheres are tessellated
+# separately, see `_icosphere`.
+_SHAPES = {
+    'cube': (_cube, _faces("""
+        0: 1 2 3, 0 1 5, 3 6 7, 4 5 7, 1 3 7, 0 4 6
+        1: 0 2 1, 2 6 3, 0 5 4, 4 7 6, 1 7 5, 0 6 2
+        """)),
+    'diamond': (_diamond, _faces("""
+        0: 0 5 1, 0 3 5, 2 4 1, 2 3 4
+        1: 0 1 4, 0 4 3, 2 1 5, 2 5 3
+        """)),
+    'cone': (_cone, _faces("""
+        0: 0 1 8, 0 8 7, 2 8 1, 2 3 8
+        1: 4 8 3, 4 5 8, 6 8 5, 6 7 8
+        0: 0 9 1, 0 7 9, 4 3 9, 4 9 5
+        1: 2 1 9, 2 9 3, 6 5 9, 6 9 7
+        """)),
+    'rectangle': (_rectangle, _faces("""
+        0: 0 1 8, 0 8 3, 2 8 1, 2 3 8, 4 9 5, 4 7 9, 6 5 9, 6 9 7, 4 5 0, 5 1 0, 5 6 1, 6 2 1, 6 7 2, 7 3 2, 7 4 3, 4 0 3
+        """)),
+    'star': (_star, _faces("""
+        0: 0 10 7, 0 7 11, 0 8 10, 0 11 8, 1 10 8, 1 8 11, 1 9 10, 1 11 9, 2 10 9, 2 9 11, 2 5 10, 2 11 5, 3 10 5, 3 5 11, 3 6 10, 3 11 6, 4 10 6, 4 6 11, 4 7 10, 4 11 7
+        """)),
+    'hexagon': (_hexagon, _faces("""
+        0: 0 1 12, 0 12 5, 2 12 1, 2 3 12, 4 12 3, 4 5 12, 6 13 7, 6 11 13, 8 7 13, 8 13 9, 10 9 13, 10 13 11, 6 7 0, 7 1 0, 7 8 1, 8 2 1, 8 9 2, 9 3 2, 9 10 3, 10 4 3, 10 11 4, 11 5 4, 11 6 5, 6 0 5
+        """)),
+    'pentagon': (_pentagon, _faces("""
+        0: 0 1 10, 0 10 4, 2 10 1, 2 3 10, 4 10 3, 5 11 6, 5 9 11, 7 6 11, 7 11 8, 9 8 11, 5 6 0, 6 1 0, 6 7 1, 7 2 1, 7 8 2, 8 3 2, 8 9 3, 9 4 3, 9 5 4, 5 0 4
+        """)),
+}
+
+
+def _icosphere(subdivisions=2):
+    """
+    Unit sphere obtained by subdividing an icosahedron `subdivisions` times.
+    Returns vertices (V, 3) and triangle indices (T, 3).
+    """
+    t = (1.0 + 5 ** 0.5) / 2.0
+    vertices = [(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0),
+                (0, -1, t), (0, 1, t), (0, -1, -t), (0, 1, -t),
+                (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)]
+    triangles = [(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11),
+                 (1, 5, 9), (5, 11, 4), (11, 10, 2), (10, 7, 6), (7, 1, 8),
+                 (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9),
+                 (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1)]
+    for _ in range(subdivisions):
+        midpoints, subdivided = {}, []
+        for triangle in triangles:
+            middle = []
+            for i, j in zip(triangle, triangle[1:] + triangle[:1]):
+                key = (min(i, j), max(i, j))
+                if key not in midpoints:
+                    midpoints[key] = len(vertices)
+                    vertices.append(tuple((np.array(vertices[i]) + vertices[j]) / 2.0))
+                middle.append(midpoints[key])
+            a, b, c = triangle
+            ab, bc, ca = middle
+            subdivided.extend([(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)])
+        triangles = subdivided
+    return _normalize(np.array(vertices, dtype=float)), np.array(triangles, dtype=int)
+
+
+def _tube(segments=16):
+    """
+    Closed cylinder of radius 1 that goes from Z=0 to Z=1. Caps get their
+    own vertices so they are shaded flat while the side is shaded smooth.
+    Returns vertices (V, 3) and triangle indices (T, 3).
+    """
+    theta = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    circle = np.column_stack([np.cos(theta), np.sin(theta), np.zeros(segments)])
+    top = circle + (0, 0, 1)
+    vertices = np.concatenate([circle, top, circle, top, [(0, 0, 0), (0, 0, 1)]])
+    i = np.arange(segments)
+    j = (i + 1) % segments
+    bottom_center, top_center = 4 * segments, 4 * segments + 1
+    triangles = np.concatenate([
+        np.column_stack([i, j, segments + j]),
+        np.column_stack([i, segments + j, segments + i]),
+        np.column_stack([np.repeat(bottom_center, segments), 2 * segments + j, 2 * segments + i]),
+        np.column_stack([np.repeat(top_center, segments), 3 * segments + i, 3 * segments + j])])
+    return vertices, triangles
+
+
+def _face_normals(vertices, triangles):
+    corners = vertices[..., triangles, :]
+    return _normalize(np.cross(corners[..., 1, :] - corners[..., 0, :],
+                               corners[..., 2, :] - corners[..., 0, :]))
+
+
+def _vertex_normals(vertices, triangles):
+    """
+    Smooth normals of (N, V, 3) `vertices`: the normalized sum of the
+    normals of the faces each vertex belongs to.
+    """
+    face_normals = _face_normals(vertices, triangles)
+    normals = np.zeros_like(vertices)
+    for k in range(3):
+        np.add.at(normals, (slice(None), triangles[:, k]), face_normals)
+    return _normalize(normals)
+
+
+class Mesh(object):
+
+    """
+    Triangle mesh ready to be handed to a rendering backend or exporter.
+
+    Parameters
+    ----------
+    vertices : (V, 3) array of float
+    normals : (V, 3) array of float
+    colors : (V, 4) array of float
+        RGBA values between 0 and 1.
+    triangles : (T, 3) array of int
+    """
+
+    def __init__(self, vertices, normals, colors, triangles):
+        self.vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+        self.normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+        self.colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+        self.triangles = np.asarray(triangles, dtype=np.int32).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.triangles)
+
+    def instances(self, transforms):
+        """
+        Build a new mesh with one copy of this one per (N, 4, 4) transform.
+        Transforms must be rigid motions, optionally with a uniform scale.
+        """
+        transforms = np.asarray(transforms, dtype=float).reshape(-1, 4, 4)
+        n = transforms.shape[0]
+        rotations = transforms[:, :3, :3]
+        vertices = (np.einsum('nij,vj->nvi', rotations, self.vertices)
+                    + transforms[:, None, :3, 3])
+        normals = _normalize(np.einsum('nij,vj->nvi', rotations, self.normals))
+        offsets = np.arange(n)[:, None, None] * len(self.vertices)
+        return Mesh(vertices, normals, np.tile(self.colors, (n, 1)),
+                    self.triangles[None] + offsets)
+
+    @classmethod
+    def concatenate(cls, meshes):
+        meshes = list(meshes)
+        offsets = np.cumsum([0] + [len(m.vertices) for m in meshes[:-1]])
+        return cls(np.concatenate([m.vertices for m in meshes] or [np.zeros((0, 3))]),
+                   np.concatenate([m.normals for m in meshes] or [np.zeros((0, 3))]),
+                   np.concatenate([m.colors for m in meshes] or [np.zeros((0, 4))]),
+                   np.concatenate([m.triangles + o for m, o in zip(meshes, offsets)]
+                                  or [np.zeros((0, 3))]))
+
+
+class GlyphTemplate(object):
+
+    """
+    Unit-sized mesh of a shape, expressed in the canonical frame of a
+    residue: centered at the origin, facing its attachment point along +X
+    and with the p6 anchor in the +Z half-space.
+
+    Parameters
+    ----------
+    shape : str
+    vertices : (V, 3) array of float
+    triangles : (T, 3) array of int
+    color_slots : (T,) array of int
+        0 for triangles drawn with the first color of the residue,
+        1 for the second one.
+    smooth : bool, optional
+        Share vertices between faces and interpolate their normals.
+        Only single-colored templates can be smooth.
+    """
+
+    def __init__(self, shape, vertices, triangles, color_slots, smooth=False):
+        self.shape = shape
+        self.vertices = vertices
+        self.triangles = triangles
+        self.color_slots = color_slots
+        self.smooth = smooth
+
+    def place(self, transforms):
+        """
+        Apply (N, 4, 4) `transforms` to the template vertices.
+        Returns a (N, V, 3) array.
+        """
+        transforms = np.asarray(transforms, dtype=float).reshape(-1, 4, 4)
+        return (np.einsum('nij,vj->nvi', transforms[:, :3, :3], self.vertices)
+                + transforms[:, None, :3, 3])
+
+    def mesh(self, transforms, colors):
+        """
+        Build a single `Mesh` with one copy of the template per transform.
+
+        Parameters
+        ----------
+        transforms : (N, 4, 4) array of float
+        colors : (N, 2, 4) or (2, 4) array of float
+            RGBA values of both color slots, per copy or shared by all.
+        """
+        vertices = self.place(transforms)
+        n = vertices.shape[0]
+        colors = np.asarray(colors, dtype=float) * np.ones((n, 2, 4))
+        if self.smooth:
+            triangles = self.triangles
+            normals = _vertex_normals(vertices, triangles)
+            vertex_colors = np.repeat(colors[:, :1], vertices.shape[1], axis=1)
+        else:
+            # Unshared vertices give flat shading and per-face colors
+            triangles = np.arange(self.triangles.size).reshape(-1, 3)
+            normals = np.repeat(_face_normals(vertices, self.triangles), 3, axis=1)
+            vertices = vertices[:, self.triangles.ravel()]
+            vertex_colors = np.repeat(colors[:, self.color_slots], 3, axis=1)
+        offsets = np.arange(n)[:, None, None] * vertices.shape[1]
+        return Mesh(vertices, normals, vertex_colors, triangles[None] + offsets)
+
+
+def _build_templates():
+    origin, forward, anchor = np.zeros((1, 3)), np.array([[1., 0, 0]]), np.array([[0, 0, 1.]])
+    templates = {}
+    for shape, (builder, (triangles, slots)) in _SHAPES.items():
+        vertices = builder(origin, forward, anchor, np.ones(1))[0]
+        templates[shape] = GlyphTemplate(shape, vertices, triangles, slots)
+    vertices, triangles = _icosphere(2)
+    templates['sphere'] = GlyphTemplate('sphere', vertices, triangles,
+                                        np.zeros(len(triangles), dtype=int), smooth=True)
+    return templates
+
+
+TEMPLATES = _build_templates()
+
+
+class GlyphInstances(object):
+
+    """
+    Instanced glyphs: a single colored mesh per distinct SNFG symbol
+    (shape, color1, color2), built once, plus the transforms of every
+    residue drawn with that symbol. Memory grows with the number of
+    distinct symbols, not with the number of residues, until the
+    instances are expanded with `mesh`.
+
+    Parameters
+    ----------
+    palette : callable
+        Maps a color name to an RGBA tuple.
+    prototypes : dict, optional
+        Cache of colored unit meshes, keyed by symbol. It can be shared
+        between several instances.
+    """
+
+    def __init__(self, palette, prototypes=None):
+        self.palette = palette
+        self.prototypes = {} if prototypes is None else prototypes
+        self.indices = {}
+        self.transforms = {}
+
+    def prototype(self, symbol):
+        if symbol not in self.prototypes:
+            shape, color1, color2 = symbol
+            self.prototypes[symbol] = TEMPLATES[shape].mesh(
+                np.eye(4), [self.palette(color1), self.palette(color2)])
+        return self.prototypes[symbol]
+
+    def set(self, symbols, transforms):
+        """
+        Parameters
+        ----------
+        symbols : list of (str, str, str)
+            Shape and colors of each item.
+        transforms : (N, 4, 4) array of float
+            Transform of each item, as given by `glyph_frames`.
+        """
+        groups = defaultdict(list)
+        for i, symbol in enumerate(symbols):
+            groups[symbol].append(i)
+        self.indices = dict((k, np.array(v, dtype=int)) for k, v in groups.items())
+        self.update(transforms)
+
+    def update(self, transforms):
+        """
+        Replace the transforms of the same items passed to `set`.
+        """
+        transforms = np.asarray(transforms, dtype=float).reshape(-1, 4, 4)
+        self.transforms = dict((k, transforms[v]) for k, v in self.indices.items())
+
+    def mesh(self, items=None):
+        """
+        Expand all instances into a single mesh.
+
+        Parameters
+        ----------
+        items : array of int, optional
+            Only expand the instances of these items.
+
+        Returns
+        -------
+        mesh : Mesh
+        owners : (T,) array of int
+            Position of the item each triangle belongs to.
+        """
+        meshes, owners = [], [np.zeros(0, dtype=int)]
+        for symbol, indices in self.indices.items():
+            transforms = self.transforms[symbol]
+            if items is not None:
+                selected = np.in1d(indices, items)
+                indices, transforms = indices[selected], transforms[selected]
+                if not len(indices):
+                    continue
+            prototype = self.prototype(symbol)
+            meshes.append(prototype.instances(transforms))
+            owners.append(np.repeat(indices, len(prototype)))
+        return Mesh.concatenate(meshes), np.concatenate(owners)
+
+
+_CYLINDER = GlyphTemplate('cylinder', *_tube(16), color_slots=None, smooth=True)
+_CAP = GlyphTemplate('sphere', *_icosphere(1), color_slots=None, smooth=True)
+
+
+def glyph_frames(centers, centers_att, p6s, sizes):
+    """
+    Compute the affine transform that maps each unit template onto its
+    residue: X points towards the attachment point, Y is perpendicular to
+    the plane defined by the axis and the p6 anchor, and every axis is
+    scaled by the residue size.
+
+    Parameters
+    ----------
+    centers : (N, 3) array of float
+        Geometric centers of each ring.
+    centers_att : (N, 3) array of float
+        Attachment point each shape should face.
+    p6s : (N, 3) array of float
+        Coordinates of the sixth ring member, used to orient the shape.
+    sizes : float or (N,) array of float
+
+    Returns
+    -------
+    transforms : (N, 4, 4) array of float
+    """
+    centers, centers_att, p6s = [_as_points(p) for p in (centers, centers_att, p6s)]
+    n = centers.shape[0]
+    sizes = _as_sizes(sizes, n)
+    x = _normalize(centers_att - centers)
+    y = _normalize(np.cross(x, centers - p6s))
+    z = np.cross(x, y)
+    transforms = np.zeros((n, 4, 4))
+    transforms[:, :3, 0] = x * sizes[:, None]
+    transforms[:, :3, 1] = y * sizes[:, None]
+    transforms[:, :3, 2] = z * sizes[:, None]
+    transforms[:, :3, 3] = centers
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def cylinder_frames(starts, ends, radii):
+    """
+    Affine transforms that map the unit cylinder onto cylinders of
+    `radii` (float or (N,) array) that go from `starts` to `ends` (N, 3).
+    """
+    starts, ends = _as_points(starts), _as_points(ends)
+    n = starts.shape[0]
+    radii = _as_sizes(radii, n)
+    axes = ends - starts
+    # Any vector not parallel to the axis will do to build the frame
+    helper = np.eye(3)[np.abs(axes).argmin(axis=-1)]
+    x = _normalize(np.cross(axes, helper))
+    y = _normalize(np.cross(axes, x))
+    transforms = np.zeros((n, 4, 4))
+    transforms[:, :3, 0] = x * radii[:, None]
+    transforms[:, :3, 1] = y * radii[:, None]
+    transforms[:, :3, 2] = axes
+    transforms[:, :3, 3] = starts
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def sphere_frames(centers, radii):
+    """
+    Affine transforms that map the unit sphere onto spheres of `radii`
+    centered at `centers`.
+    """
+    centers = _as_points(centers)
+    n = centers.shape[0]
+    transforms = np.zeros((n, 4, 4))
+    transforms[:, :3, :3] = np.eye(3) * _as_sizes(radii, n)[:, None, None]
+    transforms[:, :3, 3] = centers
+    transforms[:, 3, 3] = 1.0
+    return transforms
+
+
+def connector_mesh(starts, ends, cylinder_radii, sphere_radii, colors):
+    """
+    Mesh of the cylinders that connect `starts` to `ends` (N, 3), capped
+    with a sphere at each end point. Cylinders or spheres with a radius
+    of zero are skipped.
+
+    Parameters
+    ----------
+    starts, ends : (N, 3) array of float
+    cylinder_radii, sphere_radii : float or (N,) array of float
+    colors : (N, 4) or (4,) array of float
+        RGBA values of each connector, or shared by all.
+    """
+    starts, ends = _as_points(starts), _as_points(ends)
+    n = starts.shape[0]
+    cylinder_radii, sphere_radii = _as_sizes(cylinder_radii, n), _as_sizes(sphere_radii, n)
+    colors = np.asarray(colors, dtype=float) * np.ones((n, 4))
+    cylinders, caps = cylinder_radii > 0, sphere_radii > 0
+    return Mesh.concatenate([
+        _CYLINDER.mesh(cylinder_frames(starts[cylinders], ends[cylinders],
+                                       cylinder_radii[cylinders]),
+                       colors[cylinders, None]),
+        _CAP.mesh(sphere_frames(ends[caps], sphere_radii[caps]), colors[caps, None])])
+
+
+def connector_owners(cylinder_radii, sphere_radii):
+    """
+    Position of the connector each triangle of `connector_mesh` belongs
+    to, for the same radii.
+    """
+    cylinder_radii, sphere_radii = np.atleast_1d(cylinder_radii), np.atleast_1d(sphere_radii)
+    return np.concatenate([np.repeat(np.flatnonzero(cylinder_radii > 0), len(_CYLINDER.triangles)),
+                           np.repeat(np.flatnonzero(sphere_radii > 0), len(_CAP.triangles))])
+
+
+def connector_vertex_owners(cylinder_radii, sphere_radii):
+    """
+    Position of the connector each vertex of `connector_mesh` belongs
+    to, for the same radii.
+    """
+    cylinder_radii, sphere_radii = np.atleast_1d(cylinder_radii), np.atleast_1d(sphere_radii)
+    return np.concatenate([np.repeat(np.flatnonzero(cylinder_radii > 0), len(_CYLINDER.vertices)),
+                           np.repeat(np.flatnonzero(sphere_radii > 0), len(_CAP.vertices))])
+
+
+def linkage_colors(positions, palette, default):
+    """
+    RGBA color of each connector, looked up by the position of the
+    acceptor carbon of its linkage.
+
+    Parameters
+    ----------
+    positions : (N,) array of int
+        0 for linkages that are not between saccharydes.
+    palette : dict
+        RGBA value of each position, like `SUGAR_BOND_COLORS`.
+    default : (4,) array of float
+        Color of the positions missing from `palette`.
+    """
+    positions = np.asarray(positions, dtype=int)
+    table = np.tile(np.asarray(default, dtype=float), (max(palette) + 2, 1))
+    for position, color in palette.items():
+        table[position] = color
+    # Unknown positions fall on the last row, which keeps the default
+    positions = np.where((positions > 0) & (positions <= max(palette)), positions, -1)
+    return table[positions]
+
+
+class ConnectorBatch(object):
+
+    """
+    Connectors stored as parallel arrays, one row per connector: end points
+    and radii for the geometry, the acceptor `positions` of their linkages,
+    plus `keys`, `kinds`, `labels` and `targets` as side arrays of metadata.
+    The whole batch is meshed with a single `connector_mesh` call, moved by
+    replacing its end points and recolored by replacing its vertex colors.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def clear(self):
+        self.keys, self.kinds, self.labels, self.targets = [], [], [], []
+        self.starts, self.ends = np.zeros((0, 3)), np.zeros((0, 3))
+        self.cylinder_radii, self.sphere_radii = np.zeros(0), np.zeros(0)
+        self.positions = np.zeros(0, dtype=int)
+        self._index = {}
+
+    def update(self, keys, attrs):
+        """
+        Add connectors, or replace the ones with the same keys.
+
+        Parameters
+        ----------
+        keys : list
+        attrs : list of dict
+            With `start`, `end`, `cylinder_radius`, `sphere_radius`,
+            `kind` and `target` keys, and optionally `label` and `position`.
+        """
+        keys = list(keys)
+        new = [k for k in keys if k not in self._index]
+        if new:
+            n = len(new)
+            self._index.update((k, len(self.keys) + i) for i, k in enumerate(new))
+            self.keys.extend(new)
+            for column in (self.kinds, self.labels, self.targets):
+                column.extend([None] * n)
+            self.starts = np.concatenate([self.starts, np.zeros((n, 3))])
+            self.ends = np.concatenate([self.ends, np.zeros((n, 3))])
+            self.cylinder_radii = np.concatenate([self.cylinder_radii, np.zeros(n)])
+            self.sphere_radii = np.concatenate([self.sphere_radii, np.zeros(n)])
+            self.positions = np.concatenate([self.positions, np.zeros(n, dtype=int)])
+        if not keys:
+            return
+        rows = [self._index[k] for k in keys]
+        for i, a in zip(rows, attrs):
+            self.kinds[i], self.labels[i], self.targets[i] = a['kind'], a.get('label'), a['target']
+        self.starts[rows] = [tuple(a['start']) for a in attrs]
+        self.ends[rows] = [tuple(a['end']) for a in attrs]
+        self.cylinder_radii[rows] = [a['cylinder_radius'] for a in attrs]
+        self.sphere_radii[rows] = [a['sphere_radius'] for a in attrs]
+        self.positions[rows] = [a.get('position') or 0 for a in attrs]
+
+    def remove(self, keys):
+        removed = [self._index[k] for k in keys if k in self._index]
+        if not removed:
+            return
+        keep = np.ones(len(self.keys), dtype=bool)
+        keep[removed] = False
+        for name in ('keys', 'kinds', 'labels', 'targets'):
+            setattr(self, name, [x for x, k in zip(getattr(self, name), keep) if k])
+        for name in ('starts', 'ends', 'cylinder_radii', 'sphere_radii', 'positions'):
+            setattr(self, name, getattr(self, name)[keep])
+        self._index = dict((k, i) for i, k in enumerate(self.keys))
+
+    def move(self, starts, ends):
+        """
+        Replace the (N, 3) end points of all the connectors.
+        """
+        self.starts = _as_points(starts)
+        self.ends = _as_points(ends)
+
+    def vertex_colors(self, colors):
+        """
+        Per-vertex colors of the mesh given by `mesh`, for (N, 4) or (4,)
+        connector `colors`.
+        """
+        colors = np.asarray(colors, dtype=float) * np.ones((len(self.keys), 4))
+        return colors[connector_vertex_owners(self.cylinder_radii, self.sphere_radii)]
+
+    def mesh(self, colors):
+        """
+        Mesh all the connectors at once.
+
+        Returns
+        -------
+        mesh : Mesh
+        owners : (T,) array of int
+            Position of the connector each triangle belongs to.
+        """
+        return (connector_mesh(self.starts, self.ends, self.cylinder_radii,
+                               self.sphere_radii, colors),
+                connector_owners(self.cylinder_radii, self.sphere_radii))
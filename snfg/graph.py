@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Glycan linkage graph.
+
+Nodes are the saccharydes of a `SaccharydeTable` and each node has at most
+one outgoing edge: the linkage of its anomeric carbon, either to another
+saccharyde (glycosidic bond), to a protein residue (N- or O-linked glycan)
+or to a capping group. The graph is built from the bonds once, updated
+incrementally, and read by connectors, labels and analysis code.
+"""
+
+from __future__ import absolute_import, print_function, division
+from collections import defaultdict
+
+
+class Linkage(object):
+
+    """
+    Linkage of the anomeric carbon of a saccharyde.
+
+    Attributes
+    ----------
+    donor : chimera.Residue
+        Saccharyde whose anomeric carbon is linked.
+    kind : str
+        'saccharyde C<n>', 'O-linked glycan', 'N-linked glycan',
+        'GLYCAM OME or TBT', 'reducing end' or 'terminal'.
+    donor_atom : chimera.Atom
+        Anomeric carbon of the donor (C1, or C2 for sialic acids).
+    bridge : chimera.Atom or None
+        Oxygen or nitrogen bonded to the anomeric carbon.
+    acceptor_atom : chimera.Atom or None
+        Atom of the acceptor bonded to the bridge: the ring carbon of the
+        acceptor saccharyde, or the CA of the attached protein residue.
+    acceptor : chimera.Residue or None
+        Residue the donor is attached to, if any.
+    position : int or None
+        Position of the acceptor carbon (e.g. 4 for a 1-4 linkage), for
+        linkages between saccharydes.
+    target : chimera.Residue, chimera.Atom or None
+        What the connector of the donor points to: the acceptor
+        saccharyde, an atom, or nothing for terminal residues.
+    """
+
+    __slots__ = ('donor', 'kind', 'donor_atom', 'bridge', 'acceptor_atom',
+                 'acceptor', 'position', 'target')
+
+    def __init__(self, donor, kind, donor_atom, bridge=None, acceptor_atom=None,
+                 acceptor=None, position=None, target=None):
+        self.donor = donor
+        self.kind = kind
+        self.donor_atom = donor_atom
+        self.bridge = bridge
+        self.acceptor_atom = acceptor_atom
+        self.acceptor = acceptor
+        self.position = position
+        self.target = target
+
+    @property
+    def glycosidic(self):
+        """
+        Whether both ends of the linkage are saccharydes.
+        """
+        return self.kind.startswith('saccharyde')
+
+    @property
+    def reduced(self):
+        """
+        Whether the connector should be drawn with reduced radii.
+        """
+        return self.kind in ('GLYCAM OME or TBT', 'reducing end')
+
+    def __repr__(self):
+        return '<Linkage {} -> {} ({})>'.format(self.donor, self.acceptor, self.kind)
+
+
+class GlycanGraph(object):
+
+    """
+    Linkages of all the saccharydes in `table`, keyed by donor residue.
+
+    Parameters
+    ----------
+    table : table.SaccharydeTable
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.linkages = {}
+        self._children = defaultdict(set)
+
+    def __len__(self):
+        return len(self.linkages)
+
+    def __contains__(self, residue):
+        return residue in self.linkages
+
+    def build(self):
+        """
+        (Re)compute the linkages of every saccharyde in the table.
+        """
+        self.clear()
+        self.update(self.table.keys())
+
+    def clear(self):
+        self.linkages.clear()
+        self._children.clear()
+
+    def update(self, residues):
+        """
+        Recompute the linkages of `residues`, e.g. after they were added
+        or their bonds changed. Residues that are not saccharydes are
+        ignored.
+        """
+        for residue in residues:
+            row = self.table.get(residue)
+            if row is None:
+                continue
+            self._forget(residue)
+            linkage = self.linkages[residue] = _find_linkage(row, self.table)
+            if linkage.acceptor is not None:
+                self._children[linkage.acceptor].add(residue)
+
+    def add(self, linkages):
+        """
+        Record `linkages` worked out elsewhere (e.g. read back from a
+        cache) instead of finding them from the bonds.
+        """
+        for linkage in linkages:
+            self._forget(linkage.donor)
+            self.linkages[linkage.donor] = linkage
+            if linkage.acceptor is not None:
+                self._children[linkage.acceptor].add(linkage.donor)
+
+    def remove(self, residues):
+        """
+        Forget `residues`. Returns the saccharydes whose linkage pointed
+        to any of them, which are linked again with the remaining bonds.
+        """
+        residues = set(residues)
+        orphans = set()
+        for residue in residues:
+            self._forget(residue)
+            orphans.update(self._children.pop(residue, ()))
+        orphans.difference_update(residues)
+        self.update(orphans)
+        return orphans
+
+    def linkage(self, residue):
+        """
+        Linkage of the saccharyde `residue`, computed if not known yet.
+        """
+        if residue not in self.linkages:
+            self.update([residue])
+        return self.linkages[residue]
+
+    def parent(self, residue):
+        """
+        Saccharyde `residue` is attached to, if any.
+        """
+        linkage = self.linkages.get(residue)
+        if linkage is not None and linkage.glycosidic:
+            return linkage.acceptor
+
+    def children(self, residue):
+        """
+        Saccharydes attached to `residue`, which can also be a protein residue.
+        """
+        return [r for r in self._children.get(residue, ()) if r in self.linkages]
+
+    def roots(self):
+        """
+        Saccharydes that are not attached to another saccharyde, i.e. the
+        reducing end of each glycan.
+        """
+        return [r for r in self.table.keys() if r in self.linkages and self.parent(r) is None]
+
+    def edges(self):
+        """
+        Glycosidic linkages between two saccharydes.
+        """
+        return [l for l in self.linkages.values() if l.glycosidic]
+
+    def _forget(self, residue):
+        linkage = self.linkages.pop(residue, None)
+        if linkage is not None and linkage.acceptor is not None:
+            self._children[linkage.acceptor].discard(residue)
+
+
+def _find_linkage(ring, table):
+    """
+    Work out what the anomeric carbon of the saccharyde `ring` (a row of
+    `table`) is bonded to.
+    """
+    a1, ring_oxygen = ring.a1, ring.a6
+    O_att, N_att, C_att = None, None, None
+    for neighbor in a1.neighbors:
+        if neighbor.residue == ring.residue or neighbor is ring_oxygen:
+            continue
+        if neighbor.element.name == 'O':
+            O_att = neighbor
+            break
+        elif neighbor.element.name == 'N':
+            N_att = neighbor
+            break
+    if O_att is not None:
+        # Check if the oxygen is then attached to a carbon
+        for neighbor in O_att.neighbors:
+            if neighbor.element.name == 'C' and neighbor.residue != a1.residue:
+                C_att = neighbor
+                break
+        # If the oxygen is attached to a carbon, then the attached residue is
+        # a carbohydrate or this is an O-linked glycan
+        if C_att is not None:
+            attached = C_att.residue
+            if attached in table and attached != ring.residue:
+                return Linkage(ring.residue, 'saccharyde ' + C_att.name, a1, O_att, C_att,
+                               attached, _position(C_att.name), target=attached)
+            # Check for alpha carbon of attached protein residue
+            att_CA = attached.atomsMap.get('CA')
+            if att_CA is not None:
+                return Linkage(ring.residue, 'O-linked glycan', a1, O_att, att_CA[0],
+                               attached, target=att_CA[0])
+            # Then GLYCAM OME or TBT
+            return Linkage(ring.residue, 'GLYCAM OME or TBT', a1, O_att, C_att,
+                           attached, target=O_att)
+        # Otherwise it is a terminal oxygen and marks the reducing end
+        return Linkage(ring.residue, 'reducing end', a1, O_att, target=O_att)
+    if N_att is not None:
+        # Then we assume this is an N-linked glycan, attached to the CA
+        att_CA = N_att.residue.atomsMap.get('CA')
+        if att_CA is not None:
+            return Linkage(ring.residue, 'N-linked glycan', a1, N_att, att_CA[0],
+                           N_att.residue, target=att_CA[0])
+        # N-glycosyl ligands and other residues without CA
+        return Linkage(ring.residue, 'N-linked glycan', a1, N_att,
+                       acceptor=N_att.residue, target=N_att)
+    # No oxygen or nitrogen attached
+    return Linkage(ring.residue, 'terminal', a1)
+
+
+def _position(name):
+    digits = ''.join(c for c in name if c.isdigit())
+    return int(digits) if digits else None
@@ -2,7 +2,7 @@
 # encoding: utf-8
 
 
-from __future__ import print_function, division
+from __future__ import absolute_import, print_function, division
 # Python stdlib
 import Tkinter as tk
 import webbrowser as web
@@ -16,7 +16,7 @@ try:
     from libtangram.ui import TangramBaseDialog
 except ImportError:  # try builtin
     from _libtangram.ui import TangramBaseDialog
-from prefs import prefs, _defaults
+from .prefs import prefs, _defaults
 
 
 ui = None  # singleton
@@ -45,6 +45,8 @@ class SNFGDialog(TangramBaseDialog):
         # Variables
         self.var_connect = tk.IntVar()
         self.var_bondtypes = tk.IntVar()
+        self.var_bondcolors = tk.IntVar()
+        self.var_cache = tk.IntVar()
 
         # Fire up
         super(SNFGDialog, self).__init__(resizable=False, *args, **kwargs)
@@ -64,6 +66,10 @@ class SNFGDialog(TangramBaseDialog):
                                          variable=self.var_connect)
         self.ui_bondtypes = tk.Checkbutton(self.canvas, text='Label bonds',
                                            variable=self.var_bondtypes)
+        self.ui_bondcolors = tk.Checkbutton(self.canvas, text='Color bonds by position',
+                                            variable=self.var_bondcolors)
+        self.ui_cache = tk.Checkbutton(self.canvas, text='Cache results on disk',
+                                       variable=self.var_cache)
 
         self.ui_more_info_btn = tk.Button(self.canvas, text='SNFG legend and details',
                                           command=lambda *a: web.open_new(r"https://www.ncbi.nlm.nih.gov/glycans/snfg.html"))
@@ -78,7 +84,9 @@ class SNFGDialog(TangramBaseDialog):
                                columnspan=2)
         self.ui_connect.grid(row=3, column=0, padx=5, pady=3)
         self.ui_bondtypes.grid(row=3, column=1, padx=5, pady=3)
-        self.ui_more_info_btn.grid(row=4, column=0, sticky='we', padx=5, pady=3,
+        self.ui_bondcolors.grid(row=4, column=0, padx=5, pady=3)
+        self.ui_cache.grid(row=4, column=1, padx=5, pady=3)
+        self.ui_more_info_btn.grid(row=5, column=0, sticky='we', padx=5, pady=3,
                                    columnspan=2)
 
     def _set_defaults(self):
@@ -87,13 +95,17 @@ class SNFGDialog(TangramBaseDialog):
         self.ui_cylinder_radius.set(prefs['cylinder_radius'])
         self.var_connect.set(int(prefs['connect']))
         self.var_bondtypes.set(int(prefs['bondtypes']))
+        self.var_bondcolors.set(int(prefs['bondcolors']))
+        self.var_cache.set(int(prefs['cache']))
 
     def _get_current_values(self):
         return dict(icon_size = float(self.ui_icon_size.get()),
                     full_size = float(self.ui_full_size.get()),
                     cylinder_radius = float(self.ui_cylinder_radius.get()),
                     connect = bool(self.var_connect.get()),
-                    bondtypes = bool(self.var_bondtypes.get()))
+                    bondtypes = bool(self.var_bondtypes.get()),
+                    bondcolors = bool(self.var_bondcolors.get()),
+                    cache = bool(self.var_cache.get()))
 
     def Reset(self):
         DEFAULTS = _defaults()
@@ -102,6 +114,8 @@ class SNFGDialog(TangramBaseDialog):
         self.ui_cylinder_radius.set(DEFAULTS['cylinder_radius'])
         self.var_connect.set(int(DEFAULTS['connect']))
         self.var_bondtypes.set(int(DEFAULTS['bondtypes']))
+        self.var_bondcolors.set(int(DEFAULTS['bondcolors']))
+        self.var_cache.set(int(DEFAULTS['cache']))
 
     def Apply(self):
         for k, v in self._get_current_values().items():
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Linkage labels drawn in a single marker set. Each label is the label of
+a bond between two markers placed at both ends of a connector.
+"""
+
+from __future__ import absolute_import, print_function, division
+import chimera
+from VolumePath import Marker_Set as MarkerSet
+
+
+class LabelLayer(object):
+
+    """
+    Labels of many items (e.g. the connectors of each residue) held by one
+    marker set, which is only created when the first label is added.
+
+    Parameters
+    ----------
+    name : str
+    model_id : tuple of int
+        Id and subid of the marker set model.
+    color : str, optional
+        Name of the label color.
+    """
+
+    def __init__(self, name, model_id, color='black'):
+        self.name = name
+        self.model_id = model_id
+        self.color = color
+        self.markerset = None
+        self._links = {}
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return key in self._links
+
+    @property
+    def molecule(self):
+        if self.markerset is not None and not self.markerset.molecule.__destroyed__:
+            return self.markerset.molecule
+
+    def add(self, keys, starts, ends, texts):
+        """
+        Label the segment from `starts` to `ends` of each item with
+        `texts`. Items already labeled are moved and relabeled.
+        """
+        if self.molecule is None:
+            self._links.clear()
+            self.markerset = MarkerSet(self.name)
+            self.markerset.marker_model(self.model_id)
+        color = chimera.colorTable.getColorByName(self.color)
+        for key, start, end, text in zip(keys, starts, ends, texts):
+            markers = self._links.get(key)
+            if markers is None:
+                markers = self._links[key] = (
+                    self.markerset.place_marker(tuple(start), None, 0.1),
+                    self.markerset.place_marker(tuple(end), None, 0.1))
+                link = self.markerset.molecule.newBond(markers[0].atom, markers[1].atom)
+                link.labelColor = color
+            else:
+                self._move(markers, start, end)
+                link = markers[0].atom.bonds[0]
+            link.label = text
+
+    def move(self, keys, starts, ends):
+        """
+        Move the labels of `keys`, ignoring the ones not labeled.
+        """
+        links = self._links
+        for key, start, end in zip(keys, starts, ends):
+            markers = links.get(key)
+            if markers is not None:
+                self._move(markers, start, end)
+
+    def remove(self, keys):
+        alive = self.molecule is not None
+        for key in keys:
+            markers = self._links.pop(key, None)
+            if markers is not None and alive:
+                for marker in markers:
+                    marker.delete()
+
+    def close(self):
+        if self.molecule is not None:
+            chimera.openModels.close([self.markerset.molecule])
+        self.markerset = None
+        self._links.clear()
+
+    @staticmethod
+    def _move(markers, start, end):
+        for marker, xyz in zip(markers, (start, end)):
+            marker.atom.setCoord(chimera.Point(*xyz))
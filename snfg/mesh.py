@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Chimera backend for SNFG meshes. Vertex, color and index arrays from
+`geometry.Mesh` objects are handed straight to `_surface.SurfaceModel`
+pieces, with no intermediate BILD/VRML text.
+"""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+import chimera
+from _surface import SurfaceModel
+
+
+def rgba(color):
+    """
+    RGBA tuple of a color name known by Chimera (including `snfg_*`
+    colors once they are defined).
+    """
+    return chimera.colorTable.getColorByName(color).rgba()
+
+
+def add_piece(model, mesh):
+    """
+    Add `mesh` as a new piece of surface `model`. Normals are computed
+    by Chimera from the triangles.
+    """
+    piece = model.addPiece(mesh.vertices, mesh.triangles.astype(np.intc), (1, 1, 1, 1))
+    piece.vertexColors = mesh.colors
+    return piece
+
+
+def set_piece_mesh(piece, mesh):
+    """
+    Replace the geometry and colors of an existing surface `piece`
+    with those of `mesh`, without reopening its model.
+    """
+    piece.geometry = (mesh.vertices, mesh.triangles.astype(np.intc))
+    piece.vertexColors = mesh.colors
+
+
+def surface_model(name, mesh):
+    """
+    Create a new surface model called `name` with a single piece.
+    It is not added to `chimera.openModels`.
+    """
+    model = SurfaceModel()
+    model.name = name
+    add_piece(model, mesh)
+    return model
+
+
+class MeshLayer(object):
+
+    """
+    Single surface model that holds the meshes of many items (residues,
+    connectors...). Each triangle remembers the item it belongs to, so
+    items can still be picked and hidden individually.
+
+    Parameters
+    ----------
+    name : str
+    baseId : int
+    subid : int, optional
+    """
+
+    def __init__(self, name, baseId, subid=0):
+        self.name = name
+        self.baseId = baseId
+        self.subid = subid
+        self.model = None
+        self.piece = None
+        self.keys = []
+        self.mesh = None
+        self.owners = None
+        self.hidden = set()
+        self._index = {}
+        self._visible = None
+
+    def set(self, keys, mesh, owners):
+        """
+        Replace the contents of the layer.
+
+        Parameters
+        ----------
+        keys : list
+            Items drawn in the layer, like residues.
+        mesh : geometry.Mesh
+        owners : (T,) array of int
+            Position in `keys` of the item each triangle belongs to.
+        """
+        self.keys = list(keys)
+        self._index = dict((k, i) for i, k in enumerate(self.keys))
+        self.hidden.intersection_update(self._index)
+        self.mesh = mesh
+        self.owners = np.asarray(owners, dtype=int)
+        if self.model is None:
+            self.model = surface_model(self.name, mesh)
+            self.piece = self.model.surfacePieces[0]
+            chimera.openModels.add([self.model], baseId=self.baseId, subid=self.subid)
+        self._update_piece()
+
+    def update(self, keys, mesh, owners):
+        """
+        Replace the triangles of `keys` with `mesh`, keeping the rest of
+        the items. Items in `keys` that were not in the layer are appended.
+
+        Parameters
+        ----------
+        keys : list
+        mesh : geometry.Mesh
+        owners : (T,) array of int
+            Position in `keys` of the item each triangle belongs to.
+        """
+        if self.mesh is None:
+            return self.set(keys, mesh, owners)
+        hidden = self.hidden.intersection(keys)
+        kept_keys, kept_mesh, kept_owners = self._without(keys)
+        self.hidden.update(hidden)
+        self.set(kept_keys + list(keys), type(mesh).concatenate([kept_mesh, mesh]),
+                 np.concatenate([kept_owners, np.asarray(owners, dtype=int) + len(kept_keys)]))
+
+    def remove(self, keys):
+        """
+        Drop the triangles of `keys` and compact the arrays.
+        """
+        if self.mesh is None or not any(k in self._index for k in keys):
+            return
+        self.set(*self._without(keys))
+
+    def _without(self, keys):
+        """
+        Keys, mesh and owners of the layer once `keys` are dropped.
+        """
+        removed = [self._index[k] for k in keys if k in self._index]
+        if not removed:
+            return list(self.keys), self.mesh, self.owners
+        keep = ~np.in1d(self.owners, removed)
+        triangles = self.mesh.triangles[keep]
+        used, triangles = np.unique(triangles, return_inverse=True)
+        kept_keys = np.ones(len(self.keys), dtype=bool)
+        kept_keys[removed] = False
+        new_index = np.cumsum(kept_keys) - 1
+        mesh = self.mesh.__class__(self.mesh.vertices[used], self.mesh.normals[used],
+                                   self.mesh.colors[used], triangles.reshape(-1, 3))
+        self.hidden.difference_update(keys)
+        return ([k for k, kept in zip(self.keys, kept_keys) if kept],
+                mesh, new_index[self.owners[keep]])
+
+    def recolor(self, colors):
+        """
+        Replace the (V, 4) vertex colors of the layer, keeping its geometry.
+        """
+        self.mesh.colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+        if self.piece is not None:
+            self.piece.vertexColors = self.mesh.colors
+
+    def hide(self, keys):
+        self.hidden.update(k for k in keys if k in self._index)
+        self._update_piece()
+
+    def show(self, keys):
+        self.hidden.difference_update(keys)
+        self._update_piece()
+
+    def key_at(self, triangle):
+        """
+        Item that owns the `triangle`-th triangle currently displayed
+        in the model, as reported by picking.
+        """
+        return self.keys[self.owners[self._visible[triangle]]]
+
+    def close(self):
+        if self.model is not None and not self.model.__destroyed__:
+            chimera.openModels.close([self.model])
+        self.model = self.piece = None
+
+    def _update_piece(self):
+        if self.piece is None:
+            return
+        if self.hidden:
+            hidden = [self._index[k] for k in self.hidden]
+            self._visible = np.flatnonzero(~np.in1d(self.owners, hidden))
+        else:
+            self._visible = np.arange(len(self.owners))
+        self.piece.geometry = (self.mesh.vertices,
+                               self.mesh.triangles[self._visible].astype(np.intc))
+        self.piece.vertexColors = self.mesh.colors
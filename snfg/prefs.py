@@ -7,12 +7,12 @@ should be listed here for reference and easy reuse.
 """
 
 
-from __future__ import print_function, division
+from __future__ import absolute_import, print_function, division
 from distutils.spawn import find_executable
 import os
 # Chimera
 from chimera.preferences import preferences, addCategory, HiddenCategory
-from core import SNFG
+from .core import SNFG
 
 
 def _defaults():
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Small-ring perception restricted to a handful of atoms, e.g. the atoms
+of a single residue. It works on any hashable nodes, so it can be used
+with Chimera atoms or with plain atom indices.
+"""
+
+from __future__ import absolute_import, print_function, division
+from collections import deque
+
+
+def _shortest_path(start, end, neighbors, allowed, max_length, skip_edge):
+    """
+    Breadth-first search of the shortest path from `start` to `end`
+    within `allowed` nodes, ignoring the edge `skip_edge`.
+    """
+    previous = {start: None}
+    queue = deque([(start, 0)])
+    while queue:
+        node, depth = queue.popleft()
+        if node == end:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = previous[node]
+            return path[::-1]
+        if depth >= max_length:
+            continue
+        for other in neighbors(node):
+            if other in previous or other not in allowed:
+                continue
+            if (node, other) == skip_edge:
+                continue
+            previous[other] = node
+            queue.append((other, depth + 1))
+
+
+def smallest_rings(nodes, neighbors, max_size=6):
+    """
+    Find the smallest rings that go through each bond among `nodes`.
+
+    Parameters
+    ----------
+    nodes : iterable
+        Nodes to consider, like the atoms of a residue.
+    neighbors : callable
+        Returns the neighbors of a node. Neighbors not in `nodes` are ignored.
+    max_size : int, optional
+        Larger rings are not reported.
+
+    Returns
+    -------
+    rings : list of list
+        Ring members, ordered along the ring.
+    """
+    nodes = list(nodes)
+    allowed = set(nodes)
+    seen, rings = set(), []
+    for node in nodes:
+        for other in neighbors(node):
+            if other not in allowed:
+                continue
+            path = _shortest_path(node, other, neighbors, allowed, max_size - 1,
+                                  skip_edge=(node, other))
+            if path is None or len(path) < 3:
+                continue
+            key = frozenset(path)
+            if key not in seen:
+                seen.add(key)
+                rings.append(path)
+    return rings
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Batched rotations with Rodrigues' formula.
+
+Every function accepts arrays of axes and angles that broadcast
+against each other, so all the rotations needed by all residues can be
+computed in a single call. Angles are expressed in degrees and follow
+the right-hand rule, like `chimera.Xform.rotate` and VMD's `trans angle`.
+"""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=float)
+    return v / np.sqrt((v * v).sum(axis=-1))[..., None]
+
+
+def rotate(vectors, axes, angles):
+    """
+    Rotate `vectors` around `axes` by `angles` (in degrees). All three
+    arguments broadcast against each other, e.g. (N, 1, 3) vectors and
+    axes with (K,) angles yield (N, K, 3) rotated vectors.
+    """
+    k = _unit(axes)
+    v = np.asarray(vectors, dtype=float)
+    theta = np.radians(np.asarray(angles, dtype=float))[..., None]
+    cos, sin = np.cos(theta), np.sin(theta)
+    return (v * cos + np.cross(k, v) * sin +
+            k * (k * v).sum(axis=-1)[..., None] * (1 - cos))
+
+
+def rotate_in_plane(a, b, c, angles, vectors):
+    """
+    Rotate (N, 3) `vectors` around the normal of the plane defined by
+    points `a`, `b`, `c`, like VMD's `trans angle` command, once per angle
+    in `angles`. Since these are vectors and not points, rotating around
+    `b` is the same as rotating around the origin.
+
+    Returns
+    -------
+    rotated : (N, len(angles), 3) array of float
+    """
+    axes = np.cross(np.asarray(a, dtype=float) - b, np.asarray(b, dtype=float) - c)
+    return rotate(np.asarray(vectors, dtype=float)[:, None, :],
+                  axes[:, None, :], np.asarray(angles, dtype=float)[None, :])
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Streaming glycan scanner for PDB and mmCIF files, without Chimera.
+
+Files are read line by line and atoms are grouped by residue as they
+come. Only the residues that may be carbohydrates are kept (HETATM
+records named after a known residue code or carrying ring atom names),
+along with the residues they are covalently linked to according to the
+LINK or ``struct_conn`` records. Bonds are perceived by distance among
+the kept atoms only, and `engine.Engine` rebuilds rings and linkages
+from them. Each file is read once: the other residues are held until the
+end of its first model, so that saccharydes linked without a LINK record
+can be matched to the residues around them.
+
+    for record in scan(['1abc.pdb', '2xyz.cif.gz']):
+        print(record.path, len(record.saccharydes))
+"""
+
+from __future__ import absolute_import, print_function, division
+from collections import namedtuple
+import gzip
+import numpy as np
+from .engine import Engine, looks_saccharydic
+from .snfg_definitions import REVERSE_RESIDUE_CODES
+from .structure import Structure
+
+# Covalent radii, in Angstrom
+_RADII = dict(H=0.31, C=0.76, N=0.71, O=0.66, P=1.07, S=1.05, Se=1.20)
+_BOND_TOLERANCE = 0.45
+# Distance used to look for protein atoms bonded to unlinked saccharydes
+_CONTACT = 2.0
+
+_Atom = namedtuple('_Atom', 'hetero name resname chain resseq icode xyz element')
+
+
+def scan(paths, **kwargs):
+    """
+    Scan structure files for glycans, one at a time.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        PDB (``.pdb``, ``.ent``) or mmCIF (``.cif``) files, optionally
+        gzipped.
+    kwargs
+        Passed to `engine.Engine`.
+
+    Yields
+    ------
+    GlycanRecord
+    """
+    for path in paths:
+        yield scan_file(path, **kwargs)
+
+
+def scan_file(path, **kwargs):
+    """
+    Scan a single structure file. See `scan`.
+    """
+    residues, partners = _read(path)
+    structure = _structure(path, residues, partners)
+    engine = Engine(molecules=[structure], **kwargs)
+    engine.detect()
+    # Saccharydes whose anomeric carbon is bonded to nothing we kept are
+    # usually attached to a protein residue with no LINK record: add the
+    # residues in contact with them and detect again
+    loose = [engine.saccharydes[r].a1 for r, l in engine.graph.linkages.items()
+             if l.kind == 'terminal']
+    if loose:
+        extra = _contacts(residues, np.array([a.coord() for a in loose]), structure)
+        if extra:
+            structure = _structure(path, residues, partners | extra)
+            engine = Engine(molecules=[structure], **kwargs)
+            engine.detect()
+    return GlycanRecord(path, engine, structure)
+
+
+def read_glycans(path, extra=()):
+    """
+    Build a `structure.Structure` with the candidate carbohydrate
+    residues of the first model in `path`, the residues linked to them and
+    the residues in `extra`, given as ``(chain, resseq, icode)`` keys.
+    """
+    residues, partners = _read(path)
+    return _structure(path, residues, partners.union(extra))
+
+
+class GlycanRecord(object):
+
+    """
+    Glycans found in a structure file.
+
+    Attributes
+    ----------
+    path : str
+    saccharydes : list of dict
+        Residue id, residue code and SNFG name of each saccharyde.
+    linkages : list of dict
+        Donor and acceptor residue ids, kind and acceptor position of the
+        linkage of each saccharyde.
+    glycans : list of list of str
+        Residue ids of each glycan tree, starting from its reducing end.
+    structure : structure.Structure
+        Atoms kept from the file.
+    engine : engine.Engine
+        Engine that detected the saccharydes, to compute their geometry.
+    """
+
+    def __init__(self, path, engine, structure):
+        self.path = path
+        self.structure = structure
+        self.engine = engine
+        table, graph = engine.saccharydes, engine.graph
+        self.saccharydes = [dict(residue=str(r.id), code=r.type, name=table[r].name)
+                            for r in table.keys()]
+        self.linkages = []
+        for residue in table.keys():
+            linkage = graph.linkage(residue)
+            acceptor = linkage.acceptor
+            self.linkages.append(dict(
+                donor=str(residue.id), kind=linkage.kind, position=linkage.position,
+                acceptor=None if acceptor is None else str(acceptor.id),
+                acceptor_code=None if acceptor is None else acceptor.type))
+        self.glycans = []
+        for root in graph.roots():
+            tree, queue = [], [root]
+            while queue:
+                residue = queue.pop(0)
+                tree.append(str(residue.id))
+                queue.extend(sorted(graph.children(residue), key=lambda r: r.index))
+            self.glycans.append(tree)
+
+    def __len__(self):
+        return len(self.saccharydes)
+
+    def __repr__(self):
+        return '<GlycanRecord {}: {} saccharydes in {} glycans>'.format(
+            self.path, len(self.saccharydes), len(self.glycans))
+
+    def as_dict(self):
+        """
+        JSON-serializable summary.
+        """
+        return dict(path=self.path, saccharydes=self.saccharydes,
+                    linkages=self.linkages, glycans=self.glycans)
+
+
+def bonds_by_distance(xyz, elements):
+    """
+    (B, 2) pairs of atoms closer than the sum of their covalent radii
+    plus a tolerance, found with a spatial hash.
+    """
+    xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+    if not len(xyz):
+        return np.zeros((0, 2), dtype=int)
+    radii = np.array([_RADII.get(e, 0.77) for e in elements])
+    grid = _grid(xyz, 2 * radii.max() + _BOND_TOLERANCE)
+    offsets = [(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)]
+    bonds = []
+    for (cx, cy, cz), members in grid.items():
+        members = np.array(members)
+        near = np.array([j for dx, dy, dz in offsets
+                         for j in grid.get((cx + dx, cy + dy, cz + dz), ())])
+        d = np.linalg.norm(xyz[members, None] - xyz[None, near], axis=2)
+        cutoff = radii[members, None] + radii[None, near] + _BOND_TOLERANCE
+        i, j = np.nonzero((d < cutoff) & (d > 0.4))
+        i, j = members[i], near[j]
+        bonds.append(np.stack([i[i < j], j[i < j]], axis=1))
+    return np.concatenate(bonds)
+
+
+def _grid(xyz, cell):
+    """
+    Spatial hash of the (N, 3) `xyz`: indices of the points in each cube
+    of side `cell`.
+    """
+    grid = {}
+    for i, c in enumerate(map(tuple, np.floor(xyz / cell).astype(int))):
+        grid.setdefault(c, []).append(i)
+    return grid
+
+
+def _within(xyz, points, cutoff):
+    """
+    Mask of the (N, 3) `xyz` closer than `cutoff` to any of the (P, 3)
+    `points`. Each cell of the spatial hash of `points` is only compared
+    with the coordinates in the cells around it.
+    """
+    cells = np.floor(xyz / cutoff).astype(int)
+    near = np.zeros(len(xyz), dtype=bool)
+    for cell, members in _grid(points, cutoff).items():
+        around = np.nonzero((np.abs(cells - cell) <= 1).all(axis=1))[0]
+        d = np.linalg.norm(xyz[around, None] - points[None, members], axis=2)
+        near[around[(d < cutoff).any(axis=1)]] = True
+    return near
+
+
+def _read(path):
+    """
+    Atoms of the first model of `path` grouped by residue, and keys of the
+    residues linked to a carbohydrate by LINK or ``struct_conn`` records.
+    """
+    partners, residues, residue = set(), [], []
+    for kind, item in _records(path):
+        if kind == 'link':
+            (key1, name1), (key2, name2) = item
+            if name1 in REVERSE_RESIDUE_CODES:
+                partners.add(key2)
+            if name2 in REVERSE_RESIDUE_CODES:
+                partners.add(key1)
+            continue
+        if residue and _residue_key(residue[0]) != _residue_key(item):
+            residues.append(residue)
+            residue = []
+        residue.append(item)
+    if residue:
+        residues.append(residue)
+    return residues, partners
+
+
+def _structure(path, residues, partners):
+    """
+    `structure.Structure` with the candidate carbohydrates among
+    `residues` and the residues whose keys are in `partners`.
+    """
+    names, elements, residue_index, xyz = [], [], [], []
+    residue_names, residue_ids, hetero = [], [], []
+    for residue in residues:
+        _keep(residue, partners, names, elements, residue_index, xyz,
+              residue_names, residue_ids, hetero)
+    xyz = np.reshape(xyz, (-1, 3))
+    return Structure(names, elements, residue_index, residue_names, residue_ids, xyz,
+                     bonds_by_distance(xyz, elements), hetero=hetero, name=path)
+
+
+def _residue_key(atom):
+    return atom.chain, atom.resseq, atom.icode
+
+
+def _residue_id(atom):
+    return '{}{}.{}'.format(atom.resseq, atom.icode.strip(), atom.chain)
+
+
+def _keep(residue, partners, names, elements, residue_index, xyz,
+          residue_names, residue_ids, hetero):
+    """
+    Append the atoms of `residue` to the columns if it is worth keeping.
+    """
+    first = residue[0]
+    key = _residue_key(first)
+    if not (key in partners or
+            (first.hetero and looks_saccharydic(first.resname, set(a.name for a in residue)))):
+        return
+    index = len(residue_names)
+    residue_names.append(first.resname)
+    residue_ids.append(_residue_id(first))
+    hetero.append(first.hetero)
+    for atom in residue:
+        names.append(atom.name)
+        elements.append(atom.element)
+        residue_index.append(index)
+        xyz.append(atom.xyz)
+
+
+def _contacts(residues, points, structure):
+    """
+    Keys of the `residues` not in `structure` with an atom within
+    `_CONTACT` of any of `points`.
+    """
+    kept = set(structure.residue_ids)
+    others = [r for r in residues if _residue_id(r[0]) not in kept]
+    if not others:
+        return set()
+    xyz = np.array([atom.xyz for residue in others for atom in residue])
+    owners = np.repeat(np.arange(len(others)), [len(r) for r in others])
+    return set(_residue_key(others[i][0])
+               for i in np.unique(owners[_within(xyz, points, _CONTACT)]))
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _lines(path):
+    with _open(path) as f:
+        for line in f:
+            yield line.decode('ascii', 'replace').rstrip('\r\n')
+
+
+def _records(path):
+    """
+    ('atom', _Atom) and ('link', ((key1, resname1), (key2, resname2)))
+    tuples of the first model of `path`, in file order.
+    """
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.lower().endswith(('.cif', '.mmcif')):
+        return _cif_records(_lines(path))
+    return _pdb_records(_lines(path))
+
+
+def _pdb_records(lines):
+    altlocs = {}
+    for line in lines:
+        record = line[:6]
+        if record in ('ATOM  ', 'HETATM'):
+            altloc = line[16:17]
+            atom = _Atom(record == 'HETATM', line[12:16].strip(), line[17:20].strip(),
+                         line[21:22], line[22:26].strip(), line[26:27],
+                         np.array([float(line[30:38]), float(line[38:46]),
+                                   float(line[46:54])]),
+                         _element(line[76:78].strip(), line[12:16]))
+            if not _first_altloc(altlocs, atom, altloc):
+                continue
+            yield 'atom', atom
+        elif record == 'LINK  ':
+            yield 'link', (((line[21:22], line[22:26].strip(), line[26:27]), line[17:20].strip()),
+                           ((line[51:52], line[52:56].strip(), line[56:57]), line[47:50].strip()))
+        elif record == 'ENDMDL':
+            return
+
+
+def _cif_records(lines):
+    altlocs, model = {}, None
+    for category, names, row in _cif_rows(_cif_tokens(lines)):
+        if category == '_atom_site':
+            atom, number = _cif_atom(row, names)
+            if model is None:
+                model = number
+            elif number != model:
+                return
+            if _first_altloc(altlocs, atom, _cif_value(row, names, 'label_alt_id')):
+                yield 'atom', atom
+        elif model is not None:
+            # Links always come before the coordinates
+            return
+        elif category == '_struct_conn':
+            # Without a connection type, let the partners decide
+            conn_type = _cif_value(row, names, 'conn_type_id')
+            if not conn_type or conn_type.startswith('covale'):
+                yield 'link', (_cif_partner(row, names, 'ptnr1'),
+                               _cif_partner(row, names, 'ptnr2'))
+
+
+def _cif_rows(tokens):
+    """
+    ``(category, names, row)`` for each row of the mmCIF `tokens`, where
+    `names` maps item names to their position in `row`. Categories written
+    as key-value pairs instead of a ``loop_`` give a single row.
+    """
+    category, names, row = None, {}, []
+    token = next(tokens, None)
+    while token is not None:
+        if token.startswith('_') and '.' in token:
+            name, item = token.split('.', 1)
+            if name != category:
+                if row:
+                    yield category, names, row
+                category, names, row = name, {}, []
+            names[item] = len(row)
+            row.append(next(tokens, '?'))
+            token = next(tokens, None)
+            continue
+        if row:
+            yield category, names, row
+        category, names, row = None, {}, []
+        if token != 'loop_':
+            token = next(tokens, None)
+            continue
+        columns = []
+        token = next(tokens, None)
+        while token is not None and token.startswith('_'):
+            columns.append(token)
+            token = next(tokens, None)
+        name = columns[0].split('.')[0] if columns else None
+        items = dict((c.split('.', 1)[-1], i) for i, c in enumerate(columns))
+        values = []
+        while token is not None and not _cif_keyword(token):
+            values.append(token)
+            if len(values) == len(columns):
+                yield name, items, values
+                values = []
+            token = next(tokens, None)
+    if row:
+        yield category, names, row
+
+
+def _cif_keyword(token):
+    return (token == 'loop_' or token.startswith('_') or token.startswith('data_')
+            or token.startswith('save_'))
+
+def _cif_tokens(lines):
+    """
+    Whitespace-separated values of a mmCIF file, with quoted strings
+    unquoted and semicolon-delimited text fields as single tokens.
+    """
+    text = None
+    for line in lines:
+        if text is not None:
+            if line.startswith(';'):
+                yield '\n'.join(text)
+                text = None
+            else:
+                text.append(line)
+            continue
+        if line.startswith(';'):
+            text = [line[1:]]
+            continue
+        if line.startswith('#'):
+            continue
+        if '"' not in line and "'" not in line:
+            for token in line.split():
+                yield token
+            continue
+        i, n = 0, len(line)
+        while i < n:
+            if line[i].isspace():
+                i += 1
+            elif line[i] in '\'"':
+                quote, j = line[i], i + 1
+                # A quote only closes the string if followed by whitespace
+                while j < n and not (line[j] == quote and (j + 1 == n or line[j + 1].isspace())):
+                    j += 1
+                yield line[i + 1:j]
+                i = j + 1
+            else:
+                j = i
+                while j < n and not line[j].isspace():
+                    j += 1
+                yield line[i:j]
+                i = j
+
+
+def _cif_value(row, names, *keys):
+    for key in keys:
+        if key in names and row[names[key]] not in ('?', '.'):
+            return row[names[key]]
+    return ''
+
+
+def _cif_atom(row, names):
+    atom = _Atom(row[names['group_PDB']] == 'HETATM',
+                 _cif_value(row, names, 'auth_atom_id', 'label_atom_id'),
+                 _cif_value(row, names, 'auth_comp_id', 'label_comp_id'),
+                 _cif_value(row, names, 'auth_asym_id', 'label_asym_id'),
+                 _cif_value(row, names, 'auth_seq_id', 'label_seq_id'),
+                 _cif_value(row, names, 'pdbx_PDB_ins_code') or ' ',
+                 np.array([float(row[names['Cartn_x']]), float(row[names['Cartn_y']]),
+                           float(row[names['Cartn_z']])]),
+                 _element(_cif_value(row, names, 'type_symbol'),
+                          _cif_value(row, names, 'auth_atom_id', 'label_atom_id')))
+    return atom, _cif_value(row, names, 'pdbx_PDB_model_num')
+
+
+def _cif_partner(row, names, partner):
+    key = (_cif_value(row, names, partner + '_auth_asym_id', partner + '_label_asym_id'),
+           _cif_value(row, names, partner + '_auth_seq_id', partner + '_label_seq_id'),
+           _cif_value(row, names, 'pdbx_{}_PDB_ins_code'.format(partner)) or ' ')
+    return key, _cif_value(row, names, partner + '_auth_comp_id', partner + '_label_comp_id')
+
+
+def _first_altloc(altlocs, atom, altloc):
+    """
+    Whether `atom` belongs to the first alternate location seen for it.
+    """
+    if altloc in (' ', '.', '?', ''):
+        return True
+    key = _residue_key(atom) + (atom.name,)
+    return altlocs.setdefault(key, altloc) == altloc
+
+
+def _element(symbol, atom_name):
+    if symbol:
+        return symbol[0].upper() + symbol[1:].lower()
+    # Without element columns, guess from the atom name
+    name = atom_name.strip().lstrip('0123456789')
+    return name[:1].upper() or 'X'
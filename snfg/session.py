@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Chimera session support.
+
+When a session is saved, each enabled `SNFG` instance writes its
+parameters and, for each molecule it tracks, the arrays returned by
+`SNFG.session_state` (saccharydes, linkages and merged meshes) in the
+same compressed format as the `cache` entries. Restoring the session
+creates the instances again once the molecules are back, bound to the
+new residues and triggers, without detecting or meshing anything.
+"""
+
+from __future__ import absolute_import, print_function, division
+import base64
+import chimera
+import SimpleSession
+from .cache import dumps, loads
+from .core import SNFG
+
+_RESTORE = """
+def restore_snfg_session(states):
+    try:
+        from {module} import restore_session
+        restore_session(states)
+    except Exception:
+        reportRestoreError('Error restoring SNFG glyphs')
+
+restore_snfg_session({states!r})
+"""
+
+
+def save_session(trigger, data, session_file):
+    """
+    Handler of `SimpleSession.SAVE_SESSION`: write the code that restores
+    the enabled `SNFG` instances to `session_file`.
+    """
+    states = []
+    for instance in SNFG._instances:
+        params, entries = instance.session_state()
+        molecules = [(SimpleSession.sessionID(m), base64.b64encode(dumps(a)).decode('ascii'))
+                     for m, a in entries.items()]
+        states.append(dict(params=params, all_molecules=instance._all_molecules,
+                           molecules=molecules))
+    if states:
+        session_file.write(_RESTORE.format(module=__name__, states=states))
+
+
+def restore_session(states):
+    """
+    Called from a session file: rebuild the saved `SNFG` instances once
+    all the models are restored.
+    """
+    SimpleSession.registerAfterModelsCB(_restore, states)
+
+
+def _restore(states):
+    for state in states:
+        entries = {}
+        for molecule_id, data in state['molecules']:
+            molecule = SimpleSession.idLookup(molecule_id)
+            entries[molecule] = loads(base64.b64decode(data))
+        SNFG.from_session(state['params'], entries, state['all_molecules'])
+
+
+chimera.triggers.addHandler(SimpleSession.SAVE_SESSION, save_session, None)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Molecules described by plain arrays.
+
+`Structure` holds atom names, elements, residues, coordinates and bonds
+as NumPy arrays, and exposes lightweight atom and residue views with the
+subset of the Chimera API used by the SNFG engine (`name`, `element`,
+`neighbors`, `residue`, `coord()` / `type`, `atoms`, `atomsMap`...).
+Views are built once per structure, so they can be compared and hashed
+by identity, like Chimera objects.
+"""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+
+MASSES = dict(H=1.008, B=10.81, C=12.011, N=14.007, O=15.999, F=18.998, Na=22.990,
+              Mg=24.305, P=30.974, S=32.06, Cl=35.45, K=39.098, Ca=40.078,
+              Mn=54.938, Fe=55.845, Zn=65.38, Se=78.971, Br=79.904, I=126.904)
+
+
+class Element(object):
+
+    __slots__ = ('name', 'mass')
+
+    def __init__(self, name):
+        self.name = name
+        self.mass = MASSES.get(name, 0.0)
+
+    def __repr__(self):
+        return '<Element {}>'.format(self.name)
+
+
+class CoordSet(object):
+
+    __slots__ = ('id',)
+
+    def __init__(self, id):
+        self.id = id
+
+
+class Atom(object):
+
+    """
+    View of an atom of a `Structure`.
+    """
+
+    __slots__ = ('structure', 'index', 'residue')
+
+    def __init__(self, structure, index, residue):
+        self.structure = structure
+        self.index = index
+        self.residue = residue
+
+    def __repr__(self):
+        return '<Atom {} {}>'.format(self.residue, self.name)
+
+    @property
+    def name(self):
+        return self.structure.atom_names[self.index]
+
+    @property
+    def element(self):
+        return self.structure.elements[self.index]
+
+    @property
+    def molecule(self):
+        return self.structure
+
+    @property
+    def neighbors(self):
+        atoms = self.structure.atoms
+        return [atoms[j] for j in self.structure.neighbor_indices[self.index]]
+
+    def coord(self, coordset=None):
+        return self.structure.coords[self.index].copy()
+
+    @staticmethod
+    def coordinates(atoms):
+        """
+        (A, 3) coordinates of `atoms`, gathered per structure.
+        """
+        xyz = np.empty((len(atoms), 3))
+        by_structure = {}
+        for i, atom in enumerate(atoms):
+            by_structure.setdefault(atom.structure, ([], []))
+            by_structure[atom.structure][0].append(i)
+            by_structure[atom.structure][1].append(atom.index)
+        for structure, (positions, indices) in by_structure.items():
+            xyz[positions] = structure.coords[indices]
+        return xyz
+
+
+class Residue(object):
+
+    """
+    View of a residue of a `Structure`.
+    """
+
+    __slots__ = ('structure', 'index', 'atoms', 'atomsMap')
+
+    def __init__(self, structure, index):
+        self.structure = structure
+        self.index = index
+        self.atoms = []
+        self.atomsMap = {}
+
+    def __repr__(self):
+        return '{} {}'.format(self.type, self.id)
+
+    @property
+    def type(self):
+        return self.structure.residue_names[self.index]
+
+    @property
+    def id(self):
+        return self.structure.residue_ids[self.index]
+
+    @property
+    def isHet(self):
+        return bool(self.structure.hetero[self.index])
+
+    @property
+    def molecule(self):
+        return self.structure
+
+
+class Structure(object):
+
+    """
+    Molecule given by parallel arrays, one row per atom or residue.
+
+    Parameters
+    ----------
+    atom_names : (A,) sequence of str
+    elements : (A,) sequence of str
+        Element symbols, like 'C' or 'Zn'.
+    residue_index : (A,) array of int
+        Position in the residue arrays of the residue of each atom.
+    residue_names : (R,) sequence of str
+    residue_ids : (R,) sequence
+        Any printable identifier, like '12.A'.
+    coords : (A, 3) array of float
+    bonds : (B, 2) array of int
+        Positions of the bonded atoms.
+    hetero : (R,) array of bool, optional
+        Whether each residue is a heterogen (HETATM records). By
+        default, all of them are.
+    name : str, optional
+    """
+
+    def __init__(self, atom_names, elements, residue_index, residue_names, residue_ids,
+                 coords, bonds, hetero=None, name=''):
+        self.name = name
+        self.atom_names = list(atom_names)
+        self.elements = [Element(e) for e in elements]
+        self.residue_index = np.asarray(residue_index, dtype=int)
+        self.residue_names = list(residue_names)
+        self.residue_ids = list(residue_ids)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.bonds = np.asarray(bonds, dtype=int).reshape(-1, 2)
+        self.hetero = (np.ones(len(self.residue_names), dtype=bool) if hetero is None
+                       else np.asarray(hetero, dtype=bool))
+        self.neighbor_indices = [[] for _ in self.atom_names]
+        for i, j in self.bonds:
+            self.neighbor_indices[i].append(j)
+            self.neighbor_indices[j].append(i)
+        self.residues = [Residue(self, i) for i in range(len(self.residue_names))]
+        self.atoms = []
+        for i, r in enumerate(self.residue_index):
+            residue = self.residues[r]
+            atom = Atom(self, i, residue)
+            residue.atoms.append(atom)
+            residue.atomsMap.setdefault(self.atom_names[i], []).append(atom)
+            self.atoms.append(atom)
+        self.coordSets = {0: CoordSet(0)}
+        self.activeCoordSet = self.coordSets[0]
+
+    def __repr__(self):
+        return '<Structure {} ({} residues)>'.format(self.name, len(self.residues))
+
+    def set_coordinates(self, coords):
+        """
+        Replace the (A, 3) coordinates of all atoms. Consumers that cache
+        coordinates by active coordinate set see it as a new one.
+        """
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        new_id = max(self.coordSets) + 1
+        self.coordSets = {new_id: CoordSet(new_id)}
+        self.activeCoordSet = self.coordSets[new_id]
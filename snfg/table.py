@@ -0,0 +1,501 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+Column-oriented storage for detected saccharydes.
+
+Instead of one Python object per residue, `SaccharydeTable` keeps
+parallel NumPy arrays (SNFG code, shape, colors, ring atoms, masses,
+coordinates...) and hands out lightweight `SaccharydeRow` views on demand.
+Row views are transient: they point to a position in the table, so they
+should not be kept around after residues are removed.
+"""
+
+from __future__ import absolute_import, print_function, division
+import numpy as np
+from .snfg_definitions import RESIDUES, REVERSE_RESIDUE_CODES, SCALES, COLORS
+from .geometry import TEMPLATES
+from .structure import Atom as _StructureAtom
+try:
+    from chimera import numpyArrayFromAtoms as _numpy_array_from_atoms
+except ImportError:
+    _numpy_array_from_atoms = None
+
+
+def atom_coordinates(atoms, coordset=None):
+    """
+    Untransformed (A, 3) coordinates of `atoms`, taken from `coordset`
+    instead of the active coordinate set if given.
+    """
+    if len(atoms) and isinstance(atoms[0], _StructureAtom):
+        return _StructureAtom.coordinates(atoms)
+    if coordset is None and _numpy_array_from_atoms is not None:
+        return _numpy_array_from_atoms(atoms)
+    args = () if coordset is None else (coordset,)
+    return np.array([a.coord(*args).data() for a in atoms], dtype=float).reshape(-1, 3)
+
+
+CODES = sorted(RESIDUES)
+SHAPES = sorted(TEMPLATES)
+COLOR_NAMES = sorted(COLORS)
+RING_SIZE = 6
+
+_CODE_IDS = dict((name, i) for i, name in enumerate(CODES))
+_SHAPE_IDS = dict((name, i) for i, name in enumerate(SHAPES))
+_COLOR_IDS = dict((name, i) for i, name in enumerate(COLOR_NAMES))
+
+
+class SaccharydeRow(object):
+
+    """
+    View of a single saccharyde stored in a `SaccharydeTable`.
+    """
+
+    __slots__ = ('table', 'index')
+    _base_id = [99]
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, SaccharydeRow) and self.table is other.table
+                and self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.table), self.index))
+
+    def __repr__(self):
+        return '<{} {} {}>'.format(self.__class__.__name__, self.name, self.residue)
+
+    @classmethod
+    def _next_id(cls):
+        cls._base_id[0] += 1
+        return cls._base_id[0]
+
+    @property
+    def residue(self):
+        return self.table.residues[self.index]
+
+    @property
+    def name(self):
+        return CODES[self.table.codes[self.index]]
+
+    @property
+    def info(self):
+        return RESIDUES[self.name]
+
+    @property
+    def fullname(self):
+        return self.info.get('name')
+
+    @property
+    def shape(self):
+        return SHAPES[self.table.shapes[self.index]]
+
+    @property
+    def base_size(self):
+        return self.table.base_size
+
+    @property
+    def size(self):
+        return self.table.sizes[self.index]
+
+    @property
+    def color1(self):
+        return 'snfg_' + COLOR_NAMES[self.table.colors[self.index, 0]]
+
+    @property
+    def color2(self):
+        return 'snfg_' + COLOR_NAMES[self.table.colors[self.index, 1]]
+
+    @property
+    def atoms(self):
+        return [self.table.atoms[i] for i in self.table.rings[self.index] if i >= 0]
+
+    @property
+    def atom_map(self):
+        return dict((a.name, a) for a in self.atoms)
+
+    @property
+    def shifted(self):
+        return bool(self.table.shifted[self.index])
+
+    @property
+    def vrml(self):
+        return self.table.vrmls[self.index]
+
+    @vrml.setter
+    def vrml(self, value):
+        self.table.vrmls[self.index] = value
+
+    @property
+    def _id(self):
+        return self.table.ids[self.index]
+
+    @property
+    def center(self):
+        return self.table.centers[self.index]
+
+    @property
+    def center_att(self):
+        """
+        Get the geometric center of the ring attached to this
+        ring, and draw cylinders connecting rings. In some cases,
+        there is no attached residue. The following line assigns
+        the coordinates of the C1 atom (or C2 for sialic acids)
+        to be the geometric center of the attached residue so that
+        the shapes can be aligned properly without crashing when no
+        residue is attached.
+        """
+        return self.p1
+
+    @property
+    def a1(self):
+        """
+        first member of the ring: usually the first carbon atom.
+        """
+        return self.table.atoms[self.table.anchors[self.index, 0]]
+
+    @property
+    def a6(self):
+        """
+        sixth member of the ring: usually the last oxygen atom.
+        """
+        return self.table.atoms[self.table.anchors[self.index, 1]]
+
+    @property
+    def p1(self):
+        """
+        Coordinates of the first member of the ring: usually the first carbon atom.
+        """
+        return self.table.p1s[self.index]
+
+    @property
+    def p6(self):
+        """
+        Coordinates of the sixth member of the ring: usually the last oxygen atom.
+        """
+        return self.table.p6s[self.index]
+
+    @property
+    def xyz(self):
+        ring = self.table.rings[self.index]
+        return self.table.xyz[ring[ring >= 0]]
+
+    @property
+    def xform_xyz(self):
+        return [a.xformCoord() for a in self.atoms]
+
+
+class SaccharydeTable(object):
+
+    """
+    Parallel arrays describing every detected saccharyde, indexed by row.
+    It also behaves like a dict that maps residues to row views.
+
+    Parameters
+    ----------
+    base_size : float, optional
+    row_class : SaccharydeRow subclass, optional
+        Class used to build the row views.
+
+    Attributes
+    ----------
+    residues : list of chimera.Residue or structure.Residue
+    codes, shapes : (N,) array of int
+        Positions in `CODES` and `SHAPES`.
+    colors : (N, 2) array of int
+        Positions in `COLOR_NAMES` of both colors of each residue.
+    sizes : (N,) array of float
+    shifted : (N,) array of bool
+        Whether the ring starts at C2 instead of C1 (e.g. sialic acids).
+    atoms : list of chimera.Atom or structure.Atom
+        Ring atoms of all residues.
+    rings : (N, 6) array of int
+        Positions in `atoms` of each ring member, padded with -1.
+    masses : (N, 6) array of float
+        Masses of each ring member, 0 for padding.
+    anchors : (N, 2) array of int
+        Positions in `atoms` of the first and sixth ring members.
+    xyz : (A, 3) array of float
+        Coordinates of all the ring atoms.
+    centers, p1s, p6s : (N, 3) array of float
+        Coordinates of the ring centers and anchors.
+
+    Notes
+    -----
+    Coordinates are gathered in a single pass over all ring atoms and
+    cached until the active coordinate set of any of the molecules
+    changes, or `invalidate` is called (e.g. after atoms are moved).
+    """
+
+    def __init__(self, base_size=4.0, row_class=SaccharydeRow):
+        self.base_size = base_size
+        self.row_class = row_class
+        self.clear()
+
+    def clear(self):
+        self.residues = []
+        self.codes = np.zeros(0, dtype=int)
+        self.shapes = np.zeros(0, dtype=int)
+        self.colors = np.zeros((0, 2), dtype=int)
+        self.sizes = np.zeros(0)
+        self.shifted = np.zeros(0, dtype=bool)
+        self.ids = np.zeros(0, dtype=int)
+        self.atoms = []
+        self.rings = np.zeros((0, RING_SIZE), dtype=int)
+        self.masses = np.zeros((0, RING_SIZE))
+        self.anchors = np.zeros((0, 2), dtype=int)
+        self.vrmls = []
+        self.molecules = []
+        self._xyz = np.zeros((0, 3))
+        self._centers = np.zeros((0, 3))
+        self._p1s = np.zeros((0, 3))
+        self._p6s = np.zeros((0, 3))
+        self._coordinates_key = ()
+        self._index = {}
+
+    # Mapping interface
+    def __len__(self):
+        return len(self.residues)
+
+    def __iter__(self):
+        return iter(list(self.residues))
+
+    def __contains__(self, residue):
+        return residue in self._index
+
+    def __getitem__(self, residue):
+        return self.row_class(self, self._index[residue])
+
+    def get(self, residue, default=None):
+        index = self._index.get(residue)
+        if index is None:
+            return default
+        return self.row_class(self, index)
+
+    def keys(self):
+        return list(self.residues)
+
+    def values(self):
+        return [self.row_class(self, i) for i in range(len(self.residues))]
+
+    def items(self):
+        return [(r, self.row_class(self, i)) for i, r in enumerate(self.residues)]
+
+    def row(self, index):
+        return self.row_class(self, index)
+
+    def index_of(self, residues):
+        """
+        Row positions of `residues`, as an array of int.
+        """
+        return np.array([self._index[r] for r in residues], dtype=int)
+
+    def extend(self, entries):
+        """
+        Add new saccharydes to the table, in a single batch.
+
+        Parameters
+        ----------
+        entries : iterable of (chimera.Residue, list of chimera.Atom)
+            Each residue along with the atoms of its ring.
+
+        Returns
+        -------
+        skipped : list of chimera.Residue
+            Residues left out because their ring has no oxygen bonded to
+            a ring carbon, so it cannot be oriented.
+        """
+        entries = [(r, atoms) for (r, atoms) in entries if r not in self._index]
+        skipped, anchored = [], []
+        for residue, ring_atoms in entries:
+            ring_anchors = _ring_anchors(ring_atoms)
+            if ring_anchors is None:
+                skipped.append(residue)
+            else:
+                anchored.append((residue, ring_atoms, ring_anchors))
+        if not anchored:
+            return skipped
+        n = len(anchored)
+        codes, shapes, colors, sizes, shifted, ids = [], [], [], [], [], []
+        rings = -np.ones((n, RING_SIZE), dtype=int)
+        masses = np.zeros((n, RING_SIZE))
+        anchors = np.zeros((n, 2), dtype=int)
+        offset = len(self.atoms)
+        for i, (residue, ring_atoms, (a1, a6)) in enumerate(anchored):
+            name = REVERSE_RESIDUE_CODES.get(residue.type, 'UNK')
+            info = RESIDUES[name]
+            shape = info.get('shape')
+            color_names = info.get('color').split()
+            codes.append(_CODE_IDS[name])
+            shapes.append(_SHAPE_IDS[shape])
+            colors.append((_COLOR_IDS[color_names[0]], _COLOR_IDS[color_names[-1]]))
+            sizes.append(SCALES.get(shape, 1.0) * self.base_size)
+            ids.append(self.row_class._next_id())
+            shifted.append(ring_atoms[a1].name == 'C2')
+            rings[i, :len(ring_atoms)] = np.arange(offset, offset + len(ring_atoms))
+            masses[i, :len(ring_atoms)] = [a.element.mass for a in ring_atoms]
+            anchors[i] = (offset + a1, offset + a6)
+            offset += len(ring_atoms)
+            self._index[residue] = len(self.residues)
+            self.residues.append(residue)
+            self.atoms.extend(ring_atoms)
+            self.vrmls.append(None)
+        self.codes = np.concatenate([self.codes, codes])
+        self.shapes = np.concatenate([self.shapes, shapes])
+        self.colors = np.concatenate([self.colors, np.reshape(colors, (-1, 2))])
+        self.sizes = np.concatenate([self.sizes, sizes])
+        self.shifted = np.concatenate([self.shifted, shifted])
+        self.ids = np.concatenate([self.ids, ids])
+        self.rings = np.concatenate([self.rings, rings])
+        self.masses = np.concatenate([self.masses, masses])
+        self.anchors = np.concatenate([self.anchors, anchors])
+        self._update_molecules()
+        self.invalidate()
+        return skipped
+
+    def remove(self, residues):
+        """
+        Remove `residues` from the table, in a single batch. Returns the
+        row views of the removed residues, valid until the next change.
+        """
+        removed = [self._index[r] for r in residues if r in self._index]
+        if not removed:
+            return []
+        keep = np.ones(len(self.residues), dtype=bool)
+        keep[removed] = False
+        # Compact the atom list and remap ring indices
+        kept_atoms = np.zeros(len(self.atoms), dtype=bool)
+        kept_atoms[self.rings[keep][self.rings[keep] >= 0]] = True
+        atom_index = np.cumsum(kept_atoms) - 1
+        rings = self.rings[keep]
+        rings[rings >= 0] = atom_index[rings[rings >= 0]]
+        removed_rows = [_Detached(self, i) for i in removed]
+        self.atoms = [a for a, k in zip(self.atoms, kept_atoms) if k]
+        self.rings = rings
+        self.anchors = atom_index[self.anchors[keep]]
+        for name in ('codes', 'shapes', 'colors', 'sizes', 'shifted', 'ids', 'masses'):
+            setattr(self, name, getattr(self, name)[keep])
+        # Coordinates may not have been gathered since the last `extend`
+        if len(self._centers) == len(keep) and len(self._xyz) == len(kept_atoms):
+            self._centers, self._p1s, self._p6s = (self._centers[keep], self._p1s[keep],
+                                                   self._p6s[keep])
+            self._xyz = self._xyz[kept_atoms]
+        else:
+            self.invalidate()
+        self.residues = [r for r, k in zip(self.residues, keep) if k]
+        self.vrmls = [v for v, k in zip(self.vrmls, keep) if k]
+        self._index = dict((r, i) for i, r in enumerate(self.residues))
+        self._update_molecules()
+        return removed_rows
+
+    def _update_molecules(self):
+        molecules = []
+        for residue in self.residues:
+            if residue.molecule not in molecules:
+                molecules.append(residue.molecule)
+        self.molecules = molecules
+
+    @property
+    def xyz(self):
+        self.update_coordinates()
+        return self._xyz
+
+    @property
+    def centers(self):
+        self.update_coordinates()
+        return self._centers
+
+    @property
+    def p1s(self):
+        self.update_coordinates()
+        return self._p1s
+
+    @property
+    def p6s(self):
+        self.update_coordinates()
+        return self._p6s
+
+    def invalidate(self):
+        """
+        Forget the cached coordinates. Needed when atoms are moved
+        without changing the active coordinate set.
+        """
+        self._coordinates_key = None
+
+    def update_coordinates(self, force=False):
+        """
+        Gather the coordinates of all ring atoms and recompute the
+        mass-weighted ring centers and anchors, unless the cached ones
+        are still valid for the active coordinate sets.
+        """
+        key = tuple(m.activeCoordSet for m in self.molecules)
+        if force or key != self._coordinates_key:
+            self.set_coordinates(atom_coordinates(self.atoms))
+            self._coordinates_key = key
+
+    def set_coordinates(self, xyz):
+        """
+        Compute ring centers and anchors from (A, 3) coordinates of
+        `self.atoms`.
+        """
+        xyz = np.asarray(xyz, dtype=float).reshape(-1, 3)
+        self._xyz = xyz
+        if not len(self.residues):
+            return
+        self._centers, self._p1s, self._p6s = self.ring_geometry(xyz)
+
+    def ring_geometry(self, xyz):
+        """
+        Ring centers, first and sixth ring members of every row for (A, 3)
+        coordinates of `self.atoms`, without caching them.
+        """
+        ring_xyz = xyz[np.where(self.rings >= 0, self.rings, 0)]
+        centers = ((ring_xyz * self.masses[..., None]).sum(axis=1)
+                   / self.masses.sum(axis=1)[:, None])
+        return centers, xyz[self.anchors[:, 0]], xyz[self.anchors[:, 1]]
+
+
+def _ring_anchors(ring_atoms):
+    """
+    Positions in `ring_atoms` of the anomeric carbon, i.e. the lowest
+    numbered carbon bonded to the ring oxygen (C1 of aldoses, C2 of
+    ketoses and sialic acids), and of the ring oxygen itself. None if
+    the ring does not have exactly one oxygen bonded to a ring carbon.
+    """
+    oxygens = [i for i, a in enumerate(ring_atoms) if a.element.name == 'O']
+    if len(oxygens) != 1:
+        return None
+    oxygen = ring_atoms[oxygens[0]]
+    carbons = [i for i, a in enumerate(ring_atoms)
+               if a.element.name == 'C' and oxygen in a.neighbors]
+    if not carbons:
+        return None
+    return min(carbons, key=lambda i: _atom_number(ring_atoms[i].name)), oxygens[0]
+
+
+def _atom_number(name):
+    digits = ''.join(c for c in name if c.isdigit())
+    return int(digits) if digits else float('inf')
+
+
+class _Detached(object):
+
+    """
+    Snapshot of the residue and model of a row that is being removed.
+    """
+
+    __slots__ = ('residue', 'vrml')
+
+    def __init__(self, table, index):
+        self.residue = table.residues[index]
+        self.vrml = table.vrmls[index]
+
+    def destroy(self):
+        if self.vrml is not None:
+            self.vrml.destroy()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+On-disk cache of per-frame glyph geometry for trajectories.
+
+Glyph transforms and connector end points are computed once for every
+coordinate set of a molecule and written to ``.npy`` files, which are
+memory-mapped back for playback. Changing frames then only needs to
+slice those arrays and rebuild the meshes from them.
+"""
+
+from __future__ import absolute_import, print_function, division
+import os
+import numpy as np
+
+
+class FrameCache(object):
+
+    """
+    Memory-mapped glyph transforms and connector end points of a single
+    molecule, for a set of frames (coordinate set ids).
+
+    Parameters
+    ----------
+    path : str
+        Common prefix of the ``.frames.npy``, ``.transforms.npy`` and
+        ``.ends.npy`` files written by `build`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        frames = np.load(path + '.frames.npy')
+        self.transforms = np.load(path + '.transforms.npy', mmap_mode='r')
+        self.ends = np.load(path + '.ends.npy', mmap_mode='r')
+        self._index = dict((int(f), i) for i, f in enumerate(frames))
+
+    @classmethod
+    def build(cls, path, frames, n_glyphs, n_connectors, compute):
+        """
+        Compute and store the geometry of each frame.
+
+        Parameters
+        ----------
+        path : str
+            Prefix of the files to write.
+        frames : list of int
+            Coordinate set ids.
+        n_glyphs, n_connectors : int
+        compute : callable
+            Called with each frame id, returns the (n_glyphs, 4, 4)
+            transforms and the (n_connectors, 3) starts and ends.
+        """
+        np.save(path + '.frames.npy', np.asarray(frames, dtype=int))
+        transforms = np.lib.format.open_memmap(
+            path + '.transforms.npy', mode='w+', dtype=np.float32,
+            shape=(len(frames), n_glyphs, 4, 4))
+        ends = np.lib.format.open_memmap(
+            path + '.ends.npy', mode='w+', dtype=np.float32,
+            shape=(len(frames), n_connectors, 2, 3))
+        for i, frame in enumerate(frames):
+            transforms[i], ends[i, :, 0], ends[i, :, 1] = compute(frame)
+        transforms.flush()
+        ends.flush()
+        del transforms, ends
+        return cls(path)
+
+    def __contains__(self, frame):
+        return frame in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def lookup(self, frame):
+        """
+        Transforms, starts and ends stored for `frame`.
+        """
+        i = self._index[frame]
+        ends = self.ends[i]
+        return self.transforms[i], ends[:, 0], ends[:, 1]
+
+    def delete(self):
+        """
+        Release the memory maps and remove the files.
+        """
+        self.transforms = self.ends = None
+        for suffix in ('.frames.npy', '.transforms.npy', '.ends.npy'):
+            try:
+                os.remove(self.path + suffix)
+            except OSError:
+                pass
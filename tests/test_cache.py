@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import os
+import numpy as np
+import pytest
+from snfg.cache import GlycanCache, MoleculeIndex, dumps, loads, restore, snapshot
+from snfg.engine import Engine
+from snfg.scanner import read_glycans, scan_file
+from snfg.structure import Structure
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+GLYCAN = os.path.join(DATA, 'glycan.pdb')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GlycanCache(str(tmp_path / 'cache'))
+
+
+def test_put_get(cache):
+    assert cache.get('a') is None and 'a' not in cache
+    cache.put('a', dict(x=np.arange(3)))
+    cache.put('a', dict(x=np.arange(4)))
+    assert 'a' in cache
+    assert (cache.get('a')['x'] == np.arange(4)).all()
+    assert os.listdir(cache.directory) == ['a.npz']
+
+
+def test_evict(cache):
+    for i, key in enumerate('abc'):
+        cache.put(key, dict(x=np.zeros(1000)))
+        os.utime(cache.path(key), (i, i))
+    cache.get('a')
+    cache.evict(2 * os.path.getsize(cache.path('a')))
+    assert sorted(os.listdir(cache.directory)) == ['a.npz', 'c.npz']
+    cache.clear()
+    assert os.listdir(cache.directory) == []
+
+
+def test_keys(cache):
+    structure = read_glycans(GLYCAN)
+    index = MoleculeIndex(structure)
+    key = cache.key(index, dict(size=4.0))
+    assert key == cache.key(MoleculeIndex(read_glycans(GLYCAN)), dict(size=4.0))
+    assert key != cache.key(index, dict(size=5.0))
+    structure.set_coordinates(structure.coords + 1)
+    assert key != cache.key(MoleculeIndex(structure), dict(size=4.0))
+    assert (index.fingerprint(coordinates=False)
+            == MoleculeIndex(structure).fingerprint(coordinates=False))
+
+
+def test_snapshot_restore():
+    structure = read_glycans(GLYCAN)
+    engine = Engine(molecules=[structure])
+    engine.detect()
+    arrays = loads(dumps(snapshot(engine, structure)))
+    other = Engine(molecules=[structure])
+    other.molecules[structure] = restore(other, structure, arrays)
+    assert other.molecules[structure] == engine.molecules[structure]
+    for residue in engine.molecules[structure]:
+        expected, restored = engine.graph.linkage(residue), other.graph.linkage(residue)
+        assert restored.kind == expected.kind and restored.acceptor is expected.acceptor
+        assert list(other.saccharydes[residue].atoms) == list(engine.saccharydes[residue].atoms)
+    assert np.allclose(other.mesh().vertices, engine.mesh().vertices)
+
+
+def test_engine_cache(cache, monkeypatch):
+    first = scan_file(GLYCAN, cache=cache)
+    mesh = first.engine.mesh()
+
+    detected = []
+    find = Engine.find_saccharydic_residues
+
+    def spy(self, molecules=None, residues=None):
+        detected.extend(len(m.residues) for m in molecules)
+        return find(self, molecules, residues)
+
+    monkeypatch.setattr(Engine, 'find_saccharydic_residues', spy)
+    second = scan_file(GLYCAN, cache=cache)
+    # Only the first pass, whose meshes are never drawn nor cached, is detected again
+    assert detected == [5]
+    assert second.as_dict() == first.as_dict()
+    for name in ('vertices', 'normals', 'colors', 'triangles'):
+        assert np.array_equal(getattr(second.engine.mesh(), name), getattr(mesh, name))
+
+
+def prepend_residue(s):
+    """
+    Copy of structure `s` with an alanine CA before its atoms.
+    """
+    return Structure(['CA'] + s.atom_names, ['C'] + [e.name for e in s.elements],
+                     np.concatenate([[0], s.residue_index + 1]), ['ALA'] + s.residue_names,
+                     ['1.A'] + s.residue_ids, np.vstack([[50, 50, 50], s.coords]),
+                     s.bonds + 1, hetero=np.concatenate([[False], s.hetero]))
+
+
+def test_key_ignores_other_residues(cache, monkeypatch):
+    structure = read_glycans(GLYCAN)
+    engine = Engine(molecules=[structure], cache=cache)
+    engine.detect()
+    mesh = engine.mesh()
+    assert len(os.listdir(cache.directory)) == 1
+
+    def fail(self, molecules=None, residues=None):
+        assert not molecules, 'detected again'
+        return {}
+
+    monkeypatch.setattr(Engine, 'find_saccharydic_residues', fail)
+    other = prepend_residue(structure)
+    engine = Engine(molecules=[other], cache=cache)
+    engine.detect()
+    assert [r.index for r in engine.molecules[other]] == [1, 2, 3, 4, 5]
+    for residue in engine.molecules[other]:
+        assert all(a.residue is residue for a in engine.saccharydes[residue].atoms)
+    assert np.array_equal(engine.mesh().vertices, mesh.vertices)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import print_function, division
+import json
+import os
+import pytest
+from snfg.codes import ResidueCodes
+from snfg.snfg_definitions import RESIDUE_CODES, REVERSE_RESIDUE_CODES
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def codes():
+    return ResidueCodes(RESIDUE_CODES)
+
+
+def test_matches_former_table():
+    # Table built by the former snfg_definitions, before `ResidueCodes`
+    with open(os.path.join(DATA, 'reverse_residue_codes.json')) as f:
+        expected = json.load(f)
+    assert len(expected) == 1600
+    assert len(REVERSE_RESIDUE_CODES) == len(expected)
+    assert dict(REVERSE_RESIDUE_CODES.items()) == expected
+
+
+def test_glycam_sets():
+    # The published sets are derived from the patterns
+    assert len(RESIDUE_CODES['Glc']['glycam']) == 68
+    assert set('XYY UYY VYY 0YA 0yB'.split()) <= RESIDUE_CODES['GlcNAc']['glycam']
+    assert RESIDUE_CODES['Ido']['glycam'] == set()
+
+
+def test_lookups(codes):
+    assert codes['NAG'] == codes.get('NAG') == 'GlcNAc'
+    assert codes['FRU'] == 'Fruc'
+    assert 'ALA' not in codes
+    assert codes.get('ALA', 'UNK') == 'UNK'
+    with pytest.raises(KeyError):
+        codes['ALA']
+
+
+def test_register(codes):
+    codes.register('XYZ', 'Glc')
+    codes.register('NAG', 'Man')
+    assert codes['XYZ'] == 'Glc' and codes['NAG'] == 'Man'
+    assert len(codes) == 1601
+    codes.unregister('XYZ')
+    codes.unregister('NAG')
+    assert 'XYZ' not in codes and codes['NAG'] == 'GlcNAc'
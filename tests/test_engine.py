@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import os
+import numpy as np
+import pytest
+from snfg.engine import Engine, looks_saccharydic
+from snfg.scanner import read_glycans
+from snfg.table import SaccharydeRow
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def detected(path, **kwargs):
+    structure = read_glycans(os.path.join(DATA, path))
+    engine = Engine(molecules=[structure], **kwargs)
+    engine.detect()
+    return engine, structure
+
+
+@pytest.mark.parametrize('thorough', [False, True])
+def test_detect(thorough):
+    engine, structure = detected('glycan.pdb', thorough=thorough)
+    table = engine.saccharydes
+    assert [(str(r.id), table[r].name) for r in engine.molecules[structure]] == [
+        ('100.A', 'GlcNAc'), ('101.A', 'GlcNAc'), ('102.A', 'Man'), ('103.A', 'Man'),
+        ('104.A', 'Man')]
+    assert not engine._problematic_residues
+    for row in table.values():
+        assert len(row.atoms) == 6
+        assert all(a.residue is row.residue for a in row.atoms)
+        assert (row.a1.name, row.a6.name) == ('C1', 'O5')
+        assert not row.shifted
+        assert np.allclose(row.center, row.xyz.mean(axis=0), atol=0.1)
+
+
+def test_detect_ketose():
+    engine, structure = detected('fructose.pdb')
+    residue, = engine.molecules[structure]
+    row = engine.saccharydes[residue]
+    assert (residue.type, row.name) == ('FRU', 'Fruc')
+    assert (row.a1.name, row.a6.name) == ('C2', 'O5')
+    assert row.shifted
+    assert len(row.atoms) == 5
+
+
+def test_detect_skips_polymer_residues(tmp_path):
+    # The same glycan, with its first NAG given as ATOM records
+    with open(os.path.join(DATA, 'glycan.pdb')) as f:
+        lines = [l.replace('HETATM', 'ATOM  ') if l[17:26] == 'NAG A 100' else l
+                 for l in f]
+    path = str(tmp_path / 'polymer.pdb')
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    structure = read_glycans(path)
+    for thorough in (False, True):
+        engine = Engine(molecules=[structure], thorough=thorough)
+        engine.detect()
+        assert [str(r.id) for r in engine.molecules[structure]] == [
+            '101.A', '102.A', '103.A', '104.A']
+
+
+def test_detect_residues_keeps_known():
+    engine, structure = detected('glycan.pdb')
+    new = structure.residues[-1]
+    engine.saccharydes.remove([new])
+    engine.molecules[structure].remove(new)
+    engine.detect(residues=[new])
+    assert len(engine.molecules[structure]) == 5
+    assert engine.molecules[structure][-1] is new
+
+
+def test_looks_saccharydic():
+    assert looks_saccharydic('NAG', ['C1', 'C2', 'O5'])
+    assert looks_saccharydic('XYZ', ['C1', 'C2', 'C3', 'C4', 'C5', 'O5'])
+    assert not looks_saccharydic('XYZ', ['CA', 'CB', 'N'])
+
+
+def test_geometry():
+    engine, structure = detected('glycan.pdb', size=2.0)
+    residues = engine.molecules[structure]
+    glyphs, owners = engine.glyphs(structure)
+    assert len(owners) == len(glyphs.triangles)
+    assert sorted(set(owners)) == list(range(len(residues)))
+    connectors = engine.connectors(structure)
+    assert list(connectors.keys) == residues
+    attrs = engine.connector_attrs(engine.saccharydes[residues[1]])
+    assert (attrs['kind'], attrs['position']) == ('saccharyde C4', 4)
+    assert np.allclose(attrs['start'], engine.saccharydes[residues[1]].center)
+    mesh = engine.mesh()
+    assert len(mesh.triangles) > len(glyphs.triangles)
+    assert mesh.triangles.max() < len(mesh.vertices)
+    assert len(mesh.vertices) == len(mesh.normals) == len(mesh.colors)
+    assert np.allclose(np.linalg.norm(mesh.normals, axis=1), 1, atol=1e-3)
+
+
+def test_row_class():
+    class Row(SaccharydeRow):
+        pass
+
+    engine, structure = detected('glycan.pdb', row_class=Row)
+    assert all(isinstance(row, Row) for row in engine.saccharydes.values())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import json
+import os
+import struct
+import numpy as np
+import pytest
+from snfg import export
+from snfg.export import WRITERS, save
+from snfg.geometry import Mesh
+
+# Two triangles of a unit square, red on one side and blue on the other
+MESH = Mesh([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]], [[0, 0, 1]] * 4,
+            [[1, 0, 0, 1]] * 2 + [[0, 0, 1, 0.5]] * 2, [[0, 1, 2], [0, 2, 3]])
+EMPTY = Mesh(np.zeros((0, 3)), np.zeros((0, 3)), np.zeros((0, 4)), np.zeros((0, 3)))
+
+
+def read_glb(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, length = struct.unpack_from('<4sII', data)
+    assert (magic, version, length) == (b'glTF', 2, len(data))
+    json_length, kind = struct.unpack_from('<I4s', data, 12)
+    assert kind == b'JSON' and json_length % 4 == 0
+    gltf = json.loads(data[20:20 + json_length].decode('utf-8'))
+    bin_length, kind = struct.unpack_from('<I4s', data, 20 + json_length)
+    assert kind == b'BIN\0' and bin_length % 4 == 0
+    assert gltf['buffers'][0]['byteLength'] <= bin_length
+    binary = data[28 + json_length:]
+    dtypes = {5126: '<f4', 5125: '<u4'}
+    widths = dict(SCALAR=1, VEC3=3, VEC4=4)
+    arrays = []
+    for accessor in gltf['accessors']:
+        view = gltf['bufferViews'][accessor['bufferView']]
+        array = np.frombuffer(binary[view['byteOffset']:view['byteOffset'] + view['byteLength']],
+                              dtype=dtypes[accessor['componentType']])
+        arrays.append(array.reshape(accessor['count'], widths[accessor['type']]))
+    return gltf, arrays
+
+
+def test_glb(tmp_path):
+    path = str(tmp_path / 'mesh.glb')
+    save(MESH, path)
+    gltf, (vertices, normals, colors, indices) = read_glb(path)
+    assert gltf['asset']['version'] == '2.0'
+    assert gltf['accessors'][0]['min'] == [0, 0, 0] and gltf['accessors'][0]['max'] == [1, 1, 0]
+    assert np.allclose(vertices, MESH.vertices) and np.allclose(normals, MESH.normals)
+    assert np.allclose(colors, MESH.colors)
+    assert (indices.reshape(-1, 3) == MESH.triangles).all()
+
+
+def test_glb_rejects_empty_mesh(tmp_path):
+    path = str(tmp_path / 'empty.glb')
+    with pytest.raises(ValueError):
+        save(EMPTY, path)
+    assert not os.path.exists(path)
+
+
+def test_ply(tmp_path):
+    path = str(tmp_path / 'mesh.ply')
+    save(MESH, path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    header, body = data.split(b'end_header\n', 1)
+    assert b'element vertex 4' in header and b'element face 2' in header
+    vertices = np.frombuffer(body[:4 * 28], dtype=[('xyz', '<f4', 3), ('normal', '<f4', 3),
+                                                   ('rgba', 'u1', 4)])
+    faces = np.frombuffer(body[4 * 28:], dtype=[('n', 'u1'), ('indices', '<i4', 3)])
+    assert np.allclose(vertices['xyz'], MESH.vertices)
+    assert (vertices['rgba'][:, 3] == [255, 255, 128, 128]).all()
+    assert (faces['n'] == 3).all() and (faces['indices'] == MESH.triangles).all()
+
+
+def test_obj(tmp_path):
+    path = str(tmp_path / 'mesh.obj')
+    save(MESH, path)
+    with open(path) as f:
+        lines = [l.split() for l in f if not l.startswith('#')]
+    vertices = np.array([l[1:] for l in lines if l[0] == 'v'], dtype=float)
+    assert np.allclose(vertices, np.hstack([MESH.vertices, MESH.colors[:, :3]]))
+    assert len([l for l in lines if l[0] == 'vn']) == 4
+    faces = [[int(c.split('//')[0]) - 1 for c in l[1:]] for l in lines if l[0] == 'f']
+    assert faces == MESH.triangles.tolist()
+
+
+def test_bild(tmp_path):
+    path = str(tmp_path / 'mesh.bild')
+    save(MESH, path, fmt='bild')
+    with open(path) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == '.color 1.0 0.0 0.0'
+    assert len([l for l in lines if l.startswith('.polygon')]) == 2
+    # Both triangles start on a red vertex
+    assert len([l for l in lines if l.startswith('.color')]) == 1
+
+
+@pytest.mark.parametrize('fmt', ['bild', 'ply', 'obj'])
+def test_empty_mesh(tmp_path, fmt):
+    path = str(tmp_path / ('empty.' + fmt))
+    save(EMPTY, path)
+    assert os.path.exists(path)
+
+
+def test_open_error_keeps_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'mesh.ply')
+    save(MESH, path)
+
+    def locked(path, mode):
+        raise IOError('locked')
+
+    monkeypatch.setattr(export, 'open', locked, raising=False)
+    with pytest.raises(IOError, match='locked'):
+        save(MESH, path)
+    assert os.path.getsize(path) > 0
+
+
+def test_missing_directory(tmp_path):
+    with pytest.raises(IOError) as error:
+        save(MESH, str(tmp_path / 'missing' / 'mesh.ply'))
+    assert getattr(error.value, '__context__', None) is None
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        save(MESH, str(tmp_path / 'mesh.stl'))
+    assert sorted(WRITERS) == ['bild', 'glb', 'obj', 'ply']
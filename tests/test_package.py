@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import importlib
+import sys
+import types
+import pytest
+
+
+def reimport(monkeypatch):
+    for name in list(sys.modules):
+        if name == 'snfg' or name.startswith('snfg.'):
+            monkeypatch.delitem(sys.modules, name)
+    return importlib.import_module('snfg')
+
+
+def test_headless(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'chimera', None)
+    snfg = reimport(monkeypatch)
+    assert snfg.SNFG is None and snfg.gui is None
+    assert snfg.Engine is not None
+
+
+def test_chimera_import_errors_propagate(monkeypatch):
+    # A Chimera without the modules core needs must not pass for headless
+    monkeypatch.setitem(sys.modules, 'chimera', types.ModuleType('chimera'))
+    with pytest.raises(ImportError):
+        reimport(monkeypatch)
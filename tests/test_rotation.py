@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import print_function, division
+import numpy as np
+import pytest
+from snfg.rotation import rotate, rotate_in_plane
+
+
+def quaternion_rotation(vector, axis, angle):
+    """
+    Right-handed rotation of `vector` by `angle` degrees around `axis`,
+    computed with quaternions as ``chimera.Xform.rotate`` does.
+    """
+    axis = np.asarray(axis, dtype=float) / np.linalg.norm(axis)
+    half = np.radians(angle) / 2
+    w, xyz = np.cos(half), np.sin(half) * axis
+    t = 2 * np.cross(xyz, vector)
+    return vector + w * t + np.cross(xyz, t)
+
+
+def legacy_trans_angle(a, b, c, angle, x):
+    """
+    The former ``_rotate`` of core.py: build the homogeneous matrix of
+    ``Xform.translation(b); rotate(cross(a - b, b - c), angle);
+    translate(-b)`` and apply it to the vector `x`.
+    """
+    to_b, from_b = np.eye(4), np.eye(4)
+    to_b[:3, 3], from_b[:3, 3] = b, -b
+    rotation = np.eye(4)
+    axis = np.cross(a - b, b - c)
+    for i, e in enumerate(np.eye(3)):
+        rotation[:3, i] = quaternion_rotation(e, axis, angle)
+    return to_b.dot(rotation).dot(from_b).dot(np.append(x, 0))[:3]
+
+
+def test_rotate_is_counterclockwise_around_axis():
+    assert np.allclose(rotate([1, 0, 0], [0, 0, 1], 90), [0, 1, 0])
+    assert np.allclose(rotate([1, 0, 0], [0, 0, -1], 90), [0, -1, 0])
+    assert np.allclose(rotate([0, 1, 0], [1, 0, 0], 90), [0, 0, 1])
+    assert np.allclose(rotate([1, 0, 0], [0, 0, 1], -90), [0, -1, 0])
+
+
+def test_rotate_matches_quaternions():
+    rng = np.random.RandomState(0)
+    vectors, axes = rng.normal(size=(20, 3)), rng.normal(size=(20, 3))
+    angles = rng.uniform(-360, 360, size=20)
+    expected = [quaternion_rotation(v, k, t) for v, k, t in zip(vectors, axes, angles)]
+    assert np.allclose(rotate(vectors, axes, angles), expected)
+
+
+def test_rotate_broadcasts():
+    rotated = rotate(np.ones((4, 1, 3)), [[0, 0, 1]], [0, 90, 180])
+    assert rotated.shape == (4, 3, 3)
+    assert np.allclose(rotated[:, 2], [-1, -1, 1])
+
+
+@pytest.mark.parametrize('angles', [(90, 180, 270, 360), (45, 135, -30)])
+def test_rotate_in_plane_matches_legacy_xform(angles):
+    rng = np.random.RandomState(1)
+    a, b, c, x = [rng.normal(size=(5, 3)) for _ in range(4)]
+    rotated = rotate_in_plane(a, b, c, angles, x)
+    assert rotated.shape == (5, len(angles), 3)
+    for i in range(5):
+        for j, angle in enumerate(angles):
+            assert np.allclose(rotated[i, j], legacy_trans_angle(a[i], b[i], c[i], angle, x[i]))
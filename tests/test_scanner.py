@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import gzip
+import os
+import shutil
+import numpy as np
+import pytest
+from snfg import scanner
+from snfg.scanner import bonds_by_distance, read_glycans, scan, scan_file
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+GLYCAN = os.path.join(DATA, 'glycan.pdb')
+
+
+def summary(record):
+    summary = record.as_dict()
+    del summary['path']
+    return summary
+
+
+def lines():
+    with open(GLYCAN) as f:
+        return f.readlines()
+
+
+def link_record(name1, resname1, key1, name2, resname2, key2):
+    line = list('LINK' + ' ' * 74)
+    for start, text in ((12, '{:<4}'.format(name1)), (17, resname1),
+                        (21, '{}{:>4}{}'.format(*key1)), (42, '{:<4}'.format(name2)),
+                        (47, resname2), (51, '{}{:>4}{}'.format(*key2))):
+        line[start:start + len(text)] = text
+    return ''.join(line).rstrip() + '\n'
+
+
+def write(path, lines):
+    with open(str(path), 'w') as f:
+        f.writelines(lines)
+    return str(path)
+
+
+def test_scan_file():
+    record = scan_file(GLYCAN)
+    assert len(record) == 5 and record.path == GLYCAN
+    assert [(s['residue'], s['name']) for s in record.saccharydes] == [
+        ('100.A', 'GlcNAc'), ('101.A', 'GlcNAc'), ('102.A', 'Man'), ('103.A', 'Man'),
+        ('104.A', 'Man')]
+    assert record.glycans == [['100.A', '101.A', '102.A', '103.A', '104.A']]
+    # Found by contact, as there is no LINK record
+    assert record.linkages[0] == dict(donor='100.A', kind='N-linked glycan', position=None,
+                                      acceptor='10.A', acceptor_code='ASN')
+    assert [l['position'] for l in record.linkages[1:]] == [4, 4, 4, 4]
+
+
+def test_scan_ketose():
+    record = scan_file(os.path.join(DATA, 'fructose.pdb'))
+    assert record.saccharydes == [dict(residue='1.B', code='FRU', name='Fruc')]
+    assert record.linkages[0]['kind'] == 'terminal'
+
+
+def test_cif_matches_pdb():
+    assert summary(scan_file(os.path.join(DATA, 'glycan.cif'))) == summary(scan_file(GLYCAN))
+
+
+def test_gzip(tmp_path):
+    path = str(tmp_path / 'glycan.cif.gz')
+    with open(os.path.join(DATA, 'glycan.cif'), 'rb') as src, gzip.open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    assert summary(scan_file(path)) == summary(scan_file(GLYCAN))
+
+
+def test_scan():
+    paths = [GLYCAN, os.path.join(DATA, 'fructose.pdb')]
+    assert [len(r) for r in scan(paths)] == [5, 1]
+
+
+def test_read_glycans_keeps_linked_residues(tmp_path):
+    structure = read_glycans(GLYCAN)
+    assert structure.residue_names == ['NAG', 'NAG', 'BMA', 'BMA', 'BMA']
+    link = link_record('ND2', 'ASN', ('A', 10, ' '), 'C1', 'NAG', ('A', 100, ' '))
+    structure = read_glycans(write(tmp_path / 'link.pdb', [link] + lines()))
+    assert structure.residue_names == ['ASN', 'NAG', 'NAG', 'BMA', 'BMA', 'BMA']
+    assert list(structure.hetero) == [False] + [True] * 5
+    assert structure.residue_ids[0] == '10.A'
+
+
+def cif_lines(header):
+    # glycan.cif with its empty struct_conn loop replaced by `header`
+    with open(os.path.join(DATA, 'glycan.cif')) as f:
+        cif = f.readlines()
+    start = cif.index('loop_\n')
+    return cif[:start] + header + cif[cif.index('#\n', start):]
+
+
+def test_read_glycans_single_struct_conn(tmp_path):
+    header = ['_struct_conn.id covale1\n',
+              '_struct_conn.conn_type_id covale\n',
+              '_struct_conn.ptnr1_auth_asym_id A\n',
+              '_struct_conn.ptnr1_auth_comp_id ASN\n',
+              '_struct_conn.ptnr1_auth_seq_id 10\n',
+              '_struct_conn.ptnr2_auth_asym_id A\n',
+              '_struct_conn.ptnr2_auth_comp_id NAG\n',
+              '_struct_conn.ptnr2_auth_seq_id 100\n']
+    structure = read_glycans(write(tmp_path / 'single.cif', cif_lines(header)))
+    assert structure.residue_ids[0] == '10.A'
+    header[1] = '_struct_conn.conn_type_id metalc\n'
+    structure = read_glycans(write(tmp_path / 'metal.cif', cif_lines(header)))
+    assert '10.A' not in structure.residue_ids
+
+
+def test_read_glycans_struct_conn_without_type(tmp_path):
+    header = ['loop_\n',
+              '_struct_conn.ptnr1_auth_asym_id\n',
+              '_struct_conn.ptnr1_auth_comp_id\n',
+              '_struct_conn.ptnr1_auth_seq_id\n',
+              '_struct_conn.ptnr2_auth_asym_id\n',
+              '_struct_conn.ptnr2_auth_comp_id\n',
+              '_struct_conn.ptnr2_auth_seq_id\n',
+              'A ASN 10 A NAG 100\n']
+    structure = read_glycans(write(tmp_path / 'untyped.cif', cif_lines(header)))
+    assert structure.residue_ids[0] == '10.A'
+
+
+def test_scan_file_reads_once(monkeypatch):
+    opened = []
+
+    def spy(path):
+        opened.append(path)
+        return scanner_open(path)
+
+    scanner_open = scanner._open
+    monkeypatch.setattr(scanner, '_open', spy)
+    record = scan_file(GLYCAN)
+    # The ASN is found by contact without reading the file again
+    assert record.linkages[0]['acceptor'] == '10.A'
+    assert opened == [GLYCAN]
+
+
+def test_read_glycans_first_model(tmp_path):
+    moved = [l[:30] + '{:8.3f}'.format(float(l[30:38]) + 50) + l[38:]
+             for l in lines() if l.startswith(('ATOM', 'HETATM'))]
+    path = write(tmp_path / 'models.pdb', ['MODEL        1\n'] + lines()
+                 + ['ENDMDL\n', 'MODEL        2\n'] + moved + ['ENDMDL\n'])
+    assert np.allclose(read_glycans(path).coords, read_glycans(GLYCAN).coords)
+
+
+def test_bonds_by_distance():
+    xyz = [[0, 0, 0], [1.5, 0, 0], [3.0, 0, 0], [0, 1.43, 0], [10, 10, 10]]
+    bonds = bonds_by_distance(xyz, ['C', 'C', 'C', 'O', 'C'])
+    assert sorted(map(tuple, bonds)) == [(0, 1), (0, 3), (1, 2)]
+    assert bonds_by_distance([], []).shape == (0, 2)
+
+
+@pytest.mark.parametrize('name', ['glycan.pdb', 'fructose.pdb'])
+def test_bonds_match_residue_templates(name):
+    # Every ring atom has two ring neighbors
+    record = scan_file(os.path.join(DATA, name))
+    for row in record.engine.saccharydes.values():
+        ring = set(row.atoms)
+        assert all(len(ring.intersection(a.neighbors)) == 2 for a in ring)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import os
+import pytest
+
+chimera = pytest.importorskip('chimera')
+from snfg.core import SNFG  # noqa: E402
+
+GLYCAN = os.path.join(os.path.dirname(__file__), 'data', 'glycan.pdb')
+
+
+@pytest.fixture
+def molecules():
+    opened = [chimera.openModels.open(GLYCAN)[0] for _ in range(2)]
+    yield opened
+    for instance in list(SNFG._instances):
+        instance.disable()
+    chimera.openModels.close(opened)
+
+
+def models(instance):
+    found = [layer.model for layers in instance.layers.values() for layer in layers]
+    found.extend(m for s in instance.saccharydes.values() if s.vrml is not None
+                 for m in s.vrml.models())
+    return found
+
+
+def test_disable_keeps_other_instances(molecules):
+    first = SNFG(molecules=molecules[:1], cache=False)
+    second = SNFG(molecules=molecules[1:], merge=False, cache=False)
+    assert SNFG._instances == [first, second]
+    second.disable()
+    assert SNFG._instances == [first]
+    assert models(first) and not any(m.__destroyed__ for m in models(first))
+
+
+def test_restore_two_instances(molecules):
+    first = SNFG(molecules=molecules[:1], cache=False)
+    second = SNFG(molecules=molecules[1:], merge=False, cache=False)
+    states = [instance.session_state() for instance in (first, second)]
+    first.disable()
+    second.disable()
+    assert not SNFG._instances
+    restored = [SNFG.from_session(params, entries) for params, entries in states]
+    assert SNFG._instances == restored
+    for instance, molecule in zip(restored, molecules):
+        assert list(instance.molecules) == [molecule]
+        assert len(instance.saccharydes) == 5
+        assert models(instance) and not any(m.__destroyed__ for m in models(instance))
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from __future__ import absolute_import, print_function, division
+import os
+import numpy as np
+import pytest
+from snfg.engine import Engine
+from snfg.graph import GlycanGraph
+from snfg.scanner import read_glycans, scan_file
+from snfg.table import SaccharydeTable
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def engine():
+    structure = read_glycans(os.path.join(DATA, 'glycan.pdb'))
+    engine = Engine(molecules=[structure])
+    engine.detect()
+    return engine
+
+
+def rings(engine):
+    return [(r, list(engine.saccharydes[r].atoms)) for r in engine.saccharydes.keys()]
+
+
+def test_table_extend(engine):
+    entries = rings(engine)
+    table = SaccharydeTable(base_size=2.0)
+    assert table.extend(entries[:2]) == []
+    assert table.extend(entries) == []
+    assert table.keys() == [r for r, _ in entries]
+    assert len(table.atoms) == 30 and table.rings.max() == 29
+    assert np.allclose(table.centers, engine.saccharydes.centers)
+    assert np.allclose(table.sizes, engine.saccharydes.sizes / 2)
+    assert len(set(table.ids)) == len(table)
+
+
+def test_table_extend_skips_rings_without_oxygen(engine):
+    (residue, atoms), = rings(engine)[:1]
+    table = SaccharydeTable()
+    assert table.extend([(residue, [a for a in atoms if a.element.name != 'O'])]) == [residue]
+    assert not len(table) and residue not in table
+
+
+def test_table_remove(engine):
+    table = engine.saccharydes
+    residues = table.keys()
+    centers = table.centers.copy()
+    removed = table.remove(residues[1:3])
+    assert [row.residue for row in removed] == residues[1:3]
+    assert table.keys() == residues[:1] + residues[3:]
+    assert len(table.atoms) == 18
+    assert list(table.index_of(residues[3:])) == [1, 2]
+    for row in table.values():
+        assert all(a.residue is row.residue for a in row.atoms)
+        assert row.a1.name == 'C1'
+    assert np.allclose(table.centers, centers[[0, 3, 4]])
+    assert table.remove(residues[1:3]) == []
+
+
+def test_table_remove_after_extend(engine):
+    table = engine.saccharydes
+    entries = rings(engine)
+    table.remove([r for r, _ in entries])
+    table.extend(entries[:3])
+    table.remove([entries[0][0]])
+    assert np.allclose(table.centers, engine.saccharydes.centers)
+    assert len(table.centers) == 2
+
+
+def test_graph(engine):
+    graph = engine.graph
+    r = engine.saccharydes.keys()
+    assert graph.roots() == r[:1]
+    assert [(l.donor, l.acceptor, l.position) for l in graph.edges()] == [
+        (r[i + 1], r[i], 4) for i in range(4)]
+    assert graph.children(r[1]) == [r[2]] and graph.parent(r[2]) is r[1]
+    assert graph.parent(r[0]) is None and len(graph) == 5
+
+
+def test_graph_remove(engine):
+    table, graph = engine.saccharydes, engine.graph
+    r = table.keys()
+    table.remove([r[1]])
+    assert graph.remove([r[1]]) == set([r[2]])
+    assert r[1] not in graph
+    assert graph.roots() == [r[0], r[2]]
+    assert graph.children(r[0]) == []
+    # Adding the residue back links both again
+    table.extend([(r[1], engine.find_saccharydic_residues(residues=[r[1]])
+                   [r[1].molecule][r[1]])])
+    graph.update([r[1], r[2]])
+    assert graph.roots() == [r[0]]
+    assert graph.parent(r[2]) is r[1] and graph.parent(r[1]) is r[0]
+
+
+def test_graph_add(engine):
+    linkages = list(engine.graph.linkages.values())
+    graph = GlycanGraph(engine.saccharydes)
+    graph.add(linkages)
+    assert graph.linkages == engine.graph.linkages
+    assert graph.roots() == engine.graph.roots()
+    for residue in engine.saccharydes.keys():
+        assert graph.children(residue) == engine.graph.children(residue)
+    graph.build()
+    assert sorted(graph.linkages, key=lambda r: r.index) == engine.saccharydes.keys()
+
+
+def edit_glycan(tmp_path, edit):
+    with open(os.path.join(DATA, 'glycan.pdb')) as f:
+        lines = [edit(l) for l in f]
+    path = str(tmp_path / 'edited.pdb')
+    with open(path, 'w') as f:
+        f.writelines(l for l in lines if l is not None)
+    return path
+
+
+def test_graph_n_linked_without_ca(tmp_path):
+    # The asparagine as a ligand with no CA, e.g. an N-glycosyl compound
+    def edit(line):
+        if line[17:20] == 'ASN':
+            return None if line[12:16] == ' CA ' else 'HETATM' + line[6:]
+        return line
+
+    record = scan_file(edit_glycan(tmp_path, edit))
+    engine = record.engine
+    linkage = engine.graph.linkage(engine.saccharydes.keys()[0])
+    assert linkage.kind == 'N-linked glycan' and linkage.acceptor.type == 'ASN'
+    assert linkage.acceptor_atom is None and linkage.target.name == 'ND2'
+    assert record.linkages[0]['acceptor'] == '10.A'
+
+
+def test_graph_nonstandard_ring_oxygen(tmp_path):
+    # Ring oxygen called O6 and hydroxymethyl oxygen called O5
+    swap = {' O5 ': ' O6 ', ' O6 ': ' O5 '}
+
+    def edit(line):
+        if line.startswith('HETATM') and line[12:16] in swap:
+            return line[:12] + swap[line[12:16]] + line[16:]
+        return line
+
+    expected = [(l['donor'], l['kind'], l['acceptor']) for l in scan_file(
+        os.path.join(DATA, 'glycan.pdb')).linkages]
+    record = scan_file(edit_glycan(tmp_path, edit))
+    assert [(l['donor'], l['kind'], l['acceptor']) for l in record.linkages] == expected
+    for row in record.engine.saccharydes.values():
+        assert row.a6.name == 'O6'